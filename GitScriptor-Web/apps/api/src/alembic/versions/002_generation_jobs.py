@@ -0,0 +1,41 @@
+"""Generation jobs on generation_history
+
+Revision ID: 002_generation_jobs
+Revises: 001_initial_schema
+Create Date: 2025-07-05 12:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "002_generation_jobs"
+down_revision = "001_initial_schema"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Public id for asynchronous generation jobs
+    op.add_column("generation_history", sa.Column("job_id", sa.String(), nullable=True))
+    op.create_index(
+        op.f("ix_generation_history_job_id"),
+        "generation_history",
+        ["job_id"],
+        unique=True,
+    )
+
+    # Guest generations are tracked as jobs without an owner
+    op.alter_column(
+        "generation_history", "user_id", existing_type=sa.Integer(), nullable=True
+    )
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM generation_history WHERE user_id IS NULL")
+    op.alter_column(
+        "generation_history", "user_id", existing_type=sa.Integer(), nullable=False
+    )
+    op.drop_index(op.f("ix_generation_history_job_id"), table_name="generation_history")
+    op.drop_column("generation_history", "job_id")
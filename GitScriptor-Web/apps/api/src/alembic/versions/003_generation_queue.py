@@ -0,0 +1,52 @@
+"""Generation job queue
+
+Revision ID: 003_generation_queue
+Revises: 002_generation_jobs
+Create Date: 2025-07-08 12:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "003_generation_queue"
+down_revision = "002_generation_jobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create generation_jobs table
+    op.create_table(
+        "generation_jobs",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("history_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("state", sa.String(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("worker_id", sa.String(), nullable=True),
+        sa.Column("enqueued_at", sa.DateTime(), nullable=False),
+        sa.Column("claimed_at", sa.DateTime(), nullable=True),
+        sa.Column("heartbeat_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["history_id"], ["generation_history.id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["users.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("history_id"),
+    )
+    op.create_index(
+        op.f("ix_generation_jobs_id"), "generation_jobs", ["id"], unique=False
+    )
+    # Workers claim the oldest queued job and scan running jobs for heartbeats
+    op.create_index(
+        "ix_generation_jobs_state_id", "generation_jobs", ["state", "id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("generation_jobs")
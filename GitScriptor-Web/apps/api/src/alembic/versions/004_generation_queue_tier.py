@@ -0,0 +1,27 @@
+"""Scheduling tier on queued generation jobs
+
+Revision ID: 004_generation_queue_tier
+Revises: 003_generation_queue
+Create Date: 2025-07-10 12:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "004_generation_queue_tier"
+down_revision = "003_generation_queue"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "generation_jobs",
+        sa.Column("tier", sa.String(), nullable=False, server_default="authenticated"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("generation_jobs", "tier")
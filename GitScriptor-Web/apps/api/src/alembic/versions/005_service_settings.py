@@ -0,0 +1,36 @@
+"""Runtime service settings
+
+Revision ID: 005_service_settings
+Revises: 004_generation_queue_tier
+Create Date: 2025-07-14 12:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "005_service_settings"
+down_revision = "004_generation_queue_tier"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create service_settings table
+    op.create_table(
+        "service_settings",
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("value", sa.JSON(), nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.PrimaryKeyConstraint("key"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("service_settings")
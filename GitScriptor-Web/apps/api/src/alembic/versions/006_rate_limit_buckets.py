@@ -0,0 +1,38 @@
+"""Shared rate-limit token buckets
+
+Revision ID: 006_rate_limit_buckets
+Revises: 005_service_settings
+Create Date: 2025-07-15 12:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "006_rate_limit_buckets"
+down_revision = "005_service_settings"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create rate_limit_buckets table
+    op.create_table(
+        "rate_limit_buckets",
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("tokens", sa.Float(), nullable=False),
+        sa.Column("updated_at", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("key"),
+    )
+    # Lets idle buckets be pruned
+    op.create_index(
+        "ix_rate_limit_buckets_updated_at",
+        "rate_limit_buckets",
+        ["updated_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("rate_limit_buckets")
@@ -0,0 +1,32 @@
+"""Prefetch entries in the generation queue
+
+Revision ID: 007_generation_queue_prefetch
+Revises: 006_rate_limit_buckets
+Create Date: 2025-07-16 12:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "007_generation_queue_prefetch"
+down_revision = "006_rate_limit_buckets"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "generation_jobs",
+        sa.Column("kind", sa.String(), nullable=False, server_default="generate"),
+    )
+    op.add_column("generation_jobs", sa.Column("repo_url", sa.String(), nullable=True))
+    op.alter_column("generation_jobs", "history_id", nullable=True)
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM generation_jobs WHERE history_id IS NULL")
+    op.alter_column("generation_jobs", "history_id", nullable=False)
+    op.drop_column("generation_jobs", "repo_url")
+    op.drop_column("generation_jobs", "kind")
@@ -0,0 +1,28 @@
+"""Trigger of queued prefetches and lookup by repository
+
+Revision ID: 008_generation_queue_source
+Revises: 007_generation_queue_prefetch
+Create Date: 2025-07-17 12:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "008_generation_queue_source"
+down_revision = "007_generation_queue_prefetch"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("generation_jobs", sa.Column("source", sa.String(), nullable=True))
+    op.create_index(
+        op.f("ix_generation_jobs_repo_url"), "generation_jobs", ["repo_url"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_generation_jobs_repo_url"), table_name="generation_jobs")
+    op.drop_column("generation_jobs", "source")
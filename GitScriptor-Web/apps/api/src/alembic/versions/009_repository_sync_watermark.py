@@ -0,0 +1,30 @@
+"""Repository sync watermarks per user
+
+Revision ID: 009_repository_sync_watermark
+Revises: 008_generation_queue_source
+Create Date: 2025-07-18 12:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "009_repository_sync_watermark"
+down_revision = "008_generation_queue_source"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users", sa.Column("repositories_synced_at", sa.DateTime(), nullable=True)
+    )
+    op.add_column(
+        "users", sa.Column("repositories_reconciled_at", sa.DateTime(), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("users", "repositories_reconciled_at")
+    op.drop_column("users", "repositories_synced_at")
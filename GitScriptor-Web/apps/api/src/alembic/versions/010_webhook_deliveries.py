@@ -0,0 +1,40 @@
+"""Received GitHub webhook deliveries
+
+Revision ID: 010_webhook_deliveries
+Revises: 009_repository_sync_watermark
+Create Date: 2025-07-18 18:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "010_webhook_deliveries"
+down_revision = "009_repository_sync_watermark"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create webhook_deliveries table
+    op.create_table(
+        "webhook_deliveries",
+        sa.Column("delivery_id", sa.String(), nullable=False),
+        sa.Column("event", sa.String(), nullable=False),
+        sa.Column("action", sa.String(), nullable=True),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("received_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("delivery_id"),
+    )
+    # Lets old deliveries be pruned
+    op.create_index(
+        "ix_webhook_deliveries_received_at",
+        "webhook_deliveries",
+        ["received_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("webhook_deliveries")
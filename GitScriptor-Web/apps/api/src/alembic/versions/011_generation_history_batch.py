@@ -0,0 +1,34 @@
+"""Batch id on generation history
+
+Revision ID: 011_generation_history_batch
+Revises: 010_webhook_deliveries
+Create Date: 2025-07-19 09:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "011_generation_history_batch"
+down_revision = "010_webhook_deliveries"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "generation_history", sa.Column("batch_id", sa.String(), nullable=True)
+    )
+    # Batches are looked up from their items
+    op.create_index(
+        "ix_generation_history_batch_id",
+        "generation_history",
+        ["batch_id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_generation_history_batch_id", table_name="generation_history")
+    op.drop_column("generation_history", "batch_id")
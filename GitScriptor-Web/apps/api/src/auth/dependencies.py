@@ -1,4 +1,6 @@
-from fastapi import Depends, HTTPException, status
+import os
+import hmac
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from typing import Optional
@@ -7,6 +9,9 @@ from ..db.database import get_db
 from ..db.models import User
 from .crypto import verify_token
 
+# Shared secret for operational endpoints; they are disabled when unset
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN")
+
 security = HTTPBearer()
 optional_security = HTTPBearer(auto_error=False)
 
@@ -81,3 +86,17 @@ def get_optional_current_user(
         return user
     except Exception:
         return None
+
+
+async def require_admin_token(
+    x_admin_token: Optional[str] = Header(None),
+) -> None:
+    """Allow the request only with the configured X-Admin-Token header."""
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Admin API is disabled"
+        )
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_API_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token"
+        )
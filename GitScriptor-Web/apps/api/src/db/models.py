@@ -1,6 +1,7 @@
 from sqlalchemy import (
     Column,
     Integer,
+    Float,
     String,
     DateTime,
     Text,
@@ -34,6 +35,8 @@ class User(Base):
     github_created_at = Column(DateTime)
     access_token = Column(String)  # Encrypted GitHub access token
     refresh_token = Column(String)  # Encrypted GitHub refresh token
+    repositories_synced_at = Column(DateTime)  # Incremental sync watermark
+    repositories_reconciled_at = Column(DateTime)  # Last full sync
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -132,16 +135,19 @@ class GenerationHistory(Base):
     __tablename__ = "generation_history"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    job_id = Column(String, unique=True, index=True, nullable=True)  # Public job id
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # None for guests
     repository_id = Column(Integer, ForeignKey("repositories.id"), nullable=True)
     repo_url = Column(String, nullable=False, index=True)
+    batch_id = Column(String, index=True, nullable=True)  # Batch the job belongs to
     markdown_content = Column(Text, nullable=False)
     style = Column(String, default="classic")
     generation_time_ms = Column(Integer)  # Time taken to generate
     prompt_tokens = Column(Integer)  # AI tokens used for prompt
     completion_tokens = Column(Integer)  # AI tokens used for completion
     model_used = Column(String)  # AI model used
-    status = Column(String, default="completed")  # completed, failed, pending
+    # completed, failed, pending, running, cancelled
+    status = Column(String, default="completed")
     error_message = Column(Text)  # Error message if failed
     generation_metadata = Column(JSON)  # Additional generation metadata
     generated_at = Column(DateTime, server_default=func.now())
@@ -151,6 +157,36 @@ class GenerationHistory(Base):
     repository = relationship("Repository", back_populates="generation_history")
 
 
+class GenerationJob(Base):
+    """Queue entry for a pending generation; removed once the job finishes."""
+
+    __tablename__ = "generation_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # generate: runs the history row; prefetch: warms the caches for repo_url
+    kind = Column(String, nullable=False, default="generate")
+    history_id = Column(
+        Integer,
+        ForeignKey("generation_history.id", ondelete="CASCADE"),
+        nullable=True,
+        unique=True,
+    )
+    repo_url = Column(String, index=True)  # Repository to prefetch
+    source = Column(String)  # What triggered a prefetch: sync, view, search
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    # Scheduling tier: anonymous, authenticated, premium
+    tier = Column(String, nullable=False, default="authenticated")
+    state = Column(String, nullable=False, default="queued")  # queued, running
+    attempts = Column(Integer, nullable=False, default=0)
+    worker_id = Column(String)  # Worker currently holding the job
+    enqueued_at = Column(DateTime, nullable=False)
+    claimed_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)
+
+    # Relationships
+    history = relationship("GenerationHistory")
+
+
 class GeneratedReadme(Base):
     __tablename__ = "generated_readmes"
 
@@ -160,3 +196,35 @@ class GeneratedReadme(Base):
     generated_at = Column(DateTime, server_default=func.now())
     style = Column(String, default="classic")
     # Keep for backward compatibility with existing code
+
+
+class ServiceSetting(Base):
+    """Runtime setting shared by every API and worker process."""
+
+    __tablename__ = "service_settings"
+
+    key = Column(String, primary_key=True)
+    value = Column(JSON, nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class RateLimitBucket(Base):
+    """Token bucket shared by API processes using the database rate-limit store."""
+
+    __tablename__ = "rate_limit_buckets"
+
+    key = Column(String, primary_key=True)  # rule:user:<id> or rule:ip:<address>
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False, index=True)  # Unix time of last refill
+
+
+class WebhookDelivery(Base):
+    """A GitHub webhook delivery that was received; redeliveries are skipped."""
+
+    __tablename__ = "webhook_deliveries"
+
+    delivery_id = Column(String, primary_key=True)  # X-GitHub-Delivery
+    event = Column(String, nullable=False)  # X-GitHub-Event
+    action = Column(String)
+    status = Column(String, nullable=False, default="processing")  # processed
+    received_at = Column(DateTime, nullable=False, index=True)
@@ -17,9 +17,14 @@ from .routers import (
     status as status_router,
     templates,
     search,
+    admission,
+    webhooks,
 )
 from .middleware.exception_handler import add_exception_handlers
 from .middleware.request_logger import add_request_logging
+from .middleware.rate_limit import add_rate_limiting
+from .services.github import github_service
+from .worker import Worker, GENERATION_WORKERS
 
 # Load environment variables
 load_dotenv()
@@ -32,6 +37,9 @@ app = FastAPI(
     redoc_url="/redoc",
 )
 
+# Added before CORS so rate-limited responses still carry CORS headers
+add_rate_limiting(app)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -47,6 +55,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "Retry-After",
+        "X-RateLimit-Limit",
+        "X-RateLimit-Remaining",
+        "X-RateLimit-Reset",
+        "X-Prefetch",
+    ],
 )
 
 # Add custom middleware
@@ -64,6 +79,33 @@ app.include_router(templates.router)
 app.include_router(search.router)
 app.include_router(health.router)
 app.include_router(status_router.router)
+app.include_router(admission.router)
+app.include_router(webhooks.router)
+
+# Generation workers embedded in the API process
+embedded_worker = Worker(concurrency=GENERATION_WORKERS) if GENERATION_WORKERS else None
+
+
+@app.on_event("startup")
+async def start_embedded_worker():
+    if embedded_worker:
+        embedded_worker.start()
+
+
+@app.on_event("startup")
+async def open_github_client():
+    await github_service.start()
+
+
+@app.on_event("shutdown")
+async def stop_embedded_worker():
+    if embedded_worker:
+        embedded_worker.stop(timeout=5)
+
+
+@app.on_event("shutdown")
+async def close_github_client():
+    await github_service.close()
 
 
 @app.get("/")
@@ -4,6 +4,8 @@ from datetime import datetime
 import traceback
 import logging
 
+from ..services.github_scheduler import GitHubRateLimited
+
 logger = logging.getLogger(__name__)
 
 
@@ -29,15 +31,35 @@ def add_exception_handlers(app: FastAPI):
         elif exc.status_code >= 500:
             error_code = "INTERNAL_ERROR"
 
+        content = {
+            "error": error_code,
+            "detail": exc.detail,
+            "code": error_code,
+            "timestamp": datetime.utcnow().isoformat(),
+            "path": str(request.url.path),
+        }
+        headers = getattr(exc, "headers", None)
+        if exc.status_code == 429 and headers and "Retry-After" in headers:
+            content["retry_after"] = int(headers["Retry-After"])
+
+        return JSONResponse(
+            status_code=exc.status_code, content=content, headers=headers
+        )
+
+    @app.exception_handler(GitHubRateLimited)
+    async def github_rate_limited_handler(request: Request, exc: GitHubRateLimited):
+        """GitHub budget of the user's token is spent; ask the client to retry."""
         return JSONResponse(
-            status_code=exc.status_code,
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             content={
-                "error": error_code,
-                "detail": exc.detail,
-                "code": error_code,
+                "error": "GITHUB_RATE_LIMITED",
+                "detail": str(exc),
+                "code": "GITHUB_RATE_LIMITED",
                 "timestamp": datetime.utcnow().isoformat(),
                 "path": str(request.url.path),
+                "retry_after": exc.retry_after,
             },
+            headers={"Retry-After": str(exc.retry_after)},
         )
 
     @app.exception_handler(Exception)
@@ -0,0 +1,114 @@
+import os
+import logging
+from datetime import datetime
+from typing import Optional
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from ..auth.crypto import verify_token
+from ..services.metrics import metrics
+from ..services.rate_limit import rate_limiter, RateLimiter, RATE_LIMIT_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# Use the first X-Forwarded-For address; only enable behind a trusted proxy
+RATE_LIMIT_TRUST_FORWARDED = (
+    os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+)
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying token-bucket limits per user or client IP.
+
+    Written as plain ASGI rather than BaseHTTPMiddleware so rejected
+    requests never reach the routing layer and streaming responses are
+    passed through untouched.
+    """
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rule = self.limiter.rule_for(scope["method"], scope["path"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        client_key = self.client_key(scope, headers)
+        try:
+            if self.limiter.store.blocking:
+                result = await run_in_threadpool(self.limiter.check, rule, client_key)
+            else:
+                result = self.limiter.check(rule, client_key)
+        except Exception as e:
+            # Fail open: an unavailable store must not take the API down. The
+            # budget is unknown, so the response carries no X-RateLimit-*
+            # headers
+            metrics.increment("rate_limit_store_errors_total", rule=rule.name)
+            logger.warning(f"Rate limit check failed for {rule.name}: {e}")
+            await self.app(scope, receive, send)
+            return
+
+        limit_headers = {
+            "X-RateLimit-Limit": str(result["limit"]),
+            "X-RateLimit-Remaining": str(result["remaining"]),
+            "X-RateLimit-Reset": str(result["reset"]),
+        }
+
+        if not result["allowed"]:
+            metrics.increment("rate_limited_total", rule=rule.name)
+            response = JSONResponse(
+                status_code=429,
+                content={
+                    "error": "RATE_LIMITED",
+                    "detail": "Too many requests",
+                    "code": "RATE_LIMITED",
+                    "retry_after": result["retry_after"],
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "path": scope["path"],
+                },
+                headers={
+                    **limit_headers,
+                    "Retry-After": str(result["retry_after"]),
+                },
+            )
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                response_headers = MutableHeaders(scope=message)
+                for name, value in limit_headers.items():
+                    response_headers[name] = value
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+    def client_key(self, scope, headers: Headers) -> str:
+        """Key by user id from a valid bearer token, otherwise by client IP."""
+        authorization = headers.get("authorization", "")
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() == "bearer" and token:
+            payload = verify_token(token)
+            if payload and payload.get("sub"):
+                return f"user:{payload['sub']}"
+
+        if RATE_LIMIT_TRUST_FORWARDED and headers.get("x-forwarded-for"):
+            return f"ip:{headers['x-forwarded-for'].split(',')[0].strip()}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+
+def add_rate_limiting(app: FastAPI):
+    """Add rate limiting middleware to the FastAPI app."""
+    if RATE_LIMIT_ENABLED:
+        app.add_middleware(RateLimitMiddleware)
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException, status  # type: ignore
+from sqlalchemy.orm import Session  # type: ignore
+
+from ..db.database import get_db
+from ..schemas.admission import AdmissionLimits, AdmissionLimitsUpdate
+from ..services.admission import admission
+from ..auth.dependencies import require_admin_token
+
+router = APIRouter(
+    prefix="/admission",
+    tags=["Admission Control"],
+    dependencies=[Depends(require_admin_token)],
+)
+
+
+@router.get("/limits", response_model=AdmissionLimits)
+async def get_admission_limits():
+    """Get the generation admission limits in effect."""
+    return AdmissionLimits(**admission.limits())
+
+
+@router.put("/limits", response_model=AdmissionLimits)
+async def update_admission_limits(
+    limits_update: AdmissionLimitsUpdate,
+    db: Session = Depends(get_db),
+):
+    """Change admission limits for every API process without a restart."""
+    try:
+        limits = admission.update(db, limits_update.dict(exclude_unset=True))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return AdmissionLimits(**limits)
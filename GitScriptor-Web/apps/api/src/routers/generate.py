@@ -1,154 +1,373 @@
 import re
-import subprocess
 import tempfile
 import time
 import uuid
 import os
+import json
+import math
+import asyncio
 import logging
 from pathlib import Path
-from fastapi import APIRouter, HTTPException, Depends  # type: ignore
+from typing import Optional, Dict, Any
+from fastapi import (  # type: ignore
+    APIRouter,
+    HTTPException,
+    Depends,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.responses import StreamingResponse  # type: ignore
+from starlette.concurrency import run_in_threadpool  # type: ignore
+from fastapi.encoders import jsonable_encoder  # type: ignore
 from sqlalchemy.orm import Session  # type: ignore
 from pydantic import BaseModel, validator  # type: ignore
 from ..services.gitscriptor_core import generate_readme
+from ..services.batch import (
+    batch_manager,
+    batch_status,
+    count_items,
+    BATCH_MAX_ITEMS,
+)
+from ..services.jobs import job_runner, ERROR_STATUS_CODES, FINAL_STATUSES
+from ..services.admission import admission, AdmissionRejected
 
-from ..db.database import get_db
-from ..db.models import User, Repository, GenerationHistory
+from ..db.database import get_db, SessionLocal
+from ..db.models import User, GenerationHistory
 from ..schemas.readme import ReadmeGenerateRequest, ReadmeGenerateResponse
-from ..auth.dependencies import get_optional_current_user
+from ..schemas.job import (
+    BatchGenerateRequest,
+    BatchGenerateResponse,
+    BatchItemResult,
+    BatchStatusResponse,
+    GenerationJobResponse,
+    GenerationJobStatus,
+)
+from ..auth.dependencies import get_optional_current_user, get_current_user
+from ..auth.crypto import verify_token
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/generate")
 
+# How long POST /generate/ waits for its job before answering 504
+GENERATION_WAIT_TIMEOUT = int(os.getenv("GENERATION_WAIT_TIMEOUT", "300"))
+# Seconds between job reads while streaming progress events
+PROGRESS_POLL_INTERVAL = float(os.getenv("PROGRESS_POLL_INTERVAL", "0.5"))
+
+
+def _job_response(
+    job: GenerationHistory, current_user: Optional[User]
+) -> ReadmeGenerateResponse:
+    """Build the README response for a completed job."""
+    metadata = job.generation_metadata or {}
+
+    # Build repository metadata
+    repository_metadata = None
+    repository = job.repository
+    if repository:
+        repository_metadata = {
+            "id": repository.id,
+            "name": repository.name,
+            "full_name": repository.full_name,
+            "description": repository.description,
+            "language": repository.language,
+            "stars_count": repository.stars_count,
+            "forks_count": repository.forks_count,
+        }
+
+    return ReadmeGenerateResponse(
+        success=True,
+        markdown=job.markdown_content,
+        elapsed_ms=job.generation_time_ms or 0,
+        style=job.style,
+        template_used=metadata.get("template_id") or job.style,
+        sections_generated=metadata.get("sections_generated", []),
+        word_count=metadata.get("word_count"),
+        repository=repository_metadata,
+        metadata={
+            "repo_url": job.repo_url,
+            "generated_at": time.time(),
+            "user_authenticated": current_user is not None,
+            "ai_model": metadata.get("ai_model", "default"),
+            "model": job.model_used,
+            "max_output_tokens": metadata.get("max_output_tokens"),
+            "fallback": metadata.get("fallback"),
+        },
+        generation_id=job.job_id,
+    )
+
+
+def _admit(db: Session, user_id: Optional[int], count: int = 1) -> None:
+    """Reject with 429 and a Retry-After when the service is at capacity."""
+    try:
+        admission.admit(db, user_id, count)
+    except AdmissionRejected as e:
+        raise _rate_limited(e)
+
+
+def _rate_limited(e: AdmissionRejected) -> HTTPException:
+    logger.warning(f"Generation request rejected ({e.reason}): {e}")
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+def _get_job(
+    db: Session, job_id: str, current_user: Optional[User]
+) -> GenerationHistory:
+    """Load a job visible to the caller; guest jobs are reachable by id only."""
+    job = db.query(GenerationHistory).filter(GenerationHistory.job_id == job_id).first()
+    if not job or (
+        job.user_id is not None
+        and (current_user is None or job.user_id != current_user.id)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Job not found"
+        )
+    return job
+
 
 @router.post("/", response_model=ReadmeGenerateResponse)
 async def generate_readme_endpoint(
     request: ReadmeGenerateRequest,
+    raw_request: Request,
     current_user: User = Depends(get_optional_current_user),
     db: Session = Depends(get_db),
 ):
-    """Generate README from repository URL."""
-    start_time = time.time()
+    """Generate README from repository URL and wait for the result.
 
-    with tempfile.TemporaryDirectory() as tmp_dir:
-        try:
-            # Clone repository
-            result = subprocess.run(
-                ["git", "clone", "--depth", "1", request.repo_url, tmp_dir],
-                capture_output=True,
-                text=True,
-                timeout=60,
-            )
-            if result.returncode != 0:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Failed to clone repository: {result.stderr}",
-                )
+    Runs as a generation job; prefer POST /generate/jobs for long repositories.
+    The job is cancelled if the client disconnects before it finishes.
+    """
+    try:
+        with admission.waiting():
+            job = await _wait_for_job(request, raw_request, current_user, db)
+    except AdmissionRejected as e:
+        raise _rate_limited(e)
 
-            # Generate README
-            markdown = generate_readme(tmp_dir)
-            elapsed_ms = int((time.time() - start_time) * 1000)
-
-            # Count words and identify sections
-            word_count = len(markdown.split())
-            sections_generated = []
-
-            # Simple section detection
-            section_markers = ["# ", "## ", "### "]
-            lines = markdown.split("\n")
-            for line in lines:
-                if any(line.startswith(marker) for marker in section_markers):
-                    section_name = line.strip("#").strip().lower()
-                    if section_name not in sections_generated:
-                        sections_generated.append(section_name)
-
-            # Initialize repository as None for guest users
-            repository = None
-
-            # Save to history if user is authenticated
-            if current_user:
-                # Try to find matching repository
-                repo_url_clean = request.repo_url.rstrip("/").rstrip(".git")
-                repository = (
-                    db.query(Repository)
-                    .filter(Repository.url == repo_url_clean)
-                    .first()
-                )
+    if job.status == "cancelled":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="Generation was cancelled"
+        )
+    if job.status != "completed":
+        error_code = (job.generation_metadata or {}).get("error_code")
+        raise HTTPException(
+            status_code=ERROR_STATUS_CODES.get(error_code, 500),
+            detail=job.error_message or "README generation failed",
+        )
 
-                # Create history entry
-                history_entry = GenerationHistory(
-                    user_id=current_user.id,
-                    repository_id=repository.id if repository else None,
-                    repo_url=request.repo_url,
-                    markdown_content=markdown,
-                    style=request.style,
-                    generation_time_ms=elapsed_ms,
-                    status="completed",
-                    model_used="gitscriptor_core",  # Update based on actual model used
-                )
-                db.add(history_entry)
-                db.commit()
-
-            # Build repository metadata
-            repository_metadata = None
-            if repository:
-                repository_metadata = {
-                    "id": repository.id,
-                    "name": repository.name,
-                    "full_name": repository.full_name,
-                    "description": repository.description,
-                    "language": repository.language,
-                    "stars_count": repository.stars_count,
-                    "forks_count": repository.forks_count,
-                }
+    return _job_response(job, current_user)
 
-            return ReadmeGenerateResponse(
-                success=True,
-                markdown=markdown,
-                elapsed_ms=elapsed_ms,
-                style=request.style,
-                template_used=request.template_id or request.style,
-                sections_generated=sections_generated,
-                word_count=word_count,
-                repository=repository_metadata,
-                metadata={
-                    "repo_url": request.repo_url,
-                    "generated_at": time.time(),
-                    "user_authenticated": current_user is not None,
-                    "ai_model": request.ai_model or "default",
-                },
-                generation_id=f"gen_{int(time.time())}_{current_user.id if current_user else 'anon'}",
+
+def _poll_job(db: Session, job: GenerationHistory) -> str:
+    """Reload a job and return its status; blocking, so run it in a thread."""
+    db.refresh(job)
+    job_status = job.status
+    if job_status not in FINAL_STATUSES:
+        # Don't hold a transaction open between polls
+        db.rollback()
+    return job_status
+
+
+def _job_snapshot(db: Session, job_id: str) -> Optional[Dict[str, Any]]:
+    """Current state of a job as plain values; blocking, so run it in a thread."""
+    try:
+        job = (
+            db.query(GenerationHistory)
+            .filter(GenerationHistory.job_id == job_id)
+            .first()
+        )
+        if job is None:
+            return None
+        return {
+            "user_id": job.user_id,
+            "status": job.status,
+            "error_message": job.error_message,
+            "metadata": job.generation_metadata or {},
+        }
+    finally:
+        # Don't hold a transaction open between polls
+        db.rollback()
+
+
+async def _wait_for_job(
+    request: ReadmeGenerateRequest,
+    raw_request: Request,
+    current_user: Optional[User],
+    db: Session,
+) -> GenerationHistory:
+    """Create a job and poll it until it finishes."""
+    user_id = current_user.id if current_user else None
+    _admit(db, user_id)
+    job = job_runner.create_job(
+        db,
+        user_id=user_id,
+        repo_url=request.repo_url,
+        style=request.style,
+        ai_model=request.ai_model,
+        template_id=request.template_id,
+    )
+
+    # Poll the job without blocking the event loop
+    deadline = time.time() + GENERATION_WAIT_TIMEOUT
+    while True:
+        if await run_in_threadpool(_poll_job, db, job) in FINAL_STATUSES:
+            break
+        if await raw_request.is_disconnected():
+            # Nobody will read the result; free the worker and its clone
+            await run_in_threadpool(job_runner.cancel, db, job)
+            raise HTTPException(status_code=499, detail="Client closed request")
+        if time.time() > deadline:
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail=f"Generation still running; poll /generate/jobs/{job.job_id}",
             )
+        await asyncio.sleep(0.5)
 
-        except subprocess.TimeoutExpired:
-            # Save failed generation to history
-            if current_user:
-                history_entry = GenerationHistory(
-                    user_id=current_user.id,
-                    repo_url=request.repo_url,
-                    markdown_content="",
-                    style=request.style,
-                    status="failed",
-                    error_message="Repository clone timeout",
-                )
-                db.add(history_entry)
-                db.commit()
+    return job
 
-            raise HTTPException(status_code=408, detail="Repository clone timeout")
-        except Exception as e:
-            # Save failed generation to history
-            if current_user:
-                history_entry = GenerationHistory(
-                    user_id=current_user.id,
-                    repo_url=request.repo_url,
-                    markdown_content="",
-                    style=request.style,
-                    status="failed",
-                    error_message=str(e),
+
+@router.post(
+    "/jobs",
+    response_model=GenerationJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def create_generation_job(
+    request: ReadmeGenerateRequest,
+    current_user: User = Depends(get_optional_current_user),
+    db: Session = Depends(get_db),
+):
+    """Queue README generation and return the job id immediately."""
+    user_id = current_user.id if current_user else None
+    _admit(db, user_id)
+    job = job_runner.create_job(
+        db,
+        user_id=user_id,
+        repo_url=request.repo_url,
+        style=request.style,
+        ai_model=request.ai_model,
+        template_id=request.template_id,
+    )
+
+    return GenerationJobResponse(
+        job_id=job.job_id,
+        status=job.status,
+        status_url=f"/generate/jobs/{job.job_id}",
+    )
+
+
+@router.get("/jobs/{job_id}", response_model=GenerationJobStatus)
+async def get_generation_job(
+    job_id: str,
+    current_user: User = Depends(get_optional_current_user),
+    db: Session = Depends(get_db),
+):
+    """Get the progress of a generation job, with the README once completed."""
+    job = _get_job(db, job_id, current_user)
+    metadata = job.generation_metadata or {}
+
+    result = None
+    if job.status == "completed":
+        result = jsonable_encoder(_job_response(job, current_user))
+
+    return GenerationJobStatus(
+        job_id=job.job_id,
+        status=job.status,
+        stage=metadata.get("stage"),
+        repo_url=job.repo_url,
+        style=job.style,
+        queued_at=metadata.get("queued_at"),
+        started_at=metadata.get("started_at"),
+        completed_at=metadata.get("completed_at"),
+        elapsed_ms=job.generation_time_ms,
+        error_message=job.error_message,
+        progress=metadata.get("progress"),
+        events=metadata.get("events") or [],
+        phase_timings_ms=metadata.get("phase_timings_ms") or {},
+        result=result,
+    )
+
+
+@router.delete("/jobs/{job_id}", response_model=GenerationJobResponse)
+async def cancel_generation_job(
+    job_id: str,
+    current_user: User = Depends(get_optional_current_user),
+    db: Session = Depends(get_db),
+):
+    """Cancel a pending or running generation job."""
+    job = _get_job(db, job_id, current_user)
+    if not job_runner.cancel(db, job):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job already {job.status}",
+        )
+
+    return GenerationJobResponse(
+        job_id=job.job_id,
+        status=job.status,
+        status_url=f"/generate/jobs/{job.job_id}",
+    )
+
+
+@router.websocket("/jobs/{job_id}/events")
+async def generation_job_events(
+    websocket: WebSocket, job_id: str, token: Optional[str] = None
+):
+    """Push a job's phase transitions and progress until it finishes.
+
+    Browsers cannot set headers on WebSockets, so owned jobs take the access
+    token as a query parameter.
+    """
+    db = SessionLocal()
+    try:
+        job = await run_in_threadpool(_job_snapshot, db, job_id)
+        payload = verify_token(token) if token else None
+        user_id = int(payload["sub"]) if payload and payload.get("sub") else None
+        if not job or (job["user_id"] is not None and job["user_id"] != user_id):
+            await websocket.close(code=4404)
+            return
+
+        await websocket.accept()
+        sent_events, last_progress = 0, None
+        while True:
+            metadata = job["metadata"]
+
+            events = metadata.get("events") or []
+            for event in events[sent_events:]:
+                await websocket.send_json({"type": "phase", **event})
+            sent_events = len(events)
+
+            progress = metadata.get("progress")
+            if progress and progress != last_progress:
+                await websocket.send_json({"type": "progress", **progress})
+                last_progress = progress
+
+            if job["status"] in FINAL_STATUSES:
+                await websocket.send_json(
+                    {
+                        "type": "done",
+                        "status": job["status"],
+                        "error_message": job["error_message"],
+                        "phase_timings_ms": metadata.get("phase_timings_ms") or {},
+                    }
                 )
-                db.add(history_entry)
-                db.commit()
+                break
 
-            raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
+            await asyncio.sleep(PROGRESS_POLL_INTERVAL)
+            job = await run_in_threadpool(_job_snapshot, db, job_id)
+            if job is None:
+                # Deleted while streaming
+                break
+
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        db.close()
 
 
 @router.post("/test", response_model=ReadmeGenerateResponse)
@@ -165,9 +384,12 @@ async def test_generate_readme(
     with tempfile.TemporaryDirectory() as tmp_dir:
         try:
             # Generate README content
-            readme_content = generate_readme(
+            # Cloning and the model call block; keep them off the event loop
+            readme_content = await run_in_threadpool(
+                generate_readme,
                 request.repo_url,
                 style=request.style,
+                ai_model=request.ai_model,
             )
 
             generation_time_ms = int((time.time() - start_time) * 1000)
@@ -193,3 +415,117 @@ async def test_generate_readme(
             raise HTTPException(
                 status_code=500, detail=f"README generation failed: {str(e)}"
             )
+
+
+@router.post(
+    "/batch",
+    response_model=BatchGenerateResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def generate_readme_batch(
+    request: BatchGenerateRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Queue README generation for many repositories as generation jobs."""
+    total_items = len(request.repo_urls) * len(request.styles)
+    if total_items > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batch too large: {total_items} items (max {BATCH_MAX_ITEMS})",
+        )
+    _admit(db, current_user.id, total_items)
+
+    batch = batch_manager.submit(
+        user_id=current_user.id,
+        repo_urls=request.repo_urls,
+        styles=request.styles,
+        ai_model=request.ai_model or "default",
+    )
+
+    return BatchGenerateResponse(
+        batch_id=batch.id,
+        status="pending",
+        total_items=total_items,
+        status_url=f"/generate/batch/{batch.id}",
+        stream_url=f"/generate/batch/{batch.id}/stream",
+    )
+
+
+@router.get("/batch/{batch_id}", response_model=BatchStatusResponse)
+async def get_batch_status(
+    batch_id: str,
+    page: int = Query(1, ge=1, description="Page number"),
+    per_page: int = Query(25, ge=1, le=100, description="Items per page"),
+    item_status: Optional[str] = Query(
+        None,
+        alias="status",
+        description=(
+            "Filter items by status: pending, running, completed, failed, cancelled"
+        ),
+    ),
+    current_user: User = Depends(get_current_user),
+):
+    """Get batch progress with a page of per-item results."""
+    batch = await run_in_threadpool(batch_manager.get, batch_id, current_user.id)
+    if not batch:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Batch not found"
+        )
+
+    all_items = await run_in_threadpool(batch_manager.items, batch)
+    items = [
+        item for item in all_items if not item_status or item["status"] == item_status
+    ]
+
+    counts = count_items(all_items)
+    total = len(items)
+    offset = (page - 1) * per_page
+    total_pages = math.ceil(total / per_page)
+
+    return BatchStatusResponse(
+        batch_id=batch.id,
+        status=batch_status(counts, len(all_items)),
+        total_items=len(all_items),
+        pending=counts["pending"],
+        running=counts["running"],
+        completed=counts["completed"],
+        failed=counts["failed"],
+        cancelled=counts["cancelled"],
+        created_at=batch.created_at,
+        items=[BatchItemResult(**item) for item in items[offset : offset + per_page]],
+        page=page,
+        per_page=per_page,
+        total_pages=total_pages,
+        has_next=page < total_pages,
+        has_prev=page > 1,
+    )
+
+
+@router.get("/batch/{batch_id}/stream")
+async def stream_batch_results(
+    batch_id: str,
+    current_user: User = Depends(get_current_user),
+):
+    """Stream per-item results as newline-delimited JSON as they finish."""
+    batch = await run_in_threadpool(batch_manager.get, batch_id, current_user.id)
+    if not batch:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Batch not found"
+        )
+
+    async def event_stream():
+        sent = set()
+        while True:
+            items = await run_in_threadpool(batch_manager.items, batch)
+            for item in items:
+                if item["index"] in sent or item["status"] not in FINAL_STATUSES:
+                    continue
+                sent.add(item["index"])
+                yield json.dumps(jsonable_encoder(item)) + "\n"
+
+            if len(sent) >= len(items):
+                break
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
@@ -262,16 +262,37 @@ async def commit_readme_to_github(
     # Extract owner and repo name from full_name
     owner, repo_name = repository.full_name.split("/", 1)
 
+    branch = commit_request.branch or repository.default_branch
+
     # Commit to GitHub
-    commit_result = await github_service.commit_file(
-        access_token=access_token,
-        owner=owner,
-        repo=repo_name,
-        path="README.md",
-        content=commit_request.content,
-        message=commit_request.commit_message,
-        branch=commit_request.branch,
-    )
+    if commit_request.files:
+        # README and related files land in a single commit
+        commit_result = await github_service.commit_files(
+            access_token=access_token,
+            owner=owner,
+            repo=repo_name,
+            files={**commit_request.files, "README.md": commit_request.content},
+            message=commit_request.commit_message,
+            branch=branch,
+        )
+    else:
+        commit_result = await github_service.commit_file(
+            access_token=access_token,
+            owner=owner,
+            repo=repo_name,
+            path="README.md",
+            content=commit_request.content,
+            message=commit_request.commit_message,
+            branch=branch,
+        )
+
+    if commit_result and commit_result.get("files") == []:
+        return ReadmeCommitResponse(
+            success=True,
+            commit_sha=commit_result["commit"]["sha"],
+            commit_url=commit_result["commit"]["html_url"],
+            message="README is already up to date",
+        )
 
     if commit_result:
         return ReadmeCommitResponse(
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, desc, asc, func
 from typing import Optional, List
+from datetime import datetime
 import math
+import logging
 
 from ..db.database import get_db
 from ..db.models import User, Repository, GenerationHistory
@@ -14,10 +16,20 @@ from ..schemas.repository import (
     RepositoryAnalytics,
     RepositorySearchRequest,
 )
-from ..services.github import github_service
+from ..services.github import (
+    github_service,
+    GitHubGraphQLError,
+    GitHubListingError,
+    GITHUB_GRAPHQL_SYNC,
+)
+from ..services.github_scheduler import background_priority
+from ..services.prefetch import repository_prefetcher
+from ..services.repository_sync import repository_sync
 from ..auth.dependencies import get_current_user
 from ..auth.crypto import decrypt_token
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/repositories", tags=["Repositories"])
 
 
@@ -114,7 +126,11 @@ async def get_user_repositories(
 
 @router.get("/sync")
 async def sync_repositories(
-    current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+    full: bool = Query(
+        False, description="List every repository and remove deleted ones"
+    ),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
 ):
     """Sync repositories from GitHub."""
     if not current_user.access_token:
@@ -125,86 +141,98 @@ async def sync_repositories(
 
     access_token = decrypt_token(current_user.access_token)
 
-    # Get repositories from GitHub
-    github_repos = await github_service.get_user_repositories(
-        access_token=access_token, per_page=100  # Get all repositories
-    )
-
+    started_at = datetime.utcnow()
+    # Repositories updated before this were read by the previous sync
+    since = None if full else repository_sync.watermark(current_user, started_at)
+    # One query for what is stored; pages are diffed against it in memory
+    existing = repository_sync.load_existing(db, current_user.id)
+    seen = set()
     synced_count = 0
-    for github_repo in github_repos:
-        # Check if repository already exists
-        existing_repo = (
-            db.query(Repository)
-            .filter(
-                and_(
-                    Repository.github_id == github_repo["id"],
-                    Repository.owner_id == current_user.id,
-                )
+    total_repositories = 0
+    complete = True
+    # Bulk work; interactive calls on the same token go first
+    with background_priority():
+        synced = False
+        if GITHUB_GRAPHQL_SYNC:
+            try:
+                # Languages, topics and license come with each page of 100
+                async for github_repos in github_service.iter_user_repositories_graphql(
+                    access_token=access_token
+                ):
+                    github_repos, passed = repository_sync.updated_since(
+                        github_repos, since
+                    )
+                    total_repositories += len(github_repos)
+                    seen.update(github_repo["id"] for github_repo in github_repos)
+                    synced_count += repository_sync.upsert(
+                        db,
+                        current_user.id,
+                        github_repos,
+                        [github_repo["languages"] for github_repo in github_repos],
+                        existing,
+                    )
+                    if passed:
+                        break
+                synced = True
+            except GitHubGraphQLError as e:
+                # Pages already upserted are simply updated again below
+                logger.warning(f"GraphQL repository sync failed, using REST: {e}")
+                total_repositories = 0
+
+        if not synced:
+            try:
+                # Full syncs fetch pages concurrently and upsert them as they
+                # arrive; incremental ones read in order until the watermark
+                async for github_repos in github_service.iter_user_repository_pages(
+                    access_token=access_token,
+                    sequential=since is not None,
+                    strict=True,
+                ):
+                    github_repos, passed = repository_sync.updated_since(
+                        github_repos, since
+                    )
+                    total_repositories += len(github_repos)
+                    seen.update(github_repo["id"] for github_repo in github_repos)
+                    # Enrich the page concurrently, not one round trip per repository
+                    repo_languages = (
+                        await github_service.get_languages_for_repositories(
+                            access_token=access_token, repos=github_repos
+                        )
+                    )
+                    synced_count += repository_sync.upsert(
+                        db, current_user.id, github_repos, repo_languages, existing
+                    )
+                    if passed:
+                        break
+            except GitHubListingError as e:
+                # Keep what was read, but neither advance the watermark nor
+                # treat unread repositories as deleted
+                logger.warning(f"Repository sync incomplete: {e}")
+                complete = False
+
+    removed = 0
+    if complete:
+        if since is None:
+            removed = repository_sync.remove_missing(
+                db, current_user.id, seen, existing
             )
-            .first()
-        )
-
-        # Get language breakdown
-        languages = await github_service.get_repository_languages(
-            access_token=access_token,
-            owner=github_repo["owner"]["login"],
-            repo=github_repo["name"],
-        )
-
-        repo_data = {
-            "github_id": github_repo["id"],
-            "owner_id": current_user.id,
-            "name": github_repo["name"],
-            "full_name": github_repo["full_name"],
-            "description": github_repo.get("description"),
-            "url": github_repo["html_url"],
-            "clone_url": github_repo["clone_url"],
-            "ssh_url": github_repo["ssh_url"],
-            "homepage": github_repo.get("homepage"),
-            "language": github_repo.get("language"),
-            "languages": languages,
-            "topics": github_repo.get("topics", []),
-            "stars_count": github_repo["stargazers_count"],
-            "forks_count": github_repo["forks_count"],
-            "watchers_count": github_repo["watchers_count"],
-            "open_issues_count": github_repo["open_issues_count"],
-            "size": github_repo["size"],
-            "default_branch": github_repo["default_branch"],
-            "is_private": github_repo["private"],
-            "is_fork": github_repo["fork"],
-            "is_archived": github_repo["archived"],
-            "is_disabled": github_repo["disabled"],
-            "has_issues": github_repo["has_issues"],
-            "has_projects": github_repo["has_projects"],
-            "has_wiki": github_repo["has_wiki"],
-            "has_downloads": github_repo["has_downloads"],
-            "license_name": (
-                github_repo["license"]["name"] if github_repo.get("license") else None
-            ),
-            "license_key": (
-                github_repo["license"]["key"] if github_repo.get("license") else None
-            ),
-            "github_created_at": github_repo["created_at"],
-            "github_updated_at": github_repo["updated_at"],
-            "github_pushed_at": github_repo["pushed_at"],
-        }
-
-        if existing_repo:
-            # Update existing repository
-            for key, value in repo_data.items():
-                if key not in ["github_id", "owner_id"]:  # Don't update these fields
-                    setattr(existing_repo, key, value)
-        else:
-            # Create new repository
-            new_repo = Repository(**repo_data)
-            db.add(new_repo)
-            synced_count += 1
-
+            current_user.repositories_reconciled_at = started_at
+        current_user.repositories_synced_at = started_at
     db.commit()
 
+    # Warm the caches for the repositories the user is likely to open next
+    try:
+        repository_prefetcher.enqueue_for_user(db, current_user.id)
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Failed to queue repository prefetches: {e}")
+
     return {
         "message": f"Successfully synced {synced_count} new repositories",
-        "total_repositories": len(github_repos),
+        "total_repositories": total_repositories,
+        "full_sync": since is None,
+        "removed_repositories": removed,
+        "complete": complete,
     }
 
 
@@ -231,9 +259,32 @@ async def search_repositories(
     return search_results.get("items", [])
 
 
+def _request_prefetch(
+    db: Session, repository: Repository, source: str, response: Response
+) -> None:
+    """Speculatively warm the generation caches; the outcome goes in X-Prefetch."""
+    if repository.is_private:
+        # Workers clone anonymously
+        outcome = "private"
+    else:
+        try:
+            outcome = repository_prefetcher.request(
+                db, repository.owner_id, repository.url, source=source
+            )
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Failed to queue prefetch of {repository.url}: {e}")
+            outcome = "error"
+    response.headers["X-Prefetch"] = outcome
+
+
 @router.get("/{repository_id}", response_model=RepositorySchema)
 async def get_repository(
     repository_id: int,
+    response: Response,
+    prefetch: bool = Query(
+        False, description="Warm the generation caches for this repository"
+    ),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -251,12 +302,19 @@ async def get_repository(
             status_code=status.HTTP_404_NOT_FOUND, detail="Repository not found"
         )
 
+    if prefetch:
+        _request_prefetch(db, repository, "view", response)
+
     return RepositorySchema.from_orm(repository)
 
 
 @router.get("/{repository_id}/analytics", response_model=RepositoryAnalytics)
 async def get_repository_analytics(
     repository_id: int,
+    response: Response,
+    prefetch: bool = Query(
+        False, description="Warm the generation caches for this repository"
+    ),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -274,6 +332,9 @@ async def get_repository_analytics(
             status_code=status.HTTP_404_NOT_FOUND, detail="Repository not found"
         )
 
+    if prefetch:
+        _request_prefetch(db, repository, "analytics", response)
+
     # Calculate language breakdown percentages
     languages = repository.languages or {}
     total_bytes = sum(languages.values()) if languages else 0
@@ -298,3 +359,27 @@ async def get_repository_analytics(
     )
 
     return analytics
+
+
+@router.delete("/{repository_id}/prefetch")
+async def cancel_repository_prefetch(
+    repository_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Cancel a speculative prefetch, e.g. when the user navigates away."""
+    repository = (
+        db.query(Repository)
+        .filter(
+            and_(Repository.id == repository_id, Repository.owner_id == current_user.id)
+        )
+        .first()
+    )
+
+    if not repository:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Repository not found"
+        )
+
+    cancelled = repository_prefetcher.cancel(db, current_user.id, repository.url)
+    return {"repository_id": repository.id, "cancelled": cancelled}
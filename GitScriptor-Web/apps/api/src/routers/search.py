@@ -5,7 +5,10 @@ import asyncio
 
 from ..db.database import get_db
 from ..db.models import User, Repository
+from ..schemas.repository import RepositorySelection, PrefetchStatus
 from ..services.github import github_service
+from ..services.github_scheduler import GitHubRateLimited
+from ..services.prefetch import repository_prefetcher
 from ..auth.dependencies import get_current_user, get_optional_current_user
 from ..auth.crypto import decrypt_token
 
@@ -74,6 +77,9 @@ async def search_repositories_autocomplete(
                     for repo in public_results.get("items", [])
                     if repo["id"] not in [r["id"] for r in user_repos]
                 ]
+        except GitHubRateLimited:
+            # Answered with 429 and Retry-After so the client backs off
+            raise
         except Exception:
             # Fall back to public search only
             pass
@@ -89,6 +95,29 @@ async def search_repositories_autocomplete(
     }
 
 
+@router.post("/repositories/select", response_model=PrefetchStatus)
+async def select_repository(
+    selection: RepositorySelection,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Record an autocomplete pick and warm the generation caches for it."""
+    repository = (
+        db.query(Repository)
+        .filter(Repository.owner_id == current_user.id)
+        .filter(Repository.url == selection.url)
+        .first()
+    )
+    if repository is not None and repository.is_private:
+        # Workers clone anonymously
+        outcome = "private"
+    else:
+        outcome = repository_prefetcher.request(
+            db, current_user.id, selection.url, source="search"
+        )
+    return PrefetchStatus(url=selection.url, prefetch=outcome)
+
+
 @router.get("/languages")
 async def search_languages(
     q: str = Query(..., min_length=1, description="Language search query"),
@@ -180,34 +209,25 @@ async def search_users(
 
     try:
         # Search GitHub users
-        import httpx
-
-        headers = {
-            "Authorization": f"token {access_token}",
-            "Accept": "application/vnd.github.v3+json",
-        }
-
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://api.github.com/search/users",
-                headers=headers,
-                params={"q": q, "per_page": limit},
-            )
+        data = await github_service.search_users(
+            access_token=access_token, query=q, per_page=limit
+        )
 
-            if response.status_code == 200:
-                data = response.json()
-                users = [
-                    {
-                        "id": user["id"],
-                        "login": user["login"],
-                        "avatar_url": user["avatar_url"],
-                        "url": user["html_url"],
-                        "type": user["type"],
-                    }
-                    for user in data.get("items", [])
-                ]
+        if data is not None:
+            users = [
+                {
+                    "id": user["id"],
+                    "login": user["login"],
+                    "avatar_url": user["avatar_url"],
+                    "url": user["html_url"],
+                    "type": user["type"],
+                }
+                for user in data.get("items", [])
+            ]
 
-                return {"query": q, "users": users, "total": data.get("total_count", 0)}
+            return {"query": q, "users": users, "total": data.get("total_count", 0)}
+    except GitHubRateLimited:
+        raise
     except Exception:
         pass
 
@@ -9,6 +9,7 @@ from datetime import datetime
 
 from ..db.database import get_db
 from ..db.models import User, Repository, GenerationHistory
+from ..services.metrics import metrics
 
 router = APIRouter(tags=["Health & Status"])
 
@@ -117,3 +118,9 @@ async def get_api_status(db: Session = Depends(get_db)):
         system=system_info,
         statistics=statistics,
     )
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Get in-process service metrics (counters, gauges, latency percentiles)."""
+    return metrics.snapshot()
@@ -0,0 +1,48 @@
+import json
+from typing import Optional
+from urllib.parse import parse_qs
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status  # type: ignore
+from sqlalchemy.orm import Session  # type: ignore
+
+from ..db.database import get_db
+from ..services.webhooks import webhook_processor, WebhookSignatureError
+
+router = APIRouter(prefix="/webhooks", tags=["Webhooks"])
+
+
+@router.post("/github")
+async def github_webhook(
+    request: Request,
+    x_github_event: str = Header(...),
+    x_github_delivery: str = Header(...),
+    x_hub_signature_256: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """Receive push, repository and installation events from GitHub."""
+    if not webhook_processor.secret:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="GitHub webhooks are not configured",
+        )
+
+    body = await request.body()
+    try:
+        webhook_processor.verify(body, x_hub_signature_256)
+    except WebhookSignatureError as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
+
+    try:
+        if request.headers.get("content-type", "").startswith(
+            "application/x-www-form-urlencoded"
+        ):
+            payload = json.loads(parse_qs(body.decode("utf-8"))["payload"][0])
+        else:
+            payload = json.loads(body)
+    except (ValueError, KeyError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid webhook payload"
+        )
+
+    webhook_processor.record(x_github_event, x_github_delivery, payload)
+    return webhook_processor.receive(db, x_github_event, x_github_delivery, payload)
@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from typing import Optional
+
+
+class AdmissionLimits(BaseModel):
+    max_queue_depth: int
+    max_user_in_flight: int
+    max_anonymous_in_flight: int
+    max_waiting_requests: int
+
+
+class AdmissionLimitsUpdate(BaseModel):
+    """Limits to override; null restores the configured default."""
+
+    max_queue_depth: Optional[int] = None
+    max_user_in_flight: Optional[int] = None
+    max_anonymous_in_flight: Optional[int] = None
+    max_waiting_requests: Optional[int] = None
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, validator
 from datetime import datetime
 from typing import Optional, List, Dict, Any
+import re
 
 
 class GenerationHistoryBase(BaseModel):
@@ -66,3 +67,94 @@ class GenerationStats(BaseModel):
     most_used_style: str
     generations_by_month: Dict[str, int]
     popular_languages: Dict[str, int]
+
+
+class BatchGenerateRequest(BaseModel):
+    repo_urls: List[str]
+    styles: List[str] = ["classic"]  # Each repository is generated in each style
+    ai_model: Optional[str] = "default"
+
+    @validator("repo_urls")
+    def validate_repo_urls(cls, v):
+        if not v:
+            raise ValueError("repo_urls must not be empty")
+        pattern = r"^https://github\.com/[\w\-\.]+/[\w\-\.]+(?:\.git)?/?$"
+        invalid = [url for url in v if not re.match(pattern, url)]
+        if invalid:
+            raise ValueError(f"Invalid GitHub URL format: {', '.join(invalid[:5])}")
+        return v
+
+    @validator("styles")
+    def validate_styles(cls, v):
+        allowed_styles = ["classic", "modern", "minimal", "comprehensive"]
+        if not v:
+            raise ValueError("styles must not be empty")
+        for style in v:
+            if style not in allowed_styles:
+                raise ValueError(f"style must be one of: {', '.join(allowed_styles)}")
+        return v
+
+
+class BatchGenerateResponse(BaseModel):
+    batch_id: str
+    status: str  # pending, running, completed
+    total_items: int
+    status_url: str
+    stream_url: str
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    job_id: Optional[str] = None
+    repo_url: str
+    style: str
+    status: str  # pending, running, completed, failed, cancelled
+    markdown: Optional[str] = None
+    error_message: Optional[str] = None
+    elapsed_ms: Optional[int] = None
+    history_id: Optional[int] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+
+class BatchStatusResponse(BaseModel):
+    batch_id: str
+    status: str
+    total_items: int
+    pending: int
+    running: int
+    completed: int
+    failed: int
+    cancelled: int = 0
+    created_at: datetime
+    items: List[BatchItemResult]
+    page: int
+    per_page: int
+    total_pages: int
+    has_next: bool
+    has_prev: bool
+
+
+class GenerationJobResponse(BaseModel):
+    job_id: str
+    status: str  # pending, running, completed, failed, cancelled
+    status_url: str
+
+
+class GenerationJobStatus(BaseModel):
+    job_id: str
+    status: str  # pending, running, completed, failed, cancelled
+    # queued, cloning, analyzing, prompting, generating, persisting, then
+    # completed, failed or cancelled
+    stage: Optional[str] = None
+    repo_url: str
+    style: str
+    queued_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    elapsed_ms: Optional[int] = None
+    error_message: Optional[str] = None
+    progress: Optional[Dict[str, Any]] = None  # Latest phase details
+    events: List[Dict[str, Any]] = []  # Phase transitions with elapsed_ms
+    phase_timings_ms: Dict[str, int] = {}
+    result: Optional[Dict[str, Any]] = None  # ReadmeGenerateResponse when completed
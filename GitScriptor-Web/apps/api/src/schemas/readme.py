@@ -80,6 +80,16 @@ class ReadmeCommitRequest(BaseModel):
     content: str
     commit_message: Optional[str] = "Update README.md"
     branch: Optional[str] = None  # If None, uses default branch
+    # Other files committed with the README, e.g. badges or docs, by path
+    files: Optional[Dict[str, str]] = None
+
+    @validator("files")
+    def validate_files(cls, v):
+        for path in v or {}:
+            parts = path.split("/")
+            if any(part in ("", ".", "..", ".git") for part in parts):
+                raise ValueError(f"Invalid file path: {path}")
+        return v
 
 
 class ReadmeCommitResponse(BaseModel):
@@ -163,3 +163,22 @@ class PaginatedRepositories(BaseModel):
     total_pages: int
     has_next: bool
     has_prev: bool
+
+
+class RepositorySelection(BaseModel):
+    """An autocomplete result the user picked."""
+
+    url: str
+
+    @validator("url")
+    def validate_url(cls, v):
+        pattern = r"^https://github\.com/[\w\-\.]+/[\w\-\.]+(?:\.git)?/?$"
+        if not re.match(pattern, v):
+            raise ValueError("Invalid GitHub URL format")
+        v = v.rstrip("/")
+        return v[: -len(".git")] if v.endswith(".git") else v
+
+
+class PrefetchStatus(BaseModel):
+    url: str
+    prefetch: str  # queued, or why nothing was queued
@@ -0,0 +1,226 @@
+"""
+Admission control for generation requests.
+
+New generations are refused with 429 once the queue is too deep, a tenant
+already has too many jobs in flight, or too many synchronous requests are
+waiting on this process. Rejecting early with a Retry-After keeps latency
+flat for admitted requests instead of letting everyone's jobs slow down.
+
+Limits default to the ADMISSION_* environment variables and can be changed
+at runtime through PUT /admission/limits; overrides are stored in the
+service_settings table so every API process picks them up.
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, Any
+
+from sqlalchemy import func  # type: ignore
+from sqlalchemy.orm import Session  # type: ignore
+
+from ..db.database import SessionLocal
+from ..db.models import GenerationHistory, GenerationJob, ServiceSetting
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMITS = {
+    # Jobs waiting for a worker, across all tenants
+    "max_queue_depth": int(os.getenv("ADMISSION_MAX_QUEUE_DEPTH", "1000")),
+    # Queued and running jobs per signed-in user; fits a full batch
+    "max_user_in_flight": int(os.getenv("ADMISSION_MAX_USER_IN_FLIGHT", "600")),
+    # Queued and running jobs of all guests together
+    "max_anonymous_in_flight": int(
+        os.getenv("ADMISSION_MAX_ANONYMOUS_IN_FLIGHT", "50")
+    ),
+    # POST /generate/ requests held open by this process
+    "max_waiting_requests": int(os.getenv("ADMISSION_MAX_WAITING_REQUESTS", "100")),
+}
+ADMISSION_SETTINGS_KEY = "admission_limits"
+# Seconds a process keeps using limits read from the database
+ADMISSION_SETTINGS_TTL = float(os.getenv("ADMISSION_SETTINGS_TTL", "5"))
+ADMISSION_MAX_RETRY_AFTER = int(os.getenv("ADMISSION_MAX_RETRY_AFTER", "300"))
+# Job duration assumed before any job has completed
+ADMISSION_DEFAULT_JOB_SECONDS = float(os.getenv("ADMISSION_DEFAULT_JOB_SECONDS", "30"))
+
+
+class AdmissionRejected(Exception):
+    """A request refused because the service is at capacity."""
+
+    def __init__(self, reason: str, message: str, retry_after: int):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Checks generation requests against global and per-tenant limits."""
+
+    def __init__(
+        self,
+        defaults: Dict[str, int] = DEFAULT_LIMITS,
+        settings_ttl: float = ADMISSION_SETTINGS_TTL,
+    ):
+        self.defaults = dict(defaults)
+        self.settings_ttl = settings_ttl
+        self.overrides: Dict[str, int] = {}
+        self.loaded_at = 0.0
+        self.waiting_requests = 0
+        self.lock = threading.Lock()
+
+    def limits(self) -> Dict[str, int]:
+        """Current limits: environment defaults with runtime overrides applied."""
+        if time.time() - self.loaded_at > self.settings_ttl:
+            db = SessionLocal()
+            try:
+                setting = db.get(ServiceSetting, ADMISSION_SETTINGS_KEY)
+                overrides = dict(setting.value) if setting else {}
+            except Exception as e:
+                # Keep the last known limits if the settings can't be read
+                logger.warning(f"Failed to load admission limits: {e}")
+                overrides = self.overrides
+            finally:
+                db.close()
+            with self.lock:
+                self.overrides = overrides
+                self.loaded_at = time.time()
+        return {**self.defaults, **self.overrides}
+
+    def update(self, db: Session, limits: Dict[str, Optional[int]]) -> Dict[str, int]:
+        """Override limits at runtime; a None value restores the default."""
+        unknown = set(limits) - set(self.defaults)
+        if unknown:
+            raise ValueError(f"Unknown admission limits: {', '.join(sorted(unknown))}")
+        for name, value in limits.items():
+            if value is not None and value < 0:
+                raise ValueError(f"{name} must not be negative")
+
+        setting = db.get(ServiceSetting, ADMISSION_SETTINGS_KEY)
+        overrides = dict(setting.value) if setting else {}
+        for name, value in limits.items():
+            if value is None:
+                overrides.pop(name, None)
+            else:
+                overrides[name] = value
+
+        if setting:
+            setting.value = overrides
+        else:
+            db.add(ServiceSetting(key=ADMISSION_SETTINGS_KEY, value=overrides))
+        db.commit()
+
+        with self.lock:
+            self.overrides = overrides
+            self.loaded_at = time.time()
+        logger.info(f"Admission limits updated: {overrides}")
+        return {**self.defaults, **overrides}
+
+    def admit(self, db: Session, user_id: Optional[int], count: int = 1) -> None:
+        """Raise AdmissionRejected unless ``count`` new jobs fit within the limits."""
+        limits = self.limits()
+
+        queued = (
+            db.query(func.count(GenerationJob.id))
+            .filter(GenerationJob.state == "queued", GenerationJob.kind == "generate")
+            .scalar()
+        )
+        excess = queued + count - limits["max_queue_depth"]
+        if excess > 0:
+            running = (
+                db.query(func.count(GenerationJob.id))
+                .filter(
+                    GenerationJob.state == "running", GenerationJob.kind == "generate"
+                )
+                .scalar()
+            )
+            self._reject(
+                "queue_full",
+                "Generation queue is full, try again later",
+                self._drain_seconds(db, excess, running),
+            )
+
+        if user_id is None:
+            tenant_filter = GenerationJob.user_id.is_(None)
+            limit = limits["max_anonymous_in_flight"]
+        else:
+            tenant_filter = GenerationJob.user_id == user_id
+            limit = limits["max_user_in_flight"]
+        in_flight = dict(
+            db.query(GenerationJob.state, func.count(GenerationJob.id))
+            .filter(tenant_filter, GenerationJob.kind == "generate")
+            .group_by(GenerationJob.state)
+            .all()
+        )
+        excess = sum(in_flight.values()) + count - limit
+        if excess > 0:
+            self._reject(
+                "tenant_limit",
+                f"Too many generations in progress (limit {limit})",
+                self._drain_seconds(db, excess, in_flight.get("running", 0)),
+            )
+
+    @contextmanager
+    def waiting(self):
+        """Hold one of this process's slots for a request waiting on its job."""
+        limit = self.limits()["max_waiting_requests"]
+        with self.lock:
+            if self.waiting_requests >= limit:
+                rejected = True
+            else:
+                rejected = False
+                self.waiting_requests += 1
+        if rejected:
+            self._reject(
+                "too_many_waiting",
+                "Too many generations in progress, use POST /generate/jobs",
+                self._clamp(self._job_seconds(None)),
+            )
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.waiting_requests -= 1
+
+    def _reject(self, reason: str, message: str, retry_after: int) -> None:
+        metrics.increment("admission_rejected_total", reason=reason)
+        raise AdmissionRejected(reason, message, retry_after)
+
+    def _drain_seconds(self, db: Session, excess: int, running: int) -> int:
+        """Estimate how long until ``excess`` jobs have finished."""
+        rounds = math.ceil(excess / max(running, 1))
+        return self._clamp(rounds * self._job_seconds(db))
+
+    def _job_seconds(self, db: Optional[Session]) -> float:
+        """Typical job duration, from this process or recent history."""
+        job_ms = metrics.latency("generation_job_ms").percentile(50)
+        if job_ms is None and db is not None:
+            # Jobs run by dedicated workers are only visible in the database
+            recent = (
+                db.query(GenerationHistory.generation_time_ms)
+                .filter(
+                    GenerationHistory.status == "completed",
+                    GenerationHistory.generation_time_ms.isnot(None),
+                )
+                .order_by(GenerationHistory.id.desc())
+                .limit(50)
+                .subquery()
+            )
+            job_ms = db.query(func.avg(recent.c.generation_time_ms)).scalar()
+        if job_ms is None:
+            return ADMISSION_DEFAULT_JOB_SECONDS
+        return float(job_ms) / 1000
+
+    def _clamp(self, seconds: float) -> int:
+        return max(1, min(ADMISSION_MAX_RETRY_AFTER, math.ceil(seconds)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"limits": self.limits(), "waiting_requests": self.waiting_requests}
+
+
+# Global instance
+admission = AdmissionController()
+metrics.register_collector("admission", admission.stats)
@@ -0,0 +1,160 @@
+"""
+Batch README generation.
+
+Every repository/style pair in a batch is queued as a regular generation
+job, so batches share the worker tier and are scheduled fairly against
+everyone else's jobs. A batch exists only as the batch id on its jobs'
+history rows, so any API process can report on it, also after a restart.
+"""
+
+import os
+import uuid
+import logging
+from datetime import datetime
+from typing import Optional, Dict, List, Any
+
+from sqlalchemy import func  # type: ignore
+
+from ..db.database import SessionLocal
+from ..db.models import GenerationHistory
+from .jobs import job_runner
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+
+
+class Batch:
+    """A batch of generation jobs owned by one user."""
+
+    def __init__(
+        self,
+        user_id: int,
+        batch_id: Optional[str] = None,
+        created_at: Optional[datetime] = None,
+    ):
+        self.id = batch_id or f"batch_{uuid.uuid4().hex}"
+        self.user_id = user_id
+        self.created_at = created_at or datetime.utcnow()
+        # Job ids in item order, known when the batch was submitted here
+        self.job_ids: List[str] = []
+
+
+def count_items(items: List[Dict[str, Any]]) -> Dict[str, int]:
+    counts = {"pending": 0, "running": 0, "completed": 0, "failed": 0, "cancelled": 0}
+    for item in items:
+        counts[item["status"]] += 1
+    return counts
+
+
+def batch_status(counts: Dict[str, int], total: int) -> str:
+    if counts["pending"] == total:
+        return "pending"
+    if counts["pending"] or counts["running"]:
+        return "running"
+    return "completed"
+
+
+class BatchManager:
+    """Queues batch items as generation jobs and reports their progress."""
+
+    def submit(
+        self,
+        user_id: int,
+        repo_urls: List[str],
+        styles: List[str],
+        ai_model: str = "default",
+    ) -> Batch:
+        """Create a batch and queue all of its items."""
+        batch = Batch(user_id)
+        db = SessionLocal()
+        try:
+            for repo_url in repo_urls:
+                for style in styles:
+                    job = job_runner.create_job(
+                        db,
+                        user_id=user_id,
+                        repo_url=repo_url,
+                        style=style,
+                        ai_model=ai_model,
+                        metadata={
+                            "batch_id": batch.id,
+                            "batch_index": len(batch.job_ids),
+                        },
+                        commit=False,
+                    )
+                    job.batch_id = batch.id
+                    batch.job_ids.append(job.job_id)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        logger.info(
+            f"Batch {batch.id} queued {len(batch.job_ids)} jobs for user {user_id}"
+        )
+        return batch
+
+    def get(self, batch_id: str, user_id: int) -> Optional[Batch]:
+        """Get a batch owned by the given user."""
+        db = SessionLocal()
+        try:
+            created_at = (
+                db.query(func.min(GenerationHistory.generated_at))
+                .filter(
+                    GenerationHistory.batch_id == batch_id,
+                    GenerationHistory.user_id == user_id,
+                )
+                .scalar()
+            )
+        finally:
+            db.close()
+        if created_at is None:
+            # Unknown, someone else's, or every item was deleted
+            return None
+        return Batch(user_id, batch_id=batch_id, created_at=created_at)
+
+    def items(self, batch: Batch) -> List[Dict[str, Any]]:
+        """Current state of every item, in submission order."""
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(GenerationHistory)
+                .filter(
+                    GenerationHistory.batch_id == batch.id,
+                    GenerationHistory.user_id == batch.user_id,
+                )
+                .all()
+            )
+        finally:
+            db.close()
+
+        items = []
+        for row in rows:
+            metadata = row.generation_metadata or {}
+            items.append(
+                {
+                    "index": metadata.get("batch_index", 0),
+                    "job_id": row.job_id,
+                    "repo_url": row.repo_url,
+                    "style": row.style,
+                    "status": row.status,
+                    "markdown": (
+                        row.markdown_content if row.status == "completed" else None
+                    ),
+                    "error_message": row.error_message,
+                    "elapsed_ms": row.generation_time_ms,
+                    "history_id": row.id,
+                    "started_at": metadata.get("started_at"),
+                    "completed_at": metadata.get("completed_at"),
+                }
+            )
+        # History items deleted by the user leave gaps in the indexes
+        items.sort(key=lambda item: item["index"])
+        return items
+
+
+# Global instance
+batch_manager = BatchManager()
@@ -0,0 +1,205 @@
+"""
+Offline bulk README generation through the model's batch-prediction API.
+
+Prompts are collected into a JSONL job file, submitted as a single batch job
+and the results are fanned back into GenerationHistory once the job finishes.
+Batch jobs are billed and rate limited separately from interactive requests,
+so overnight regeneration does not eat into the per-minute quota.
+
+Usage:
+    python -m src.services.bulk --user-id 1 --style classic repos.txt
+    python -m src.services.bulk --user-id 1 --local repos.txt  # local stand-in
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+import argparse
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, List, Any
+
+from ..db.database import SessionLocal
+from ..db.models import Repository, GenerationHistory
+from .gitscriptor_core import (
+    GeminiAPI,
+    GitScriptorError,
+    LocalBatchProvider,
+    analyze_repository,
+    create_readme_instructions,
+    create_repository_prompt,
+)
+
+logger = logging.getLogger(__name__)
+
+BULK_JOB_DIR = os.getenv(
+    "BULK_JOB_DIR", os.path.join(tempfile.gettempdir(), "gitscriptor-bulk")
+)
+BULK_POLL_INTERVAL = int(os.getenv("BULK_POLL_INTERVAL", "60"))
+BULK_TIMEOUT = int(os.getenv("BULK_TIMEOUT", str(24 * 60 * 60)))
+
+
+class BulkGenerationPipeline:
+    """Builds, submits and collects batch-prediction jobs."""
+
+    def __init__(
+        self,
+        provider=None,
+        job_dir: str = BULK_JOB_DIR,
+        poll_interval: int = BULK_POLL_INTERVAL,
+        timeout: int = BULK_TIMEOUT,
+    ):
+        self.provider = provider or GeminiAPI()
+        self.job_dir = Path(job_dir)
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+    def build_job_file(self, repo_urls: List[str], style: str) -> Path:
+        """Analyze each repository and write one request per line."""
+        job_id = f"bulk_{datetime.utcnow():%Y%m%d%H%M%S}_{uuid.uuid4().hex[:8]}"
+        self.job_dir.mkdir(parents=True, exist_ok=True)
+        job_file = self.job_dir / f"{job_id}.jsonl"
+
+        manifest = {"job_id": job_id, "style": style, "items": {}}
+        with open(job_file, "w", encoding="utf-8") as f:
+            for index, repo_url in enumerate(repo_urls):
+                key = f"item-{index:05d}"
+                analysis = analyze_repository(repo_url)
+                request = GeminiAPI.build_request(
+                    create_repository_prompt(repo_url, analysis, style),
+                    system_instruction=create_readme_instructions(style),
+                )
+                f.write(json.dumps({"key": key, "request": request}) + "\n")
+                manifest["items"][key] = {"repo_url": repo_url, "style": style}
+
+        with open(job_file.with_suffix(".manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        logger.info(f"Wrote bulk job file {job_file} with {len(repo_urls)} requests")
+        return job_file
+
+    def submit(self, job_file: Path) -> str:
+        """Submit a job file through the provider."""
+        job_name = self.provider.submit_batch(job_file, display_name=job_file.stem)
+        logger.info(f"Submitted bulk job {job_file.stem} as {job_name}")
+        return job_name
+
+    def wait(self, job_name: str) -> Dict[str, Any]:
+        """Poll the provider until the job succeeds, fails or times out."""
+        deadline = time.time() + self.timeout
+        while True:
+            job = self.provider.get_batch(job_name)
+            if job["state"] in ("succeeded", "failed"):
+                return job
+            if time.time() > deadline:
+                raise GitScriptorError(f"Bulk job {job_name} timed out")
+            logger.info(f"Bulk job {job_name} is {job['state']}, polling again")
+            time.sleep(self.poll_interval)
+
+    def store_results(
+        self, user_id: int, job_file: Path, job: Dict[str, Any]
+    ) -> List[int]:
+        """Write one GenerationHistory row per job item."""
+        with open(job_file.with_suffix(".manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        db = SessionLocal()
+        history_ids = []
+        try:
+            for key, item in manifest["items"].items():
+                result = job["results"].get(key)
+                markdown, error_message, usage = "", None, {}
+
+                if job["state"] != "succeeded":
+                    error_message = "Batch job failed"
+                elif result is None:
+                    error_message = "No result returned by batch job"
+                elif "error" in result:
+                    error_message = result["error"].get("message", "Unknown error")
+                else:
+                    try:
+                        markdown = GeminiAPI.extract_text(result["response"])
+                        usage = result["response"].get("usageMetadata", {})
+                    except (GitScriptorError, KeyError, IndexError) as e:
+                        error_message = str(e)
+
+                repo_url_clean = item["repo_url"].rstrip("/").rstrip(".git")
+                repository = (
+                    db.query(Repository)
+                    .filter(Repository.url == repo_url_clean)
+                    .first()
+                )
+
+                history_entry = GenerationHistory(
+                    user_id=user_id,
+                    repository_id=repository.id if repository else None,
+                    repo_url=item["repo_url"],
+                    markdown_content=markdown,
+                    style=item["style"],
+                    prompt_tokens=usage.get("promptTokenCount"),
+                    completion_tokens=usage.get("candidatesTokenCount"),
+                    model_used=self.provider.model,
+                    status="failed" if error_message else "completed",
+                    error_message=error_message,
+                    generation_metadata={
+                        "mode": "batch_prediction",
+                        "bulk_job": manifest["job_id"],
+                        "bulk_job_name": job["name"],
+                        "bulk_key": key,
+                    },
+                )
+                db.add(history_entry)
+                db.flush()
+                history_ids.append(history_entry.id)
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        return history_ids
+
+    def run(self, user_id: int, repo_urls: List[str], style: str = "classic") -> Dict:
+        """Run the whole pipeline and return a summary."""
+        job_file = self.build_job_file(repo_urls, style)
+        job_name = self.submit(job_file)
+        job = self.wait(job_name)
+        history_ids = self.store_results(user_id, job_file, job)
+
+        return {
+            "job_file": str(job_file),
+            "job_name": job_name,
+            "state": job["state"],
+            "total": len(repo_urls),
+            "history_ids": history_ids,
+        }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Bulk README generation")
+    parser.add_argument("repo_list", help="File with one repository URL per line")
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--style", default="classic")
+    parser.add_argument(
+        "--local", action="store_true", help="Use the local batch stand-in"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    with open(args.repo_list, "r", encoding="utf-8") as f:
+        repo_urls = [line.strip() for line in f if line.strip()]
+
+    provider = LocalBatchProvider() if args.local else None
+    pipeline = BulkGenerationPipeline(provider=provider)
+    summary = pipeline.run(args.user_id, repo_urls, style=args.style)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,114 @@
 import httpx
 import os
-from typing import Optional, Dict, Any, List
+import base64
+import time
+import asyncio
+import hashlib
+import logging
+import importlib.util
+from typing import Optional, Dict, Any, List, Callable, Awaitable, Tuple
+from typing import AsyncIterator
 from datetime import datetime
+from urllib.parse import urlparse, parse_qs
 
 from ..schemas.auth import GitHubUser
 from ..schemas.repository import Repository, RepositoryCreate
+from .github_cache import ConditionalCache, GITHUB_CACHE_ENABLED
+from .github_commits import (
+    CommitStateCache,
+    BranchState,
+    git_blob_sha,
+    GITHUB_COMMIT_ATTEMPTS,
+)
+from .github_scheduler import (
+    RateLimitScheduler,
+    GitHubRateLimited,
+    INTERACTIVE,
+    resource_for,
+)
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+GITHUB_HTTP2 = os.getenv("GITHUB_HTTP2", "true").lower() == "true"
+GITHUB_MAX_CONNECTIONS = int(os.getenv("GITHUB_MAX_CONNECTIONS", "100"))
+GITHUB_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.getenv("GITHUB_MAX_KEEPALIVE_CONNECTIONS", "20")
+)
+GITHUB_KEEPALIVE_EXPIRY = float(os.getenv("GITHUB_KEEPALIVE_EXPIRY", "30"))
+GITHUB_TIMEOUT = float(os.getenv("GITHUB_TIMEOUT", "10"))
+GITHUB_CONNECT_TIMEOUT = float(os.getenv("GITHUB_CONNECT_TIMEOUT", "5"))
+# Seconds to wait for a free connection when the pool is exhausted
+GITHUB_POOL_TIMEOUT = float(os.getenv("GITHUB_POOL_TIMEOUT", "5"))
+
+# Concurrent requests per fan-out, e.g. languages of every synced repository
+GITHUB_FANOUT_CONCURRENCY = int(os.getenv("GITHUB_FANOUT_CONCURRENCY", "10"))
+# Optional enrichment calls stop when a token has this few requests left
+GITHUB_RATE_LIMIT_RESERVE = int(os.getenv("GITHUB_RATE_LIMIT_RESERVE", "100"))
+
+# Sync repositories with paged GraphQL queries instead of REST plus one
+# languages call per repository
+GITHUB_GRAPHQL_SYNC = os.getenv("GITHUB_GRAPHQL_SYNC", "true").lower() == "true"
+
+# HTTP/2 needs the optional h2 package (httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# The viewer's repositories with everything sync stores, so a page of 100
+# repositories is one request. REST /user/repos?type=all lists the same set.
+REPOSITORIES_QUERY = """
+query($first: Int!, $after: String) {
+  viewer {
+    repositories(
+      first: $first
+      after: $after
+      ownerAffiliations: [OWNER, COLLABORATOR, ORGANIZATION_MEMBER]
+      orderBy: {field: UPDATED_AT, direction: DESC}
+    ) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        databaseId
+        name
+        nameWithOwner
+        owner { login }
+        description
+        url
+        sshUrl
+        homepageUrl
+        primaryLanguage { name }
+        languages(first: 100, orderBy: {field: SIZE, direction: DESC}) {
+          edges { size node { name } }
+        }
+        repositoryTopics(first: 20) { nodes { topic { name } } }
+        stargazerCount
+        forkCount
+        issues(states: OPEN) { totalCount }
+        pullRequests(states: OPEN) { totalCount }
+        diskUsage
+        defaultBranchRef { name }
+        isPrivate
+        isFork
+        isArchived
+        isDisabled
+        hasIssuesEnabled
+        hasProjectsEnabled
+        hasWikiEnabled
+        licenseInfo { name key }
+        createdAt
+        updatedAt
+        pushedAt
+      }
+    }
+  }
+}
+"""
+
+
+class GitHubListingError(Exception):
+    """A page of a listing could not be fetched."""
+
+
+class GitHubGraphQLError(GitHubListingError):
+    """A GraphQL query failed or returned no data."""
 
 
 class GitHubService:
@@ -15,6 +119,192 @@ class GitHubService:
             "GITHUB_REDIRECT_URI", "http://localhost:8000/auth/callback"
         )
         self.base_url = "https://api.github.com"
+        self._client: Optional[httpx.AsyncClient] = None
+        self.in_flight = 0
+        self.cache = ConditionalCache() if GITHUB_CACHE_ENABLED else None
+        self.scheduler = RateLimitScheduler()
+        self.commit_state = CommitStateCache()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        Shared connection pool for all GitHub calls.
+
+        Opened on application startup; created on first use elsewhere, e.g.
+        in scripts.
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+
+    def _create_client(self) -> httpx.AsyncClient:
+        http2 = GITHUB_HTTP2 and HTTP2_AVAILABLE
+        if GITHUB_HTTP2 and not HTTP2_AVAILABLE:
+            logger.warning("h2 is not installed, GitHub client falls back to HTTP/1.1")
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=GITHUB_MAX_CONNECTIONS,
+                max_keepalive_connections=GITHUB_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=GITHUB_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                GITHUB_TIMEOUT,
+                connect=GITHUB_CONNECT_TIMEOUT,
+                pool=GITHUB_POOL_TIMEOUT,
+            ),
+            headers={
+                "Accept": "application/vnd.github.v3+json",
+                "User-Agent": "GitScriptor",
+            },
+        )
+
+    async def start(self) -> None:
+        """Open the shared client; called on application startup."""
+        self._client = self.client
+
+    async def close(self) -> None:
+        """Close pooled connections; called on application shutdown."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        access_token: Optional[str] = None,
+        **kwargs,
+    ) -> httpx.Response:
+        """
+        Send a request through the shared pool, authenticated as the user.
+
+        Authenticated requests wait for the token's rate-limit budget and are
+        retried once after a rate-limit refusal. Authenticated GETs are
+        revalidated against the conditional cache; a 304 is turned back into
+        the cached 200 response.
+        """
+        headers = kwargs.pop("headers", {})
+        token_key = None
+        if access_token:
+            headers["Authorization"] = f"token {access_token}"
+            token_key = _token_key(access_token)
+
+        cache_key, cached = None, None
+        if self.cache is not None and method == "GET" and token_key:
+            cache_key = self.cache.key(token_key, url, kwargs.get("params"))
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                headers.update(self.cache.validators(cached))
+        resource = resource_for(url)
+        retried = False
+        while True:
+            if token_key:
+                # Waits for budget, or raises GitHubRateLimited
+                await self.scheduler.acquire(token_key, resource)
+            start = time.time()
+            self.in_flight += 1
+            try:
+                response = await self.client.request(
+                    method, url, headers=headers, **kwargs
+                )
+            finally:
+                self.in_flight -= 1
+                metrics.observe("github_request_ms", (time.time() - start) * 1000)
+            metrics.increment(
+                "github_requests_total",
+                status=response.status_code,
+                http_version=response.http_version,
+            )
+            if not token_key:
+                break
+            self.scheduler.record(token_key, response.headers, response.status_code)
+            if not _rate_limited(response):
+                break
+            if retried:
+                raise GitHubRateLimited(
+                    resource, self.scheduler.delay(token_key, resource, INTERACTIVE)
+                )
+            # Once more after the budget resets, if the caller can wait that long
+            retried = True
+
+        if cache_key is not None:
+            if response.status_code == 304 and cached is not None:
+                self.cache.record(hit=True)
+                return httpx.Response(
+                    200,
+                    headers=cached["headers"],
+                    content=cached["body"],
+                    request=response.request,
+                )
+            self.cache.record(hit=False)
+            if response.status_code == 200 and (
+                "etag" in response.headers or "last-modified" in response.headers
+            ):
+                self.cache.set(cache_key, response.content, response.headers)
+        return response
+
+    def remaining_requests(self, access_token: str) -> Optional[int]:
+        """Core requests left in the token's current rate-limit window, if known."""
+        return self.scheduler.remaining(_token_key(access_token), "core")
+
+    async def fan_out(
+        self,
+        access_token: str,
+        items: List[Any],
+        fetch: Callable[[Any], Awaitable[Any]],
+        concurrency: int = GITHUB_FANOUT_CONCURRENCY,
+    ) -> List[Optional[Any]]:
+        """
+        Run ``fetch`` for every item with bounded concurrency.
+
+        Results are in item order. An item whose call failed, or was skipped
+        because the token is down to its rate-limit reserve, gets None.
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(item: Any) -> Optional[Any]:
+            async with semaphore:
+                remaining = self.remaining_requests(access_token)
+                if remaining is not None and remaining <= GITHUB_RATE_LIMIT_RESERVE:
+                    metrics.increment("github_fanout_total", outcome="skipped")
+                    return None
+                try:
+                    result = await fetch(item)
+                except GitHubRateLimited:
+                    metrics.increment("github_fanout_total", outcome="skipped")
+                    return None
+                except httpx.HTTPError as e:
+                    logger.warning(f"GitHub request failed during fan-out: {e}")
+                    metrics.increment("github_fanout_total", outcome="failed")
+                    return None
+                metrics.increment(
+                    "github_fanout_total",
+                    outcome="failed" if result is None else "completed",
+                )
+                return result
+
+        return await asyncio.gather(*(run(item) for item in items))
+
+    def stats(self) -> Dict[str, Any]:
+        """Connection pool usage of the shared client."""
+        stats: Dict[str, Any] = {
+            "open": self._client is not None and not self._client.is_closed,
+            "http2": GITHUB_HTTP2 and HTTP2_AVAILABLE,
+            "max_connections": GITHUB_MAX_CONNECTIONS,
+            "in_flight": self.in_flight,
+            "request_ms": metrics.latency("github_request_ms").summary(),
+            "conditional_cache": self.cache.stats() if self.cache else None,
+            "commit_state": self.commit_state.stats(),
+        }
+        # httpx doesn't expose its pool; read httpcore's when it's there
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is not None:
+            stats["connections"] = len(connections)
+            stats["idle_connections"] = sum(1 for c in connections if c.is_idle())
+        return stats
 
     def get_oauth_url(self, state: Optional[str] = None) -> str:
         """Get GitHub OAuth authorization URL."""
@@ -31,54 +321,48 @@ class GitHubService:
 
     async def exchange_code_for_token(self, code: str) -> Optional[Dict[str, Any]]:
         """Exchange authorization code for access token."""
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://github.com/login/oauth/access_token",
-                data={
-                    "client_id": self.client_id,
-                    "client_secret": self.client_secret,
-                    "code": code,
-                    "redirect_uri": self.redirect_uri,
-                },
-                headers={"Accept": "application/json"},
-            )
+        response = await self._request(
+            "POST",
+            "https://github.com/login/oauth/access_token",
+            data={
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "code": code,
+                "redirect_uri": self.redirect_uri,
+            },
+            headers={"Accept": "application/json"},
+        )
 
-            if response.status_code == 200:
-                return response.json()
-            return None
+        if response.status_code == 200:
+            return response.json()
+        return None
 
     async def get_user_info(self, access_token: str) -> Optional[GitHubUser]:
         """Get user information from GitHub API."""
-        headers = {
-            "Authorization": f"token {access_token}",
-            "Accept": "application/vnd.github.v3+json",
-        }
-
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{self.base_url}/user", headers=headers)
-
-            if response.status_code == 200:
-                user_data = response.json()
-                return GitHubUser(
-                    id=user_data["id"],
-                    login=user_data["login"],
-                    name=user_data.get("name"),
-                    email=user_data.get("email"),
-                    avatar_url=user_data["avatar_url"],
-                    bio=user_data.get("bio"),
-                    location=user_data.get("location"),
-                    company=user_data.get("company"),
-                    blog=user_data.get("blog"),
-                    twitter_username=user_data.get("twitter_username"),
-                    public_repos=user_data.get("public_repos", 0),
-                    public_gists=user_data.get("public_gists", 0),
-                    followers=user_data.get("followers", 0),
-                    following=user_data.get("following", 0),
-                    created_at=datetime.fromisoformat(
-                        user_data["created_at"].replace("Z", "+00:00")
-                    ),
-                )
-            return None
+        response = await self._request("GET", "/user", access_token)
+
+        if response.status_code == 200:
+            user_data = response.json()
+            return GitHubUser(
+                id=user_data["id"],
+                login=user_data["login"],
+                name=user_data.get("name"),
+                email=user_data.get("email"),
+                avatar_url=user_data["avatar_url"],
+                bio=user_data.get("bio"),
+                location=user_data.get("location"),
+                company=user_data.get("company"),
+                blog=user_data.get("blog"),
+                twitter_username=user_data.get("twitter_username"),
+                public_repos=user_data.get("public_repos", 0),
+                public_gists=user_data.get("public_gists", 0),
+                followers=user_data.get("followers", 0),
+                following=user_data.get("following", 0),
+                created_at=datetime.fromisoformat(
+                    user_data["created_at"].replace("Z", "+00:00")
+                ),
+            )
+        return None
 
     async def get_user_repositories(
         self,
@@ -90,11 +374,6 @@ class GitHubService:
         page: int = 1,
     ) -> List[Dict[str, Any]]:
         """Get user repositories from GitHub API."""
-        headers = {
-            "Authorization": f"token {access_token}",
-            "Accept": "application/vnd.github.v3+json",
-        }
-
         params = {
             "sort": sort,
             "direction": direction,
@@ -103,70 +382,201 @@ class GitHubService:
             "page": page,
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/user/repos", headers=headers, params=params
+        response = await self._request(
+            "GET", "/user/repos", access_token, params=params
+        )
+
+        if response.status_code == 200:
+            return response.json()
+        return []
+
+    async def iter_user_repository_pages(
+        self,
+        access_token: str,
+        sort: str = "updated",
+        direction: str = "desc",
+        type: str = "all",
+        per_page: int = 100,
+        sequential: bool = False,
+        strict: bool = False,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Yield every page of the user's repositories.
+
+        The first page's Link header tells how many pages there are; the
+        rest are then fetched concurrently and yielded as they arrive, so
+        pages may come out of order. ``sequential`` follows the "next" links
+        in order instead, for callers that stop early. Failed pages are
+        skipped, or raise GitHubListingError when ``strict``.
+        """
+        params = {
+            "sort": sort,
+            "direction": direction,
+            "type": type,
+            "per_page": per_page,
+            "page": 1,
+        }
+        first = await self._request("GET", "/user/repos", access_token, params=params)
+        if first.status_code != 200:
+            _listing_failed(
+                f"Failed to list repositories: HTTP {first.status_code}", strict
             )
+            return
+        yield first.json()
+
+        last_page = None if sequential else _last_page(first)
+        if last_page is None:
+            # Follow "next" links one by one
+            next_url = first.links.get("next", {}).get("url")
+            while next_url:
+                response = await self._request("GET", next_url, access_token)
+                if response.status_code != 200:
+                    _listing_failed(
+                        f"Failed to list repositories: HTTP {response.status_code}",
+                        strict,
+                    )
+                    return
+                yield response.json()
+                next_url = response.links.get("next", {}).get("url")
+            return
+
+        semaphore = asyncio.Semaphore(max(1, GITHUB_FANOUT_CONCURRENCY))
+
+        async def fetch(page: int) -> Tuple[int, httpx.Response]:
+            async with semaphore:
+                response = await self._request(
+                    "GET", "/user/repos", access_token, params={**params, "page": page}
+                )
+                return page, response
+
+        tasks = [asyncio.ensure_future(fetch(page)) for page in range(2, last_page + 1)]
+        try:
+            for next_page in asyncio.as_completed(tasks):
+                page, response = await next_page
+                if response.status_code != 200:
+                    _listing_failed(
+                        f"Failed to list repositories page {page}: "
+                        f"HTTP {response.status_code}",
+                        strict,
+                    )
+                    continue
+                yield response.json()
+        finally:
+            # The caller stopped early or a page failed
+            for task in tasks:
+                task.cancel()
+
+    async def iter_user_repositories_graphql(
+        self, access_token: str, per_page: int = 100
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Yield the user's repositories a page at a time via GraphQL.
+
+        Repositories are shaped like REST /user/repos items plus a
+        ``languages`` breakdown, so no per-repository calls are needed.
+        Raises GitHubGraphQLError when a page can't be fetched.
+        """
+        after: Optional[str] = None
+        while True:
+            response = await self._request(
+                "POST",
+                "/graphql",
+                access_token,
+                json={
+                    "query": REPOSITORIES_QUERY,
+                    "variables": {"first": per_page, "after": after},
+                },
+            )
+            if response.status_code != 200:
+                raise GitHubGraphQLError(f"HTTP {response.status_code}")
+            payload = response.json()
+            repositories = ((payload.get("data") or {}).get("viewer") or {}).get(
+                "repositories"
+            )
+            if repositories is None:
+                raise GitHubGraphQLError(str(payload.get("errors")))
+            if payload.get("errors"):
+                # e.g. organizations that restrict OAuth apps; their nodes are null
+                logger.warning(
+                    f"GraphQL repository page had errors: {payload['errors']}"
+                )
+            metrics.increment("github_graphql_pages_total")
+
+            yield [
+                _repository_from_graphql(node)
+                for node in repositories["nodes"]
+                if node is not None
+            ]
 
-            if response.status_code == 200:
-                return response.json()
-            return []
+            page_info = repositories["pageInfo"]
+            if not page_info["hasNextPage"]:
+                return
+            after = page_info["endCursor"]
 
     async def get_repository_details(
         self, access_token: str, owner: str, repo: str
     ) -> Optional[Dict[str, Any]]:
         """Get detailed repository information."""
-        headers = {
-            "Authorization": f"token {access_token}",
-            "Accept": "application/vnd.github.v3+json",
-        }
+        response = await self._request("GET", f"/repos/{owner}/{repo}", access_token)
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/repos/{owner}/{repo}", headers=headers
-            )
-
-            if response.status_code == 200:
-                return response.json()
-            return None
+        if response.status_code == 200:
+            return response.json()
+        return None
 
     async def get_repository_languages(
         self, access_token: str, owner: str, repo: str
-    ) -> Dict[str, int]:
-        """Get repository language breakdown."""
-        headers = {
-            "Authorization": f"token {access_token}",
-            "Accept": "application/vnd.github.v3+json",
-        }
-
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/repos/{owner}/{repo}/languages", headers=headers
-            )
+    ) -> Optional[Dict[str, int]]:
+        """Get repository language breakdown; None if GitHub did not return it."""
+        response = await self._request(
+            "GET", f"/repos/{owner}/{repo}/languages", access_token
+        )
 
-            if response.status_code == 200:
-                return response.json()
-            return {}
+        if response.status_code == 200:
+            return response.json()
+        return None
+
+    async def get_languages_for_repositories(
+        self, access_token: str, repos: List[Dict[str, Any]]
+    ) -> List[Optional[Dict[str, int]]]:
+        """Language breakdowns of many repositories, fetched concurrently.
+
+        None marks a repository whose languages could not be fetched.
+        """
+        return await self.fan_out(
+            access_token,
+            repos,
+            lambda repo: self.get_repository_languages(
+                access_token, repo["owner"]["login"], repo["name"]
+            ),
+        )
 
     async def search_repositories(
         self, access_token: str, query: str, sort: str = "stars", per_page: int = 30
     ) -> Dict[str, Any]:
         """Search repositories on GitHub."""
-        headers = {
-            "Authorization": f"token {access_token}",
-            "Accept": "application/vnd.github.v3+json",
-        }
-
         params = {"q": query, "sort": sort, "per_page": per_page}
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/search/repositories", headers=headers, params=params
-            )
+        response = await self._request(
+            "GET", "/search/repositories", access_token, params=params
+        )
 
-            if response.status_code == 200:
-                return response.json()
-            return {"items": [], "total_count": 0}
+        if response.status_code == 200:
+            return response.json()
+        return {"items": [], "total_count": 0}
+
+    async def search_users(
+        self, access_token: str, query: str, per_page: int = 10
+    ) -> Optional[Dict[str, Any]]:
+        """Search users on GitHub."""
+        params = {"q": query, "per_page": per_page}
+
+        response = await self._request(
+            "GET", "/search/users", access_token, params=params
+        )
+
+        if response.status_code == 200:
+            return response.json()
+        return None
 
     async def commit_file(
         self,
@@ -178,42 +588,247 @@ class GitHubService:
         message: str,
         branch: Optional[str] = None,
     ) -> Optional[Dict[str, Any]]:
-        """Commit a file to a GitHub repository."""
-        headers = {
-            "Authorization": f"token {access_token}",
-            "Accept": "application/vnd.github.v3+json",
-        }
-
-        # Get current file SHA if it exists
-        file_response = await self._get_file_sha(
-            access_token, owner, repo, path, branch
-        )
-
-        import base64
-
-        encoded_content = base64.b64encode(content.encode()).decode()
-
+        """
+        Commit a file to a GitHub repository.
+
+        The SHA of the file being replaced is remembered from our previous
+        commit, so a repeated commit is a single PUT. It is looked up only
+        when unknown or when GitHub reports a conflict, and the commit is
+        then retried on the SHA just read.
+        """
+        state = self.commit_state.get(owner, repo, branch)
         data = {
             "message": message,
-            "content": encoded_content,
+            "content": base64.b64encode(content.encode()).decode(),
         }
-
         if branch:
             data["branch"] = branch
 
-        if file_response:
-            data["sha"] = file_response["sha"]
+        # Our own commits to the branch go out one at a time
+        async with state.lock:
+            sha = state.blobs.get(path)
+            if sha is None:
+                sha = await self._get_file_sha(access_token, owner, repo, path, branch)
+            for attempt in range(GITHUB_COMMIT_ATTEMPTS):
+                if sha:
+                    data["sha"] = sha
+                else:
+                    data.pop("sha", None)
+                response = await self._request(
+                    "PUT",
+                    f"/repos/{owner}/{repo}/contents/{path}",
+                    access_token,
+                    json=data,
+                )
+                if response.status_code in [200, 201]:
+                    result = response.json()
+                    commit = result["commit"]
+                    parents = commit.get("parents") or [{}]
+                    state.advance(
+                        parents[0].get("sha"), commit["sha"], commit["tree"]["sha"]
+                    )
+                    state.blobs[path] = result["content"]["sha"]
+                    metrics.increment("github_commits_total", api="contents")
+                    return result
+                # 409: the file changed since; 422: it exists but we sent no SHA
+                if (
+                    response.status_code not in (409, 422)
+                    or attempt + 1 == GITHUB_COMMIT_ATTEMPTS
+                ):
+                    break
+                metrics.increment("github_commit_conflicts_total", api="contents")
+                current = await self._get_file_sha(
+                    access_token, owner, repo, path, branch
+                )
+                if current == sha:
+                    # Nothing moved, so retrying would fail the same way
+                    break
+                sha = current
 
-        async with httpx.AsyncClient() as client:
-            response = await client.put(
-                f"{self.base_url}/repos/{owner}/{repo}/contents/{path}",
-                headers=headers,
-                json=data,
+        logger.warning(
+            f"Failed to commit {path} to {owner}/{repo}: HTTP {response.status_code}"
+        )
+        return None
+
+    async def commit_files(
+        self,
+        access_token: str,
+        owner: str,
+        repo: str,
+        files: Dict[str, str],
+        message: str,
+        branch: str,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Commit several files to a branch as one commit.
+
+        Goes through the Git Data API: a tree with the files' contents
+        inline, a commit on top of the branch head and a fast-forward of the
+        branch. The head and its tree are remembered from our previous
+        commit, so the branch is fully read only the first time and after
+        someone else pushed to it, in which case the commit is rebuilt on the
+        head just read. Files known to be unchanged are left out, and no
+        commit is made when nothing changed; that is only decided against the
+        branch's current head, so a push by someone else is never mistaken
+        for our own content.
+
+        Returns ``commit`` and the ``files`` that changed.
+        """
+        state = self.commit_state.get(owner, repo, branch)
+        response = None
+        # Our own commits to the branch go out one at a time
+        async with state.lock:
+            reload = state.head is None
+            for attempt in range(GITHUB_COMMIT_ATTEMPTS):
+                if reload:
+                    if not await self._load_branch(
+                        access_token, owner, repo, branch, state
+                    ):
+                        return None
+                head = state.head
+                changed = {
+                    path: content
+                    for path, content in files.items()
+                    if state.blobs.get(path) != git_blob_sha(content.encode())
+                }
+                tree = None
+                if changed:
+                    tree = await self._git_create(
+                        access_token,
+                        owner,
+                        repo,
+                        "trees",
+                        {
+                            "base_tree": state.tree,
+                            "tree": [
+                                {
+                                    "path": path,
+                                    "mode": "100644",
+                                    "type": "blob",
+                                    "content": content,
+                                }
+                                for path, content in changed.items()
+                            ],
+                        },
+                    )
+                    if tree is None:
+                        return None
+                if tree is None or tree["sha"] == state.tree:
+                    if not reload:
+                        # Our remembered head may be stale; an empty-looking
+                        # commit is only trusted against the current head
+                        current = await self._branch_head(
+                            access_token, owner, repo, branch
+                        )
+                        if current is None:
+                            return None
+                        if current != head:
+                            reload = True
+                            continue
+                    # Same content as the head; a commit would be empty
+                    return {
+                        "commit": {
+                            "sha": head,
+                            "html_url": f"https://github.com/{owner}/{repo}/commit/{head}",
+                        },
+                        "files": [],
+                    }
+
+                commit = await self._git_create(
+                    access_token,
+                    owner,
+                    repo,
+                    "commits",
+                    {"message": message, "tree": tree["sha"], "parents": [head]},
+                )
+                if commit is None:
+                    return None
+                response = await self._request(
+                    "PATCH",
+                    f"/repos/{owner}/{repo}/git/refs/heads/{branch}",
+                    access_token,
+                    json={"sha": commit["sha"], "force": False},
+                )
+                if response.status_code == 200:
+                    state.advance(head, commit["sha"], tree["sha"])
+                    for path, content in changed.items():
+                        state.blobs[path] = git_blob_sha(content.encode())
+                    metrics.increment("github_commits_total", api="git_data")
+                    return {"commit": commit, "files": list(changed)}
+                if response.status_code not in (409, 422):
+                    break
+                # Not a fast-forward: the branch moved since our last commit
+                metrics.increment("github_commit_conflicts_total", api="git_data")
+                reload = True
+
+        logger.warning(
+            f"Failed to update {owner}/{repo} branch {branch}: "
+            + (
+                f"HTTP {response.status_code}"
+                if response is not None
+                else "the branch kept moving"
             )
+        )
+        return None
 
-            if response.status_code in [200, 201]:
-                return response.json()
+    async def _load_branch(
+        self,
+        access_token: str,
+        owner: str,
+        repo: str,
+        branch: str,
+        state: BranchState,
+    ) -> bool:
+        """Read the branch head and its tree into ``state``."""
+        head = await self._branch_head(access_token, owner, repo, branch)
+        if head is None:
+            return False
+        response = await self._request(
+            "GET", f"/repos/{owner}/{repo}/git/commits/{head}", access_token
+        )
+        if response.status_code != 200:
+            logger.warning(
+                f"Failed to read commit {head} of {owner}/{repo}: "
+                f"HTTP {response.status_code}"
+            )
+            return False
+        state.reset(head, response.json()["tree"]["sha"])
+        return True
+
+    async def _branch_head(
+        self, access_token: str, owner: str, repo: str, branch: str
+    ) -> Optional[str]:
+        """Commit the branch points at; revalidated, so usually a 304."""
+        response = await self._request(
+            "GET", f"/repos/{owner}/{repo}/git/ref/heads/{branch}", access_token
+        )
+        if response.status_code != 200:
+            logger.warning(
+                f"Failed to read {owner}/{repo} branch {branch}: "
+                f"HTTP {response.status_code}"
+            )
             return None
+        return response.json()["object"]["sha"]
+
+    async def _git_create(
+        self,
+        access_token: str,
+        owner: str,
+        repo: str,
+        kind: str,
+        data: Dict[str, Any],
+    ) -> Optional[Dict[str, Any]]:
+        """Create a Git tree or commit object."""
+        response = await self._request(
+            "POST", f"/repos/{owner}/{repo}/git/{kind}", access_token, json=data
+        )
+        if response.status_code == 201:
+            return response.json()
+        logger.warning(
+            f"Failed to create git {kind} in {owner}/{repo}: "
+            f"HTTP {response.status_code}"
+        )
+        return None
 
     async def _get_file_sha(
         self,
@@ -222,28 +837,113 @@ class GitHubService:
         repo: str,
         path: str,
         branch: Optional[str] = None,
-    ) -> Optional[Dict[str, Any]]:
-        """Get the SHA of a file if it exists."""
-        headers = {
-            "Authorization": f"token {access_token}",
-            "Accept": "application/vnd.github.v3+json",
-        }
+    ) -> Optional[str]:
+        """
+        Blob SHA of a file, None if it doesn't exist.
 
+        Read from the listing of the file's directory, which carries SHAs but
+        not file contents.
+        """
         params = {}
         if branch:
             params["ref"] = branch
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/repos/{owner}/{repo}/contents/{path}",
-                headers=headers,
-                params=params,
-            )
+        directory, _, name = path.rpartition("/")
+        response = await self._request(
+            "GET",
+            f"/repos/{owner}/{repo}/contents/{directory}".rstrip("/"),
+            access_token,
+            params=params,
+        )
 
-            if response.status_code == 200:
-                return response.json()
-            return None
+        if response.status_code == 200:
+            for entry in response.json():
+                if entry["name"] == name and entry["type"] == "file":
+                    return entry["sha"]
+        return None
+
+
+def _last_page(response: httpx.Response) -> Optional[int]:
+    """Page number of the Link header's "last" relation."""
+    url = response.links.get("last", {}).get("url")
+    if not url:
+        return None
+    try:
+        return int(parse_qs(urlparse(url).query)["page"][0])
+    except (KeyError, ValueError):
+        return None
+
+
+def _repository_from_graphql(node: Dict[str, Any]) -> Dict[str, Any]:
+    """A GraphQL repository node in the shape of a REST repository."""
+    license_info = node.get("licenseInfo")
+    return {
+        "id": node["databaseId"],
+        "name": node["name"],
+        "full_name": node["nameWithOwner"],
+        "owner": {"login": node["owner"]["login"]},
+        "description": node.get("description"),
+        "html_url": node["url"],
+        "clone_url": f"{node['url']}.git",
+        "ssh_url": node["sshUrl"],
+        "homepage": node.get("homepageUrl") or None,
+        "language": (node.get("primaryLanguage") or {}).get("name"),
+        "languages": {
+            edge["node"]["name"]: edge["size"] for edge in node["languages"]["edges"]
+        },
+        "topics": [
+            topic["topic"]["name"] for topic in node["repositoryTopics"]["nodes"]
+        ],
+        "stargazers_count": node["stargazerCount"],
+        "forks_count": node["forkCount"],
+        # REST reports stars as watchers_count too
+        "watchers_count": node["stargazerCount"],
+        # REST counts open pull requests as issues
+        "open_issues_count": node["issues"]["totalCount"]
+        + node["pullRequests"]["totalCount"],
+        "size": node.get("diskUsage") or 0,
+        # Empty repositories have no default branch ref
+        "default_branch": (node.get("defaultBranchRef") or {}).get("name", "main"),
+        "private": node["isPrivate"],
+        "fork": node["isFork"],
+        "archived": node["isArchived"],
+        "disabled": node["isDisabled"],
+        "has_issues": node["hasIssuesEnabled"],
+        "has_projects": node["hasProjectsEnabled"],
+        "has_wiki": node["hasWikiEnabled"],
+        # Not exposed over GraphQL; REST reports true for nearly every repository
+        "has_downloads": True,
+        "license": (
+            {"name": license_info["name"], "key": license_info["key"]}
+            if license_info
+            else None
+        ),
+        "created_at": node["createdAt"],
+        "updated_at": node["updatedAt"],
+        "pushed_at": node.get("pushedAt"),
+    }
+
+
+def _listing_failed(message: str, strict: bool) -> None:
+    if strict:
+        raise GitHubListingError(message)
+    logger.warning(message)
+
+
+def _rate_limited(response: httpx.Response) -> bool:
+    """Whether GitHub refused the request for its primary or secondary limit."""
+    return response.status_code in (403, 429) and (
+        response.headers.get("x-ratelimit-remaining") == "0"
+        or "retry-after" in response.headers
+    )
+
+
+def _token_key(access_token: str) -> str:
+    """Rate limits are tracked per token without keeping the token itself."""
+    return hashlib.sha256(access_token.encode("utf-8")).hexdigest()[:16]
 
 
 # Global instance
 github_service = GitHubService()
+metrics.register_collector("github_http", github_service.stats)
+metrics.register_collector("github_rate_limits", github_service.scheduler.stats)
@@ -0,0 +1,193 @@
+"""
+Conditional-request cache for GitHub REST calls.
+
+Successful GET responses are kept with their ETag and Last-Modified per
+(token, URL, params). Repeating the call sends If-None-Match and
+If-Modified-Since; a 304 answer is served from the cache and does not count
+against the token's GitHub rate limit.
+
+Entries live in a bounded in-memory LRU and, when GITHUB_CACHE_DIR is set,
+in files there as well, so the cache survives restarts and is shared by the
+processes on a node. The directory is pruned to the most recently used
+GITHUB_CACHE_DISK_MAX_ENTRIES files.
+"""
+
+import os
+import json
+import base64
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+GITHUB_CACHE_ENABLED = os.getenv("GITHUB_CACHE_ENABLED", "true").lower() == "true"
+GITHUB_CACHE_MAX_ENTRIES = int(os.getenv("GITHUB_CACHE_MAX_ENTRIES", "2000"))
+# Unset keeps the cache in memory only
+GITHUB_CACHE_DIR = os.getenv("GITHUB_CACHE_DIR")
+# Files kept in GITHUB_CACHE_DIR; the least recently used are deleted beyond it
+GITHUB_CACHE_DISK_MAX_ENTRIES = int(os.getenv("GITHUB_CACHE_DISK_MAX_ENTRIES", "20000"))
+
+# Response headers replayed with a cached body
+CACHED_HEADERS = ("content-type", "link", "etag", "last-modified")
+
+
+class ConditionalCache:
+    """Validators and bodies of GitHub responses, in memory and optionally on disk."""
+
+    def __init__(
+        self,
+        max_entries: int = GITHUB_CACHE_MAX_ENTRIES,
+        directory: Optional[str] = GITHUB_CACHE_DIR,
+        max_disk_entries: int = GITHUB_CACHE_DISK_MAX_ENTRIES,
+    ):
+        self.max_entries = max_entries
+        self.directory = Path(directory) if directory else None
+        self.max_disk_entries = max_disk_entries
+        # Prune after this many saves, so the directory overshoots by at most 10%
+        self._prune_every = max(1, max_disk_entries // 10)
+        self._saves_since_prune = 0
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evicted = 0
+
+    @staticmethod
+    def key(token_key: str, url: str, params: Optional[Dict[str, Any]]) -> str:
+        """Cache key; callers pass a hash of the token, never the token itself."""
+        canonical = json.dumps(
+            [token_key, url, sorted((params or {}).items())], default=str
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached entry with ``body``, ``headers`` and validators, if any."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        entry = self._load(key)
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    def validators(self, entry: Dict[str, Any]) -> Dict[str, str]:
+        """Conditional request headers for a cached entry."""
+        headers = {}
+        if entry["headers"].get("etag"):
+            headers["If-None-Match"] = entry["headers"]["etag"]
+        if entry["headers"].get("last-modified"):
+            headers["If-Modified-Since"] = entry["headers"]["last-modified"]
+        return headers
+
+    def set(self, key: str, body: bytes, headers: Dict[str, str]) -> None:
+        """Store a response that carries an ETag or Last-Modified."""
+        entry = {
+            "body": body,
+            "headers": {
+                name: headers[name] for name in CACHED_HEADERS if name in headers
+            },
+        }
+        self._remember(key, entry)
+        self.stored += 1
+        self._save(key, entry)
+
+    def record(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _remember(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            # Recently read entries survive pruning
+            os.utime(path)
+            return {
+                "body": base64.b64decode(stored["body"]),
+                "headers": stored["headers"],
+            }
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save(self, key: str, entry: Dict[str, Any]) -> None:
+        if self.directory is None:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            staging = path.with_suffix(".tmp")
+            # Bodies can describe private repositories
+            fd = os.open(staging, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "body": base64.b64encode(entry["body"]).decode("ascii"),
+                        "headers": entry["headers"],
+                    },
+                    f,
+                )
+            os.replace(staging, path)
+        except OSError as e:
+            logger.warning(f"Failed to persist GitHub cache entry: {e}")
+            return
+        with self._lock:
+            self._saves_since_prune += 1
+            if self._saves_since_prune < self._prune_every:
+                return
+            self._saves_since_prune = 0
+        self._prune()
+
+    def _prune(self) -> None:
+        """Delete the least recently used files beyond ``max_disk_entries``."""
+        files = []
+        for path in self.directory.glob("*/*.json"):
+            try:
+                files.append((path.stat().st_mtime, path))
+            except OSError:
+                # Removed by another process
+                continue
+        files.sort()
+        for _, path in files[: max(0, len(files) - self.max_disk_entries)]:
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            with self._lock:
+                self.evicted += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stored": self.stored,
+                "evicted": self.evicted,
+                "persistent": self.directory is not None,
+            }
@@ -0,0 +1,88 @@
+"""
+Last known state of the branches the API commits to.
+
+Replacing a file needs the SHA of its current blob, and a commit through the
+Git Data API needs the branch head and its tree. All three are known after
+one of our own commits, so they are remembered per repository and branch
+and the next commit goes out without looking anything up. A stale entry
+shows up as a conflict from GitHub; only then is the branch read again.
+
+Each branch state carries a lock that is held for the whole commit, so
+concurrent commits from this process to one branch take turns instead of
+racing each other into conflicts. Commits from other processes can still
+move the branch; those conflicts are retried on freshly read state.
+"""
+
+import os
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+# Repository branches whose state is remembered
+GITHUB_COMMIT_STATE_SIZE = int(os.getenv("GITHUB_COMMIT_STATE_SIZE", "1000"))
+# Tries per commit when the branch moved under us
+GITHUB_COMMIT_ATTEMPTS = int(os.getenv("GITHUB_COMMIT_ATTEMPTS", "3"))
+
+
+def git_blob_sha(content: bytes) -> str:
+    """SHA git gives a file with this content."""
+    header = f"blob {len(content)}\0".encode("utf-8")
+    return hashlib.sha1(header + content).hexdigest()
+
+
+class BranchState:
+    """Head commit, tree and known blob SHAs of one branch."""
+
+    def __init__(self):
+        self.head: Optional[str] = None
+        self.tree: Optional[str] = None
+        self.blobs: Dict[str, str] = {}
+        # Held while committing to the branch
+        self.lock = asyncio.Lock()
+
+    def reset(self, head: str, tree: str) -> None:
+        """Start over from a head read from GitHub; blob SHAs are unknown."""
+        self.head = head
+        self.tree = tree
+        self.blobs = {}
+
+    def advance(self, parent: Optional[str], head: str, tree: str) -> None:
+        """Move to a commit we made; blob SHAs hold only if we built on our head."""
+        if parent is None or parent != self.head:
+            self.blobs = {}
+        self.head = head
+        self.tree = tree
+
+
+class CommitStateCache:
+    """Bounded LRU of branch states keyed by repository and branch."""
+
+    def __init__(self, max_entries: int = GITHUB_COMMIT_STATE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], BranchState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, owner: str, repo: str, branch: Optional[str]) -> BranchState:
+        """State of a branch; None is the default branch. Created when missing."""
+        key = (f"{owner}/{repo}".lower(), branch or "")
+        with self._lock:
+            state = self._entries.get(key)
+            if state is None:
+                state = self._entries[key] = BranchState()
+                excess = len(self._entries) - self.max_entries
+                # Oldest first; branches being committed to keep their lock
+                for entry_key in list(self._entries)[:-1] if excess > 0 else []:
+                    if not self._entries[entry_key].lock.locked():
+                        del self._entries[entry_key]
+                        excess -= 1
+                        if excess == 0:
+                            break
+            else:
+                self._entries.move_to_end(key)
+            return state
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"branches": len(self._entries), "max_entries": self.max_entries}
@@ -0,0 +1,225 @@
+"""
+Rate-limit-aware scheduling of GitHub API calls.
+
+GitHub budgets each token separately per resource: core REST calls, search
+(30 a minute) and GraphQL. The budget reported by every response is tracked
+here, and requests are delayed rather than sent into a 403:
+
+- interactive requests (the default) go out until the budget is spent and
+  then wait briefly for the window to reset;
+- background requests (repository sync) leave a share of each budget to
+  interactive ones and are paced evenly across the rest of the window once
+  it runs low.
+
+A request that would wait longer than its priority allows raises
+GitHubRateLimited, which the API answers with 429 and Retry-After.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, Tuple, Iterator
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# Longest wait for budget before giving up, in seconds
+GITHUB_INTERACTIVE_MAX_WAIT = float(os.getenv("GITHUB_INTERACTIVE_MAX_WAIT", "5"))
+GITHUB_BACKGROUND_MAX_WAIT = float(os.getenv("GITHUB_BACKGROUND_MAX_WAIT", "60"))
+# Share of each budget background requests leave to interactive ones
+GITHUB_INTERACTIVE_SHARE = float(os.getenv("GITHUB_INTERACTIVE_SHARE", "0.1"))
+# Background requests are paced once this share of the budget is left
+GITHUB_PACE_BELOW = float(os.getenv("GITHUB_PACE_BELOW", "0.5"))
+
+_priority: ContextVar[str] = ContextVar("github_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def background_priority() -> Iterator[None]:
+    """Send the GitHub calls made inside the block as background work."""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def resource_for(url: str) -> str:
+    """Rate-limit resource a GitHub API URL is charged to."""
+    path = url.split("api.github.com", 1)[-1]
+    if path.startswith("/search/"):
+        return "search"
+    if path.startswith("/graphql"):
+        return "graphql"
+    return "core"
+
+
+class GitHubRateLimited(Exception):
+    """A GitHub budget is spent for longer than the caller may wait."""
+
+    def __init__(self, resource: str, retry_after: float):
+        self.resource = resource
+        self.retry_after = max(1, int(retry_after + 0.999))
+        super().__init__(
+            f"GitHub {resource} rate limit reached, retry in {self.retry_after}s"
+        )
+
+
+class RateLimitBudget:
+    """Last known budget of one token for one resource."""
+
+    def __init__(self, limit: int, remaining: int, reset_at: float):
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_at = reset_at
+        self.last_sent = 0.0
+
+
+class RateLimitScheduler:
+    """Tracks GitHub budgets per token and resource and spaces requests out."""
+
+    def __init__(
+        self,
+        interactive_max_wait: float = GITHUB_INTERACTIVE_MAX_WAIT,
+        background_max_wait: float = GITHUB_BACKGROUND_MAX_WAIT,
+        interactive_share: float = GITHUB_INTERACTIVE_SHARE,
+        pace_below: float = GITHUB_PACE_BELOW,
+    ):
+        self.max_wait = {
+            INTERACTIVE: interactive_max_wait,
+            BACKGROUND: background_max_wait,
+        }
+        self.interactive_share = interactive_share
+        self.pace_below = pace_below
+        self._budgets: Dict[Tuple[str, str], RateLimitBudget] = {}
+        # Secondary rate limits (Retry-After) block a token entirely
+        self._blocked_until: Dict[str, float] = {}
+        self.waiting = {INTERACTIVE: 0, BACKGROUND: 0}
+
+    def remaining(self, token_key: str, resource: str = "core") -> Optional[int]:
+        """Requests left in the current window, if known."""
+        budget = self._budgets.get((token_key, resource))
+        if budget is None or budget.reset_at <= time.time():
+            return None
+        return budget.remaining
+
+    def delay(self, token_key: str, resource: str, priority: str) -> float:
+        """Seconds a request has to wait before it may be sent."""
+        now = time.time()
+        blocked_until = self._blocked_until.get(token_key, 0.0)
+        if blocked_until > now:
+            return blocked_until - now
+
+        budget = self._budgets.get((token_key, resource))
+        if budget is None or budget.reset_at <= now:
+            return 0.0
+        floor = 0
+        if priority == BACKGROUND:
+            floor = int(budget.limit * self.interactive_share)
+        if budget.remaining <= floor:
+            return budget.reset_at - now
+        if priority == BACKGROUND and budget.remaining < budget.limit * self.pace_below:
+            # Spread what is left evenly over the rest of the window
+            interval = (budget.reset_at - now) / (budget.remaining - floor)
+            return max(0.0, budget.last_sent + interval - now)
+        return 0.0
+
+    async def acquire(self, token_key: str, resource: str) -> None:
+        """Wait until a request may be sent, or raise GitHubRateLimited."""
+        priority = current_priority()
+        waited = 0.0
+        while True:
+            delay = self.delay(token_key, resource, priority)
+            if delay <= 0:
+                break
+            if waited + delay > self.max_wait[priority]:
+                metrics.increment(
+                    "github_rate_limited_total", resource=resource, priority=priority
+                )
+                raise GitHubRateLimited(resource, delay)
+            self.waiting[priority] += 1
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self.waiting[priority] -= 1
+            waited += delay
+
+        if waited:
+            metrics.increment(
+                "github_scheduler_waits_total", resource=resource, priority=priority
+            )
+            metrics.observe("github_scheduler_wait_ms", waited * 1000)
+        budget = self._budgets.get((token_key, resource))
+        if budget is not None:
+            # Counted now so concurrent requests see it before the response
+            budget.remaining = max(0, budget.remaining - 1)
+            budget.last_sent = time.time()
+
+    def record(self, token_key: str, headers: Any, status_code: int) -> None:
+        """Update the token's budget from a GitHub response."""
+        now = time.time()
+        remaining = headers.get("x-ratelimit-remaining")
+        reset = headers.get("x-ratelimit-reset")
+        if remaining is not None and reset is not None:
+            resource = headers.get("x-ratelimit-resource", "core")
+            limit = int(headers.get("x-ratelimit-limit", remaining))
+            budget = RateLimitBudget(limit, int(remaining), float(reset))
+            previous = self._budgets.get((token_key, resource))
+            if previous is not None:
+                budget.last_sent = previous.last_sent
+            self._budgets[(token_key, resource)] = budget
+        retry_after = headers.get("retry-after")
+        if status_code in (403, 429) and retry_after is not None:
+            try:
+                pause = float(retry_after)
+            except ValueError:
+                # An HTTP date; GitHub sends seconds, so don't bother parsing
+                pause = 60.0
+            self._blocked_until[token_key] = now + pause
+            logger.warning(f"GitHub secondary rate limit, pausing for {pause}s")
+        self._forget(now)
+
+    def _forget(self, now: float) -> None:
+        """Drop windows that have already reset."""
+        for key, budget in list(self._budgets.items()):
+            if budget.reset_at <= now:
+                del self._budgets[key]
+        for token_key, until in list(self._blocked_until.items()):
+            if until <= now:
+                del self._blocked_until[token_key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Budget state per resource across all tracked tokens."""
+        now = time.time()
+        resources: Dict[str, Dict[str, Any]] = {}
+        for (_, resource), budget in self._budgets.items():
+            if budget.reset_at <= now:
+                continue
+            entry = resources.setdefault(
+                resource, {"tokens": 0, "lowest_remaining": None, "exhausted": 0}
+            )
+            entry["tokens"] += 1
+            if (
+                entry["lowest_remaining"] is None
+                or budget.remaining < entry["lowest_remaining"]
+            ):
+                entry["lowest_remaining"] = budget.remaining
+            if budget.remaining == 0:
+                entry["exhausted"] += 1
+        return {
+            "resources": resources,
+            "blocked_tokens": sum(1 for u in self._blocked_until.values() if u > now),
+            "waiting": dict(self.waiting),
+            "wait_ms": metrics.latency("github_scheduler_wait_ms").summary(),
+        }
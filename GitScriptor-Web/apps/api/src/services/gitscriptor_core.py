@@ -27,11 +27,20 @@ import requests
 import subprocess
 import tempfile
 import shutil
+import asyncio
+import hashlib
+import threading
+import time
+import httpx
+from collections import OrderedDict, deque
 from pathlib import Path
 from typing import Optional, Dict, List, Any
 from urllib.parse import urlparse
 import logging
 
+from .metrics import metrics
+from .model_router import model_router
+
 logger = logging.getLogger(__name__)
 
 # Load environment variables
@@ -49,6 +58,469 @@ class GitScriptorError(Exception):
     pass
 
 
+class GenerationCancelled(GitScriptorError):
+    """Raised when a generation is cancelled while in progress."""
+
+    pass
+
+
+class GeminiTimeout(GitScriptorError):
+    """A Gemini request ran into GEMINI_TIMEOUT."""
+
+    pass
+
+
+class CancellationToken:
+    """Cooperative cancellation flag checked by long-running steps."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise GenerationCancelled("Generation cancelled")
+
+
+class ResultCache:
+    """Thread-safe LRU cache with expiry, shared by all generation workers."""
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: int = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, list] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return a cached value, or None if missing or expired."""
+        return self._lookup(key, count=True)
+
+    def _lookup(self, key: str, count: bool) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                if count:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if count:
+                self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a value, evicting the least recently used entry when full."""
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key: str, compute) -> Any:
+        """Return a cached value, computing it at most once across threads."""
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            # [lock, holders]; the lock is dropped once nobody waits on it
+            key_lock = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            key_lock[1] += 1
+
+        try:
+            with key_lock[0]:
+                # Another worker may have filled the entry while we waited
+                value = self._lookup(key, count=False)
+                if value is None:
+                    value = compute()
+                    if value is not None:
+                        self.set(key, value)
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                if key_lock[1] == 0:
+                    del self._key_locks[key]
+
+        return value
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Drop one entry, or the whole cache when no key is given."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Return cache size and hit/miss counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# Shared caches so concurrent generations of the same commit analyze it only
+# once. Model output is only reused for batch items.
+analysis_cache = ResultCache(
+    max_entries=int(os.getenv("ANALYSIS_CACHE_SIZE", "256")),
+    ttl_seconds=int(os.getenv("ANALYSIS_CACHE_TTL", "3600")),
+)
+content_cache = ResultCache(
+    max_entries=int(os.getenv("CONTENT_CACHE_SIZE", "512")),
+    ttl_seconds=int(os.getenv("CONTENT_CACHE_TTL", "3600")),
+)
+MIRROR_CACHE_DIR = os.getenv(
+    "MIRROR_CACHE_DIR", os.path.join(tempfile.gettempdir(), "gitscriptor-mirrors")
+)
+MIRROR_CACHE_MAX_REPOS = int(os.getenv("MIRROR_CACHE_MAX_REPOS", "500"))
+# A mirror fetched this recently is used without contacting the remote
+MIRROR_FRESH_SECONDS = int(os.getenv("MIRROR_FRESH_SECONDS", "60"))
+MIRROR_FETCH_STAMP = "gitscriptor-fetched"
+
+
+class MirrorCache:
+    """
+    Shallow bare mirrors of remote repositories on local disk.
+
+    Generations clone from the mirror instead of the remote, so a repository
+    that was mirrored before only needs an incremental fetch. Analyses are
+    stored next to the mirror, keyed by commit, so workers on the same node
+    can reuse each other's analysis.
+    """
+
+    def __init__(
+        self,
+        root: str = MIRROR_CACHE_DIR,
+        max_repos: int = MIRROR_CACHE_MAX_REPOS,
+        fresh_seconds: int = MIRROR_FRESH_SECONDS,
+    ):
+        self.root = Path(root)
+        self.max_repos = max_repos
+        self.fresh_seconds = fresh_seconds
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self.fresh_hits = 0
+        self.fetches = 0
+        self.clones = 0
+
+    def _key(self, repo_url: str) -> str:
+        return hashlib.sha256(repo_url.rstrip("/").encode("utf-8")).hexdigest()[:24]
+
+    def path(self, repo_url: str) -> Path:
+        return self.root / f"{self._key(repo_url)}.git"
+
+    def sync(self, repo_url: str, run=None) -> Path:
+        """
+        Bring the mirror up to date and return its path.
+
+        ``run(cmd)`` executes the git command that talks to the remote and
+        must raise on failure; it defaults to a plain subprocess call.
+        """
+        run = run or self._run
+        mirror = self.path(repo_url)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(mirror.name, threading.Lock())
+
+        with key_lock:
+            stamp = mirror / MIRROR_FETCH_STAMP
+            if (
+                stamp.exists()
+                and time.time() - stamp.stat().st_mtime < self.fresh_seconds
+            ):
+                self.fresh_hits += 1
+                return mirror
+
+            if mirror.exists():
+                head = self._git(mirror, "symbolic-ref", "HEAD") or "refs/heads/main"
+                run(
+                    [
+                        "git",
+                        "--git-dir",
+                        str(mirror),
+                        "fetch",
+                        "--progress",
+                        "--depth",
+                        "1",
+                        "origin",
+                        f"+HEAD:{head}",
+                    ]
+                )
+                self.fetches += 1
+            else:
+                self.root.mkdir(parents=True, exist_ok=True)
+                staging = Path(tempfile.mkdtemp(dir=self.root, suffix=".tmp"))
+                try:
+                    run(
+                        [
+                            "git",
+                            "clone",
+                            "--bare",
+                            "--depth",
+                            "1",
+                            "--progress",
+                            repo_url,
+                            str(staging / "repo.git"),
+                        ]
+                    )
+                    os.replace(staging / "repo.git", mirror)
+                finally:
+                    shutil.rmtree(staging, ignore_errors=True)
+                self.clones += 1
+                self._prune()
+
+            stamp.touch()
+        return mirror
+
+    def checkout(self, repo_url: str, target: str) -> None:
+        """Create a working copy of the mirrored repository without network access."""
+        result = subprocess.run(
+            ["git", "clone", "--quiet", str(self.path(repo_url)), target],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise GitScriptorError(f"Failed to check out mirror: {result.stderr}")
+
+    def load_analysis(self, repo_url: str, commit: str) -> Optional[Dict[str, Any]]:
+        """Return a stored analysis of ``commit``, if any."""
+        try:
+            with open(self._analysis_path(repo_url), "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if stored.get("commit") != commit:
+            return None
+        return stored.get("analysis")
+
+    def store_analysis(
+        self, repo_url: str, commit: str, analysis: Dict[str, Any]
+    ) -> None:
+        # Only mirrored repositories; stored analyses are pruned with their mirror
+        if not self.path(repo_url).exists():
+            return
+        path = self._analysis_path(repo_url)
+        try:
+            staging = path.with_suffix(".tmp")
+            with open(staging, "w", encoding="utf-8") as f:
+                json.dump({"commit": commit, "analysis": analysis}, f)
+            os.replace(staging, path)
+        except OSError as e:
+            logger.warning(f"Failed to store analysis for {repo_url}: {e}")
+
+    def _analysis_path(self, repo_url: str) -> Path:
+        return self.root / f"{self._key(repo_url)}.analysis.json"
+
+    def synced_at(self, repo_url: str) -> Optional[float]:
+        """When the mirror was last brought up to date, if it exists."""
+        try:
+            return (self.path(repo_url) / MIRROR_FETCH_STAMP).stat().st_mtime
+        except OSError:
+            return None
+
+    def head(self, repo_url: str) -> Optional[str]:
+        """Commit the mirror's HEAD points at."""
+        return self._git(self.path(repo_url), "rev-parse", "HEAD")
+
+    def invalidate(self, repo_url: str, commit: Optional[str] = None) -> bool:
+        """
+        Make the next sync fetch, unless the mirror is already at ``commit``.
+
+        The mirror itself is kept, so the fetch stays incremental. Returns
+        whether a mirror was invalidated.
+        """
+        mirror = self.path(repo_url)
+        if not mirror.exists():
+            return False
+        if commit is not None and self.head(repo_url) == commit:
+            return False
+        (mirror / MIRROR_FETCH_STAMP).unlink(missing_ok=True)
+        return True
+
+    def mark_prefetched(self, repo_url: str, source: str) -> None:
+        """Record that a prefetch warmed the mirror at its current HEAD."""
+        marker = {"commit": self.head(repo_url), "source": source, "at": time.time()}
+        try:
+            with open(self._prefetch_path(repo_url), "w", encoding="utf-8") as f:
+                json.dump(marker, f)
+        except OSError as e:
+            logger.warning(f"Failed to mark prefetch of {repo_url}: {e}")
+
+    def take_prefetched(self, repo_url: str) -> Optional[Dict[str, Any]]:
+        """Return and clear the prefetch marker, so each prefetch is counted once."""
+        path = self._prefetch_path(repo_url)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                marker = json.load(f)
+            path.unlink()
+        except (OSError, ValueError):
+            return None
+        return marker
+
+    def _prefetch_path(self, repo_url: str) -> Path:
+        return self.root / f"{self._key(repo_url)}.prefetched"
+
+    def _prune(self) -> None:
+        """Delete the least recently fetched mirrors beyond ``max_repos``."""
+        mirrors = sorted(
+            self.root.glob("*.git"),
+            key=lambda path: (
+                (path / MIRROR_FETCH_STAMP).stat().st_mtime
+                if (path / MIRROR_FETCH_STAMP).exists()
+                # Invalidated mirrors have no stamp
+                else path.stat().st_mtime
+            ),
+        )
+        for mirror in mirrors[: max(0, len(mirrors) - self.max_repos)]:
+            shutil.rmtree(mirror, ignore_errors=True)
+            mirror.with_suffix(".analysis.json").unlink(missing_ok=True)
+            mirror.with_suffix(".prefetched").unlink(missing_ok=True)
+
+    @staticmethod
+    def _git(mirror: Path, *args: str) -> Optional[str]:
+        result = subprocess.run(
+            ["git", "--git-dir", str(mirror), *args], capture_output=True, text=True
+        )
+        return result.stdout.strip() if result.returncode == 0 else None
+
+    @staticmethod
+    def _run(cmd: List[str]) -> None:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        if result.returncode != 0:
+            raise GitScriptorError(f"Failed to mirror repository: {result.stderr}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "fresh_hits": self.fresh_hits,
+            "fetches": self.fetches,
+            "clones": self.clones,
+        }
+
+
+mirror_cache = MirrorCache()
+metrics.register_collector(
+    "caches",
+    lambda: {
+        "analysis": analysis_cache.stats(),
+        "content": content_cache.stats(),
+        "mirror": mirror_cache.stats(),
+    },
+)
+
+
+class QuotaLimiter:
+    """Sliding one-minute request budget shared by all Gemini callers."""
+
+    def __init__(self, requests_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self._timestamps = deque()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        """Take one request from the budget if available, without waiting."""
+        if self.requests_per_minute <= 0:
+            return True
+
+        with self._lock:
+            now = time.time()
+            while self._timestamps and self._timestamps[0] <= now - 60:
+                self._timestamps.popleft()
+            if len(self._timestamps) >= self.requests_per_minute:
+                return False
+            self._timestamps.append(now)
+            return True
+
+    def acquire(
+        self, timeout: float = 60, cancel_token: Optional[CancellationToken] = None
+    ) -> None:
+        """Wait until a request fits in the budget."""
+        deadline = time.time() + timeout
+        while not self.try_acquire():
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            if time.time() > deadline:
+                raise GitScriptorError("Gemini API quota exhausted")
+            time.sleep(0.1)
+
+
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "30"))
+
+# Per-minute request quota for the Gemini API (0 disables the limiter)
+quota_limiter = QuotaLimiter(int(os.getenv("GEMINI_RPM", "0")))
+
+# Hedged requests: send a duplicate when the first is slower than the given
+# percentile of recent latencies for that model
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_DELAY_MS = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "2000"))
+# How often file analysis reports progress
+PROGRESS_FILE_INTERVAL = int(os.getenv("PROGRESS_FILE_INTERVAL", "200"))
+# Seconds between cancellation checks while waiting on clones and model calls
+CANCEL_CHECK_INTERVAL = float(os.getenv("CANCEL_CHECK_INTERVAL", "0.5"))
+
+
+def _ensure_blocking_allowed() -> None:
+    """Refuse blocking work on an event loop's thread.
+
+    Async callers run the whole synchronous call in a worker thread instead,
+    e.g. with run_in_threadpool, so the loop keeps serving other requests.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    raise RuntimeError(
+        "Blocking Gemini call made from a running event loop; "
+        "run it in a worker thread"
+    )
+
+
+def _gemini_error(error: Exception) -> GitScriptorError:
+    """The GitScriptorError a failed Gemini request is reported as."""
+    if isinstance(error, GitScriptorError):
+        return error
+    if isinstance(error, httpx.TimeoutException):
+        return GeminiTimeout(f"Gemini API timed out: {str(error)}")
+    if isinstance(error, httpx.HTTPError):
+        return GitScriptorError(f"Network error calling Gemini API: {str(error)}")
+    return GitScriptorError(f"Error calling Gemini API: {str(error)}")
+
+
+def run_cancellable(
+    cmd: List[str],
+    timeout: float,
+    cancel_token: Optional[CancellationToken] = None,
+) -> subprocess.CompletedProcess:
+    """Like subprocess.run(), but kills the process once the token is cancelled."""
+    process = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+    deadline = time.time() + timeout
+    while True:
+        try:
+            stdout, stderr = process.communicate(timeout=CANCEL_CHECK_INTERVAL)
+            return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+        except subprocess.TimeoutExpired:
+            cancelled = cancel_token is not None and cancel_token.cancelled
+            if cancelled or time.time() > deadline:
+                process.kill()
+                process.communicate()
+                if cancelled:
+                    raise GenerationCancelled("Generation cancelled")
+                raise subprocess.TimeoutExpired(cmd, timeout)
+
+
 class RepositoryAnalyzer:
     """Analyzes Git repositories to extract metadata and structure."""
 
@@ -88,26 +560,37 @@ class RepositoryAnalyzer:
             "Cargo.toml": ["Actix", "Rocket"],
         }
 
-    def clone_repository(self, repo_url: str, temp_dir: Path) -> Path:
+    def clone_repository(
+        self,
+        repo_url: str,
+        temp_dir: Path,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> Path:
         """Clone repository to temporary directory."""
         try:
-            result = subprocess.run(
+            result = run_cancellable(
                 ["git", "clone", "--depth", "1", repo_url, str(temp_dir)],
-                capture_output=True,
-                text=True,
                 timeout=30,
+                cancel_token=cancel_token,
             )
 
             if result.returncode != 0:
                 raise GitScriptorError(f"Failed to clone repository: {result.stderr}")
 
             return temp_dir
+        except GenerationCancelled:
+            raise
         except subprocess.TimeoutExpired:
             raise GitScriptorError("Repository clone timed out")
         except Exception as e:
             raise GitScriptorError(f"Error cloning repository: {str(e)}")
 
-    def analyze_files(self, repo_path: Path) -> Dict[str, Any]:
+    def analyze_files(
+        self,
+        repo_path: Path,
+        progress=None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> Dict[str, Any]:
         """Analyze repository files and structure."""
         languages = set()
         frameworks = set()
@@ -139,6 +622,11 @@ class RepositoryAnalyzer:
                     part.startswith(".git") for part in file_path.parts
                 ):
                     file_count += 1
+                    if file_count % PROGRESS_FILE_INTERVAL == 0:
+                        if cancel_token is not None:
+                            cancel_token.raise_if_cancelled()
+                        if progress:
+                            progress("analyzing", files_scanned=file_count)
 
                     # Count lines in text files
                     try:
@@ -183,6 +671,8 @@ class RepositoryAnalyzer:
                     if file_path.name in self.framework_indicators:
                         frameworks.update(self.framework_indicators[file_path.name])
 
+        except GenerationCancelled:
+            raise
         except Exception as e:
             logger.warning(f"Error analyzing files: {e}")
 
@@ -246,54 +736,349 @@ class RepositoryAnalyzer:
 class GeminiAPI:
     """Interface for Gemini AI API."""
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
         if not self.api_key:
             raise GitScriptorError(
                 "Gemini API key not found. Set GEMINI_API_KEY environment variable."
             )
 
-        self.base_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
-
-    def generate_content(self, prompt: str) -> str:
-        """Generate content using Gemini API."""
-        headers = {"Content-Type": "application/json"}
-
-        payload = {
-            "contents": [{"parts": [{"text": prompt}]}],
+        self.api_root = "https://generativelanguage.googleapis.com/v1beta"
+        self.model = model or "gemini-1.5-flash"
+        self.base_url = f"{self.api_root}/models/{self.model}:generateContent"
+
+    @staticmethod
+    def build_request(
+        prompt: str,
+        max_output_tokens: int = 2048,
+        system_instruction: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Build a generateContent request body for a prompt."""
+        request = {
+            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
             "generationConfig": {
                 "temperature": 0.7,
                 "topK": 40,
                 "topP": 0.95,
-                "maxOutputTokens": 2048,
+                "maxOutputTokens": max_output_tokens,
             },
         }
+        if system_instruction:
+            request["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+        return request
+
+    @staticmethod
+    def extract_text(data: Dict[str, Any]) -> str:
+        """Extract generated text from a generateContent response."""
+        if "candidates" not in data or not data["candidates"]:
+            raise GitScriptorError("No content generated by Gemini API")
+
+        content = data["candidates"][0]["content"]["parts"][0]["text"]
+        return content.strip()
+
+    def generate_content(
+        self,
+        prompt: str,
+        max_output_tokens: int = 2048,
+        system_instruction: Optional[str] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> str:
+        """
+        Generate content using Gemini API.
+
+        The static ``system_instruction`` is sent as the request's system
+        instruction, ahead of the repository-specific prompt. When
+        ``cancel_token`` is cancelled the in-flight request is aborted. It
+        blocks, so it must not be called from a running event loop.
+        """
+        _ensure_blocking_allowed()
+        payload = self.build_request(prompt, max_output_tokens, system_instruction)
+
+        quota_limiter.acquire(cancel_token=cancel_token)
+
+        hedge_delay = self._hedge_delay_seconds(max_output_tokens)
+        if hedge_delay is None and cancel_token is None:
+            return self._post_generate(payload, httpx.Client(timeout=GEMINI_TIMEOUT))
+
+        return asyncio.run(self._generate_hedged(payload, hedge_delay, cancel_token))
+
+    def _post_generate(self, payload: Dict[str, Any], client: httpx.Client) -> str:
+        """Send one generateContent request."""
+        try:
+            with client:
+                response = client.post(
+                    f"{self.base_url}?key={self.api_key}",
+                    headers={"Content-Type": "application/json"},
+                    json=payload,
+                )
+            return self._generated_text(response)
+        except Exception as e:
+            raise _gemini_error(e)
 
+    async def _post_generate_async(
+        self, payload: Dict[str, Any], client: httpx.AsyncClient
+    ) -> str:
+        """Send one generateContent request; cancelling the task aborts it."""
         try:
-            response = requests.post(
+            response = await client.post(
                 f"{self.base_url}?key={self.api_key}",
-                headers=headers,
+                headers={"Content-Type": "application/json"},
                 json=payload,
-                timeout=30,
             )
+            return self._generated_text(response)
+        except Exception as e:
+            raise _gemini_error(e)
 
-            if response.status_code != 200:
-                raise GitScriptorError(
-                    f"Gemini API error: {response.status_code} - {response.text}"
-                )
+    def _generated_text(self, response: httpx.Response) -> str:
+        if response.status_code != 200:
+            raise GitScriptorError(
+                f"Gemini API error: {response.status_code} - {response.text}"
+            )
+        return self.extract_text(response.json())
+
+    def _hedge_delay_seconds(self, max_output_tokens: int) -> Optional[float]:
+        """How long to wait before hedging, learned from recent latencies."""
+        if not LLM_HEDGE_ENABLED:
+            return None
+
+        threshold_ms = model_router.latency_percentile(
+            self.model, LLM_HEDGE_PERCENTILE, max_output_tokens
+        )
+        if threshold_ms is None:
+            return None
+
+        return max(threshold_ms, LLM_HEDGE_MIN_DELAY_MS) / 1000
+
+    async def _generate_hedged(
+        self,
+        payload: Dict[str, Any],
+        hedge_delay: Optional[float],
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> str:
+        """
+        Send the request and, if it is slower than the hedge threshold, send an
+        identical second one; the first successful response wins and the other
+        request is aborted. Without a hedge delay only one request is sent.
+        All requests are aborted when ``cancel_token`` is cancelled.
+
+        Requests run as tasks on an async client, so cancelling a task closes
+        its connection instead of leaving it blocked until GEMINI_TIMEOUT.
+        """
+        async with httpx.AsyncClient(timeout=GEMINI_TIMEOUT) as client:
+            tasks = [asyncio.create_task(self._post_generate_async(payload, client))]
+            abort_reason = "hedge_loser"
+            try:
+                if hedge_delay is not None:
+                    done = await self._wait(tasks, hedge_delay, cancel_token)
+                    if not done:
+                        if quota_limiter.try_acquire():
+                            tasks.append(
+                                asyncio.create_task(
+                                    self._post_generate_async(payload, client)
+                                )
+                            )
+                            metrics.increment("llm_hedges_total", model=self.model)
+                        else:
+                            metrics.increment(
+                                "llm_hedges_skipped_total", model=self.model
+                            )
+
+                pending = set(tasks)
+                error = None
+                while pending:
+                    done = await self._wait(pending, None, cancel_token)
+                    pending -= done
+                    for task in done:
+                        try:
+                            content = task.result()
+                        except GitScriptorError as e:
+                            error = e
+                            continue
+
+                        if tasks.index(task) == 1:
+                            metrics.increment("llm_hedge_wins_total", model=self.model)
+                        return content
+
+                raise error
+            except GenerationCancelled:
+                abort_reason = "cancelled"
+                raise
+            finally:
+                # Abort the losing request, or every request on cancellation
+                for task in tasks:
+                    if not task.done():
+                        task.cancel()
+                        metrics.increment(
+                            "llm_requests_aborted_total",
+                            model=self.model,
+                            reason=abort_reason,
+                        )
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    async def _wait(tasks, timeout: Optional[float], cancel_token) -> set:
+        """Wait for the first task to finish; raise once the token is cancelled."""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            step = CANCEL_CHECK_INTERVAL if cancel_token is not None else None
+            if deadline is not None:
+                remaining = max(0.0, deadline - time.time())
+                step = remaining if step is None else min(step, remaining)
+
+            done, _ = await asyncio.wait(
+                tasks, timeout=step, return_when=asyncio.FIRST_COMPLETED
+            )
+            if done or (deadline is not None and time.time() >= deadline):
+                return done
+
+            if cancel_token is not None and cancel_token.cancelled:
+                raise GenerationCancelled("Generation cancelled")
+
+    def submit_batch(self, job_file: Path, display_name: str) -> str:
+        """Submit a JSONL job file to the batch-prediction API, returning the job name."""
+        requests_list = []
+        with open(job_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    requests_list.append(
+                        {"request": entry["request"], "metadata": {"key": entry["key"]}}
+                    )
 
-            data = response.json()
+        payload = {
+            "batch": {
+                "display_name": display_name,
+                "input_config": {"requests": {"requests": requests_list}},
+            }
+        }
 
-            if "candidates" not in data or not data["candidates"]:
-                raise GitScriptorError("No content generated by Gemini API")
+        try:
+            response = requests.post(
+                f"{self.api_root}/models/{self.model}:batchGenerateContent"
+                f"?key={self.api_key}",
+                headers={"Content-Type": "application/json"},
+                json=payload,
+                timeout=120,
+            )
+        except requests.exceptions.RequestException as e:
+            raise GitScriptorError(f"Network error submitting batch job: {str(e)}")
+
+        if response.status_code != 200:
+            raise GitScriptorError(
+                f"Gemini batch API error: {response.status_code} - {response.text}"
+            )
 
-            content = data["candidates"][0]["content"]["parts"][0]["text"]
-            return content.strip()
+        return response.json()["name"]
 
+    def get_batch(self, name: str) -> Dict[str, Any]:
+        """
+        Get the state of a batch-prediction job.
+
+        Returns a dict with ``state`` (pending, running, succeeded, failed)
+        and, once succeeded, ``results`` mapping request keys to responses.
+        """
+        try:
+            response = requests.get(
+                f"{self.api_root}/{name}?key={self.api_key}", timeout=30
+            )
         except requests.exceptions.RequestException as e:
-            raise GitScriptorError(f"Network error calling Gemini API: {str(e)}")
-        except Exception as e:
-            raise GitScriptorError(f"Error calling Gemini API: {str(e)}")
+            raise GitScriptorError(f"Network error polling batch job: {str(e)}")
+
+        if response.status_code != 200:
+            raise GitScriptorError(
+                f"Gemini batch API error: {response.status_code} - {response.text}"
+            )
+
+        data = response.json()
+        metadata = data.get("metadata", data)
+        raw_state = metadata.get("state", "BATCH_STATE_PENDING")
+        state = raw_state.replace("BATCH_STATE_", "").replace("JOB_STATE_", "").lower()
+        if state in ("cancelled", "expired"):
+            state = "failed"
+
+        results = {}
+        if state == "succeeded":
+            output = data.get("response") or metadata.get("output") or {}
+            inlined = output.get("inlinedResponses", {})
+            if isinstance(inlined, dict):
+                inlined = inlined.get("inlinedResponses", [])
+            for entry in inlined:
+                key = entry.get("metadata", {}).get("key")
+                results[key] = entry
+
+        return {"name": name, "state": state, "results": results}
+
+
+class LocalBatchProvider:
+    """
+    Local stand-in for the batch-prediction API.
+
+    Jobs are processed synchronously on submit and their results written next
+    to the job file, so the bulk pipeline can be exercised without network
+    access or model quota.
+    """
+
+    def __init__(self, responder=None):
+        self.model = "local-batch"
+        self.responder = responder or self._default_responder
+        self._results_files: Dict[str, Path] = {}
+
+    @staticmethod
+    def _default_responder(prompt: str) -> str:
+        match = re.search(r"^Repository: (.+)$", prompt, re.MULTILINE)
+        name = match.group(1).strip() if match else "Project"
+        return f"# {name}\n\nGenerated by the local batch stand-in.\n"
+
+    def submit_batch(self, job_file: Path, display_name: str) -> str:
+        """Process a JSONL job file and return the local job name."""
+        job_file = Path(job_file)
+        results_file = job_file.with_suffix(".results.jsonl")
+
+        with open(job_file, "r", encoding="utf-8") as src, open(
+            results_file, "w", encoding="utf-8"
+        ) as dst:
+            for line in src:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                prompt = entry["request"]["contents"][0]["parts"][0]["text"]
+                try:
+                    text = self.responder(prompt)
+                    result = {
+                        "metadata": {"key": entry["key"]},
+                        "response": {
+                            "candidates": [{"content": {"parts": [{"text": text}]}}],
+                            "usageMetadata": {
+                                "promptTokenCount": len(prompt.split()),
+                                "candidatesTokenCount": len(text.split()),
+                            },
+                        },
+                    }
+                except Exception as e:
+                    result = {
+                        "metadata": {"key": entry["key"]},
+                        "error": {"message": str(e)},
+                    }
+                dst.write(json.dumps(result) + "\n")
+
+        name = f"local-batches/{job_file.stem}"
+        self._results_files[name] = results_file
+        return name
+
+    def get_batch(self, name: str) -> Dict[str, Any]:
+        """Read back results of a locally processed job."""
+        results_file = self._results_files.get(name)
+        if results_file is None or not results_file.exists():
+            return {"name": name, "state": "failed", "results": {}}
+
+        results = {}
+        with open(results_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    results[entry["metadata"]["key"]] = entry
+
+        return {"name": name, "state": "succeeded", "results": results}
 
 
 def generate_readme(repo_url: str, style: str = "classic", **kwargs) -> str:
@@ -303,42 +1088,237 @@ def generate_readme(repo_url: str, style: str = "classic", **kwargs) -> str:
     Args:
         repo_url: URL to the repository
         style: Style of README to generate (classic, minimal, comprehensive)
-        **kwargs: Additional parameters
+        **kwargs: Additional parameters (ai_model, use_cache, progress,
+            cancel_token). ``use_cache`` reuses model output of identical
+            prompts and is off by default
 
     Returns:
         Generated README markdown content
     """
-    try:
-        # Analyze repository
-        analysis = analyze_repository(repo_url)
+    return generate_readme_detailed(repo_url, style, **kwargs)["markdown"]
 
-        # Initialize Gemini API
-        gemini = GeminiAPI()
 
-        # Create prompt based on analysis and style
-        prompt = create_readme_prompt(repo_url, analysis, style)
+def generate_readme_detailed(
+    repo_url: str, style: str = "classic", **kwargs
+) -> Dict[str, Any]:
+    """
+    Generate README content and report how it was produced.
+
+    ``progress``, if given, is called as ``progress(phase, **details)`` when
+    generation moves through the analyzing, prompting and generating phases.
+    With ``repo_path``, the already cloned working copy of ``repo_url`` is
+    analyzed instead of cloning it again.
+    A ``cancel_token`` stops the clone, analysis and model call early by
+    raising GenerationCancelled.
+
+    Returns:
+        Dictionary with the markdown, the routed model and output budget,
+        and whether the template fallback was used
+    """
+    progress = kwargs.get("progress") or (lambda phase, **details: None)
+    cancel_token = kwargs.get("cancel_token")
+    route = None
+    try:
+        # Analyze repository
+        progress("analyzing", files_scanned=0)
+        if kwargs.get("repo_path"):
+            analysis = analyze_checkout(
+                repo_url,
+                kwargs["repo_path"],
+                progress=progress,
+                cancel_token=cancel_token,
+            )
+        else:
+            analysis = analyze_repository(
+                repo_url, progress=progress, cancel_token=cancel_token
+            )
 
-        # Generate README using AI
-        readme_content = gemini.generate_content(prompt)
+        # Pick model and output budget from tier, style and repository size
+        route = model_router.route(kwargs.get("ai_model"), style, analysis)
 
-        return readme_content
+        # Initialize Gemini API
+        gemini = GeminiAPI(model=route.model)
+
+        # Static instructions are shared by every request; only the
+        # repository details change
+        instructions = create_readme_instructions(style)
+        prompt = create_repository_prompt(repo_url, analysis, style)
+        progress(
+            "prompting",
+            files_scanned=analysis.get("file_count", 0),
+            prompt_tokens=estimate_tokens(instructions) + estimate_tokens(prompt),
+        )
+
+        def call_model() -> str:
+            progress(
+                "generating",
+                model=route.model,
+                max_output_tokens=route.max_output_tokens,
+            )
+            start_time = time.time()
+            try:
+                content = gemini.generate_content(
+                    prompt,
+                    route.max_output_tokens,
+                    system_instruction=instructions,
+                    cancel_token=cancel_token,
+                )
+            except GenerationCancelled:
+                raise
+            except GeminiTimeout:
+                model_router.record(
+                    route.model,
+                    GEMINI_TIMEOUT * 1000,
+                    success=False,
+                    max_output_tokens=route.max_output_tokens,
+                )
+                raise
+            except Exception:
+                model_router.record(
+                    route.model,
+                    (time.time() - start_time) * 1000,
+                    success=False,
+                    max_output_tokens=route.max_output_tokens,
+                )
+                raise
+            model_router.record(
+                route.model,
+                (time.time() - start_time) * 1000,
+                max_output_tokens=route.max_output_tokens,
+            )
+            return content
+
+        # Generate README using AI; only callers that opt in (batch items)
+        # reuse output of identical requests, so a regeneration is fresh
+        if kwargs.get("use_cache", False):
+            prompt_key = hashlib.sha256(
+                f"{route.model}:{route.max_output_tokens}:{PROMPT_VERSION}:{style}:"
+                f"{prompt}".encode("utf-8")
+            ).hexdigest()
+            readme_content = content_cache.get_or_compute(prompt_key, call_model)
+        else:
+            readme_content = call_model()
+
+        progress("generating", output_tokens=estimate_tokens(readme_content))
+        return {
+            "markdown": readme_content,
+            "model": route.model,
+            "max_output_tokens": route.max_output_tokens,
+            "route_reason": route.reason,
+            "fallback": False,
+        }
 
+    except GenerationCancelled:
+        raise
     except Exception as e:
         logger.error(f"Error generating README: {e}")
         # Fallback to basic template
-        return generate_fallback_readme(repo_url, style)
+        return {
+            "markdown": generate_fallback_readme(repo_url, style),
+            "model": route.model if route else None,
+            "max_output_tokens": route.max_output_tokens if route else None,
+            "route_reason": route.reason if route else None,
+            "fallback": True,
+        }
 
 
-def analyze_repository(repo_url: str) -> Dict[str, Any]:
+def analyze_repository(
+    repo_url: str, progress=None, cancel_token: Optional[CancellationToken] = None
+) -> Dict[str, Any]:
     """
     Analyze a Git repository and extract metadata.
 
+    The repository is cloned and analyzed through ``analyze_checkout``, so
+    results are cached by commit and a push is never answered from an older
+    analysis.
+
     Args:
         repo_url: URL to the repository
+        progress: Optional ``progress(phase, **details)`` callback
+        cancel_token: Optional token that stops the clone and analysis
 
     Returns:
         Dictionary with repository analysis data
     """
+    analysis = _clone_and_analyze(repo_url, progress, cancel_token)
+    if analysis is not None:
+        return analysis
+
+    # Analysis failed; return basic analysis without caching it
+    repo_name = urlparse(repo_url).path.split("/")[-1].replace(".git", "")
+    return {
+        "repo_name": repo_name,
+        "repo_url": repo_url,
+        "languages": ["Unknown"],
+        "frameworks": [],
+        "has_tests": False,
+        "has_docs": False,
+        "has_ci": False,
+        "file_count": 0,
+        "lines_of_code": 0,
+        "commit_count": 0,
+        "contributors": 1,
+        "last_commit": None,
+    }
+
+
+def analyze_checkout(
+    repo_url: str,
+    repo_path: str,
+    progress=None,
+    cancel_token: Optional[CancellationToken] = None,
+) -> Dict[str, Any]:
+    """
+    Analyze a working copy of ``repo_url``, reusing any earlier analysis of
+    the same commit from memory or from the mirror cache.
+    """
+    analyzer = RepositoryAnalyzer()
+    result = subprocess.run(
+        ["git", "-C", str(repo_path), "rev-parse", "HEAD"],
+        capture_output=True,
+        text=True,
+    )
+    commit = result.stdout.strip() if result.returncode == 0 else None
+    if not commit:
+        return _analyze_path(
+            analyzer, repo_url, Path(repo_path), progress, cancel_token
+        )
+
+    def compute() -> Dict[str, Any]:
+        stored = mirror_cache.load_analysis(repo_url, commit)
+        if stored is not None:
+            return stored
+        analysis = _analyze_path(
+            analyzer, repo_url, Path(repo_path), progress, cancel_token
+        )
+        mirror_cache.store_analysis(repo_url, commit, analysis)
+        return analysis
+
+    return analysis_cache.get_or_compute(f"{repo_url}@{commit}", compute)
+
+
+def _analyze_path(
+    analyzer: "RepositoryAnalyzer",
+    repo_url: str,
+    repo_path: Path,
+    progress=None,
+    cancel_token: Optional[CancellationToken] = None,
+) -> Dict[str, Any]:
+    file_analysis = analyzer.analyze_files(repo_path, progress, cancel_token)
+    git_info = analyzer.get_git_info(repo_path)
+    repo_name = urlparse(repo_url).path.split("/")[-1].replace(".git", "")
+    return {
+        "repo_name": repo_name,
+        "repo_url": repo_url,
+        **file_analysis,
+        **git_info,
+    }
+
+
+def _clone_and_analyze(
+    repo_url: str, progress=None, cancel_token: Optional[CancellationToken] = None
+) -> Optional[Dict[str, Any]]:
+    """Clone and analyze a repository, returning None on failure."""
     analyzer = RepositoryAnalyzer()
 
     with tempfile.TemporaryDirectory() as temp_dir:
@@ -346,80 +1326,36 @@ def analyze_repository(repo_url: str) -> Dict[str, Any]:
 
         try:
             # Clone repository
-            repo_path = analyzer.clone_repository(repo_url, temp_path / "repo")
-
-            # Analyze files and structure
-            file_analysis = analyzer.analyze_files(repo_path)
-
-            # Get Git information
-            git_info = analyzer.get_git_info(repo_path)
-
-            # Extract repository name
-            repo_name = urlparse(repo_url).path.split("/")[-1].replace(".git", "")
+            repo_path = analyzer.clone_repository(
+                repo_url, temp_path / "repo", cancel_token
+            )
 
-            return {
-                "repo_name": repo_name,
-                "repo_url": repo_url,
-                **file_analysis,
-                **git_info,
-            }
+            # Analyze files, structure and Git information
+            return analyze_checkout(
+                repo_url, str(repo_path), progress=progress, cancel_token=cancel_token
+            )
 
+        except GenerationCancelled:
+            raise
         except Exception as e:
             logger.warning(f"Error analyzing repository {repo_url}: {e}")
-            # Return basic analysis
-            repo_name = urlparse(repo_url).path.split("/")[-1].replace(".git", "")
-            return {
-                "repo_name": repo_name,
-                "repo_url": repo_url,
-                "languages": ["Unknown"],
-                "frameworks": [],
-                "has_tests": False,
-                "has_docs": False,
-                "has_ci": False,
-                "file_count": 0,
-                "lines_of_code": 0,
-                "commit_count": 0,
-                "contributors": 1,
-                "last_commit": None,
-            }
-
+            return None
 
-def create_readme_prompt(repo_url: str, analysis: Dict[str, Any], style: str) -> str:
-    """Create a prompt for AI README generation."""
-
-    repo_name = analysis["repo_name"]
-    languages = ", ".join(analysis["languages"]) if analysis["languages"] else "Unknown"
-    frameworks = (
-        ", ".join(analysis["frameworks"]) if analysis["frameworks"] else "None detected"
-    )
-
-    base_prompt = f"""
-Generate a professional README.md file for a GitHub repository with the following details:
-
-Repository: {repo_name}
-URL: {repo_url}
-Primary Languages: {languages}
-Frameworks/Libraries: {frameworks}
-Has Tests: {analysis['has_tests']}
-Has Documentation: {analysis['has_docs']}
-Has CI/CD: {analysis['has_ci']}
-Lines of Code: {analysis['lines_of_code']}
-Contributors: {analysis['contributors']}
 
-Style: {style}
-"""
+# Bump whenever the static instructions change so cached model output from
+# older instructions is not reused
+PROMPT_VERSION = "2"
 
-    if style == "minimal":
-        base_prompt += """
+STYLE_INSTRUCTIONS = {
+    "minimal": """
 Create a minimal, clean README with:
 - Project title and brief description
 - Installation instructions
 - Basic usage example
 - License information
 Keep it concise and under 200 words.
-"""
-    elif style == "comprehensive":
-        base_prompt += """
+""",
+    "comprehensive": """
 Create a comprehensive README with:
 - Project title with badges
 - Detailed description and features
@@ -433,9 +1369,8 @@ Create a comprehensive README with:
 - License and support information
 - Screenshots or diagrams if appropriate
 Make it detailed and professional.
-"""
-    else:  # classic
-        base_prompt += """
+""",
+    "classic": """
 Create a classic, well-structured README with:
 - Project title and description
 - Table of contents
@@ -444,9 +1379,10 @@ Create a classic, well-structured README with:
 - Contributing guidelines
 - License information
 Balance detail with readability.
-"""
+""",
+}
 
-    base_prompt += """
+PROMPT_GUIDELINES = """
 Important guidelines:
 - Use proper Markdown formatting
 - Include relevant badges if appropriate
@@ -457,7 +1393,54 @@ Important guidelines:
 - Generate actual content based on the repository analysis
 """
 
-    return base_prompt
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token) without an API call."""
+    return (len(text) + 3) // 4
+
+
+def create_readme_instructions(style: str) -> str:
+    """Static, versioned instructions shared by every request of a style."""
+    return (
+        "You generate professional README.md files for GitHub repositories "
+        "from the repository details provided by the user.\n"
+        + STYLE_INSTRUCTIONS.get(style, STYLE_INSTRUCTIONS["classic"])
+        + PROMPT_GUIDELINES
+    )
+
+
+def create_repository_prompt(
+    repo_url: str, analysis: Dict[str, Any], style: str
+) -> str:
+    """Dynamic, per-repository part of the prompt."""
+    repo_name = analysis["repo_name"]
+    languages = ", ".join(analysis["languages"]) if analysis["languages"] else "Unknown"
+    frameworks = (
+        ", ".join(analysis["frameworks"]) if analysis["frameworks"] else "None detected"
+    )
+
+    return f"""
+Generate a professional README.md file for a GitHub repository with the following details:
+
+Repository: {repo_name}
+URL: {repo_url}
+Primary Languages: {languages}
+Frameworks/Libraries: {frameworks}
+Has Tests: {analysis['has_tests']}
+Has Documentation: {analysis['has_docs']}
+Has CI/CD: {analysis['has_ci']}
+Lines of Code: {analysis['lines_of_code']}
+Contributors: {analysis['contributors']}
+
+Style: {style}
+"""
+
+
+def create_readme_prompt(repo_url: str, analysis: Dict[str, Any], style: str) -> str:
+    """Create a single-string prompt for AI README generation."""
+    return create_repository_prompt(
+        repo_url, analysis, style
+    ) + create_readme_instructions(style)
 
 
 def generate_fallback_readme(repo_url: str, style: str) -> str:
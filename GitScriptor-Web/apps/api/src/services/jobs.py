@@ -0,0 +1,605 @@
+"""
+Asynchronous README generation jobs.
+
+A job is a GenerationHistory row created in the "pending" state and queued
+in generation_jobs. The HTTP request returns its job id immediately and a
+worker (see src/worker.py) clones the repository, runs the generation and
+records the outcome on the same row.
+"""
+
+import os
+import re
+import time
+import uuid
+import logging
+import tempfile
+import subprocess
+import threading
+from datetime import datetime
+from typing import Optional, Dict, List, Any
+
+from sqlalchemy.orm import Session  # type: ignore
+
+from ..db.database import SessionLocal
+from ..db.models import Repository, GenerationHistory, GenerationJob, ReadmeDraft
+from .gitscriptor_core import (
+    CANCEL_CHECK_INTERVAL,
+    CancellationToken,
+    GenerationCancelled,
+    GitScriptorError,
+    analyze_checkout,
+    generate_readme_detailed,
+    mirror_cache,
+)
+from .metrics import metrics
+from .queue import job_queue
+from .scheduler import job_scheduler
+
+logger = logging.getLogger(__name__)
+
+GENERATION_CLONE_TIMEOUT = int(os.getenv("GENERATION_CLONE_TIMEOUT", "60"))
+# Minimum seconds between progress writes within one phase
+PROGRESS_MIN_INTERVAL = float(os.getenv("PROGRESS_MIN_INTERVAL", "1"))
+
+# "Receiving objects:  45% (90/200), 1.20 MiB | 2.00 MiB/s"
+CLONE_BYTES_PATTERN = re.compile(
+    r"Receiving objects:.*?,\s*([\d.]+) (bytes|KiB|MiB|GiB)"
+)
+BYTE_UNITS = {"bytes": 1, "KiB": 1024, "MiB": 1024**2, "GiB": 1024**3}
+
+# Statuses a job never leaves
+FINAL_STATUSES = ("completed", "failed", "cancelled")
+
+# HTTP status reported by the synchronous endpoint for each failure kind
+ERROR_STATUS_CODES = {
+    "clone_failed": 400,
+    "clone_timeout": 408,
+    "generation_failed": 500,
+}
+
+
+class JobFailure(Exception):
+    """A generation failure with a machine-readable error code."""
+
+    def __init__(self, error_code: str, message: str):
+        super().__init__(message)
+        self.error_code = error_code
+
+
+class JobCancellationToken(CancellationToken):
+    """Cancellation token backed by the job's history status.
+
+    The request that cancels a job usually runs in another process than the
+    worker, so the status column is the signal; it is re-read at most every
+    CANCEL_CHECK_INTERVAL seconds.
+    """
+
+    def __init__(self, history_id: int):
+        super().__init__()
+        self.history_id = history_id
+        self.checked_at = 0.0
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        now = time.time()
+        if now - self.checked_at < CANCEL_CHECK_INTERVAL:
+            return False
+        self.checked_at = now
+
+        db = SessionLocal()
+        try:
+            status = (
+                db.query(GenerationHistory.status)
+                .filter(GenerationHistory.id == self.history_id)
+                .scalar()
+            )
+        finally:
+            db.close()
+        if status in (None, "cancelled"):
+            self.cancel()
+        return self._event.is_set()
+
+
+class QueueEntryCancellationToken(CancellationToken):
+    """Cancellation token for work without a history row, such as prefetches.
+
+    The work is cancelled once its generation_jobs entry is deleted.
+    """
+
+    def __init__(self, queue_id: int):
+        super().__init__()
+        self.queue_id = queue_id
+        self.checked_at = 0.0
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        now = time.time()
+        if now - self.checked_at < CANCEL_CHECK_INTERVAL:
+            return False
+        self.checked_at = now
+
+        db = SessionLocal()
+        try:
+            exists = (
+                db.query(GenerationJob.id)
+                .filter(GenerationJob.id == self.queue_id)
+                .first()
+            )
+        finally:
+            db.close()
+        if exists is None:
+            self.cancel()
+        return self._event.is_set()
+
+
+def detect_sections(markdown: str) -> List[str]:
+    """Return the distinct heading names of a markdown document."""
+    sections = []
+    section_markers = ["# ", "## ", "### "]
+    for line in markdown.split("\n"):
+        if any(line.startswith(marker) for marker in section_markers):
+            section_name = line.strip("#").strip().lower()
+            if section_name not in sections:
+                sections.append(section_name)
+    return sections
+
+
+def find_repository(db: Session, repo_url: str) -> Optional[Repository]:
+    """Find the synced repository matching a clone URL."""
+    repo_url_clean = repo_url.rstrip("/").rstrip(".git")
+    return db.query(Repository).filter(Repository.url == repo_url_clean).first()
+
+
+class GenerationJobRunner:
+    """Creates generation jobs and runs them once a worker claims them."""
+
+    def create_job(
+        self,
+        db: Session,
+        user_id: Optional[int],
+        repo_url: str,
+        style: str,
+        ai_model: Optional[str] = None,
+        template_id: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        commit: bool = True,
+        tier: Optional[str] = None,
+    ) -> GenerationHistory:
+        """Insert a pending history row that represents the job and queue it."""
+        repository = find_repository(db, repo_url) if user_id else None
+        job = GenerationHistory(
+            job_id=f"job_{uuid.uuid4().hex}",
+            user_id=user_id,
+            repository_id=repository.id if repository else None,
+            repo_url=repo_url,
+            markdown_content="",
+            style=style,
+            status="pending",
+            generation_metadata={
+                "ai_model": ai_model or "default",
+                "template_id": template_id,
+                "stage": "queued",
+                "queued_at": datetime.utcnow().isoformat(),
+                "events": [{"phase": "queued", "elapsed_ms": 0}],
+                **(metadata or {}),
+            },
+        )
+        db.add(job)
+        db.flush()
+        # The generation warms the caches itself
+        job_queue.cancel_prefetches(db, repo_url)
+        job_queue.enqueue(
+            db,
+            job,
+            tier=tier
+            or job_scheduler.tier_for(user_id, template_id or style, ai_model),
+        )
+        if commit:
+            db.commit()
+            db.refresh(job)
+        metrics.increment("generation_jobs_total", status="pending")
+        return job
+
+    def cancel(self, db: Session, job: GenerationHistory) -> bool:
+        """Cancel a pending or running job.
+
+        A queued job is removed from the queue; a running one is stopped by
+        its worker at the next cancellation check.
+        """
+        updated = (
+            db.query(GenerationHistory)
+            .filter(
+                GenerationHistory.id == job.id,
+                GenerationHistory.status.in_(["pending", "running"]),
+            )
+            .update({"status": "cancelled"}, synchronize_session=False)
+        )
+        if not updated:
+            db.rollback()
+            return False
+        job_queue.cancel(db, job.id)
+        db.commit()
+        db.refresh(job)
+        logger.info(f"Generation job {job.job_id} cancelled")
+        return True
+
+    def run_job(self, job_id: str) -> None:
+        """Process one job and record its outcome."""
+        db = SessionLocal()
+        try:
+            job = (
+                db.query(GenerationHistory)
+                .filter(GenerationHistory.job_id == job_id)
+                .first()
+            )
+            if job is None:
+                logger.warning(f"Generation job {job_id} no longer exists")
+                return
+
+            # Only a pending job may start; a cancel committed since the job
+            # was loaded wins
+            started = (
+                db.query(GenerationHistory)
+                .filter(
+                    GenerationHistory.id == job.id,
+                    GenerationHistory.status == "pending",
+                )
+                .update({"status": "running"}, synchronize_session="fetch")
+            )
+            db.commit()
+            if not started:
+                logger.info(f"Generation job {job_id} is {job.status}, not starting it")
+                return
+
+            start_time = time.time()
+            token = JobCancellationToken(job.id)
+            progress = ProgressRecorder(db, job)
+            progress("cloning", started_at=datetime.utcnow().isoformat())
+
+            try:
+                result = self._generate(job, progress, token)
+                token.raise_if_cancelled()
+            except GenerationCancelled:
+                db.refresh(job)
+                phase = progress.phase
+                logger.info(f"Generation job {job_id} cancelled during {phase}")
+                job.status = "cancelled"
+                job.generation_time_ms = int((time.time() - start_time) * 1000)
+                progress("cancelled", completed_at=datetime.utcnow().isoformat())
+                metrics.increment("generation_jobs_total", status="cancelled")
+                metrics.increment("generation_jobs_cancelled_total", phase=phase)
+                return
+            except JobFailure as e:
+                logger.error(f"Generation job {job_id} failed: {e}")
+                job.status = "failed"
+                job.error_message = str(e)
+                job.generation_time_ms = int((time.time() - start_time) * 1000)
+                progress(
+                    "failed",
+                    error_code=e.error_code,
+                    completed_at=datetime.utcnow().isoformat(),
+                )
+                metrics.increment("generation_jobs_total", status="failed")
+                return
+
+            progress("persisting")
+            markdown = result["markdown"]
+            # Only a job that is still running may be completed; a cancel that
+            # lands after the last check wins
+            updated = (
+                db.query(GenerationHistory)
+                .filter(
+                    GenerationHistory.id == job.id,
+                    GenerationHistory.status == "running",
+                )
+                .update(
+                    {
+                        "status": "completed",
+                        "markdown_content": markdown,
+                        "model_used": result["model"] or "gitscriptor_core",
+                        "generation_time_ms": int((time.time() - start_time) * 1000),
+                    },
+                    synchronize_session="fetch",
+                )
+            )
+            if not updated:
+                db.rollback()
+                logger.info(f"Generation job {job_id} cancelled before persisting")
+                metrics.increment("generation_jobs_total", status="cancelled")
+                metrics.increment("generation_jobs_cancelled_total", phase="persisting")
+                return
+            progress(
+                "completed",
+                completed_at=datetime.utcnow().isoformat(),
+                max_output_tokens=result["max_output_tokens"],
+                route_reason=result["route_reason"],
+                fallback=result["fallback"],
+                word_count=len(markdown.split()),
+                sections_generated=detect_sections(markdown),
+            )
+            if (job.generation_metadata or {}).get("save_as_draft"):
+                self._save_draft(db, job)
+            metrics.increment("generation_jobs_total", status="completed")
+            metrics.observe("generation_job_ms", job.generation_time_ms)
+            for phase, phase_ms in progress.timings.items():
+                metrics.observe("generation_phase_ms", phase_ms, phase=phase)
+        finally:
+            db.close()
+
+    def prefetch(
+        self,
+        repo_url: str,
+        queue_id: Optional[int] = None,
+        source: Optional[str] = None,
+    ) -> None:
+        """Warm the mirror and analysis caches so a later generation skips both."""
+        start_time = time.time()
+        token = QueueEntryCancellationToken(queue_id) if queue_id else None
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                self._clone(repo_url, tmp_dir, cancel_token=token)
+                analyze_checkout(repo_url, tmp_dir, cancel_token=token)
+        except GenerationCancelled:
+            logger.info(f"Prefetch of {repo_url} cancelled")
+            metrics.increment("prefetch_jobs_total", status="cancelled")
+            return
+        except Exception as e:
+            # Best effort; the first generation simply does the work itself
+            logger.warning(f"Prefetch of {repo_url} failed: {e}")
+            metrics.increment("prefetch_jobs_total", status="failed")
+            return
+        mirror_cache.mark_prefetched(repo_url, source or "unknown")
+        metrics.increment("prefetch_jobs_total", status="completed")
+        metrics.increment("prefetch_completed_total", source=source or "unknown")
+        metrics.observe("prefetch_job_ms", (time.time() - start_time) * 1000)
+
+    def _save_draft(self, db: Session, job: GenerationHistory) -> None:
+        """Store a completed job as a README draft for the owner to review."""
+        if job.user_id is None or job.repository_id is None:
+            return
+        metadata = job.generation_metadata or {}
+        title = metadata.get("draft_title") or "Generated README"
+        draft = (
+            db.query(ReadmeDraft)
+            .filter(
+                ReadmeDraft.user_id == job.user_id,
+                ReadmeDraft.repository_id == job.repository_id,
+                ReadmeDraft.title == title,
+            )
+            .first()
+        )
+        draft_metadata = {
+            "source": metadata.get("trigger", "job"),
+            "job_id": job.job_id,
+            "history_id": job.id,
+        }
+        if draft:
+            draft.content = job.markdown_content
+            draft.style = job.style
+            draft.draft_metadata = draft_metadata
+            draft.version += 1
+        else:
+            draft = ReadmeDraft(
+                user_id=job.user_id,
+                repository_id=job.repository_id,
+                title=title,
+                content=job.markdown_content,
+                style=job.style,
+                draft_metadata=draft_metadata,
+            )
+            db.add(draft)
+        db.commit()
+
+    def _generate(
+        self,
+        job: GenerationHistory,
+        progress: "ProgressRecorder",
+        cancel_token: CancellationToken,
+    ) -> Dict[str, Any]:
+        metadata = job.generation_metadata or {}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self._clone(job.repo_url, tmp_dir, progress, cancel_token)
+            self._record_prefetch_use(job.repo_url)
+            try:
+                return generate_readme_detailed(
+                    job.repo_url,
+                    repo_path=tmp_dir,
+                    style=job.style,
+                    ai_model=metadata.get("ai_model"),
+                    # Repeated batch items share output; everything else is fresh
+                    use_cache=bool(metadata.get("batch_id")),
+                    progress=progress.report,
+                    cancel_token=cancel_token,
+                )
+            except GenerationCancelled:
+                raise
+            except Exception as e:
+                raise JobFailure("generation_failed", f"Internal error: {str(e)}")
+
+    def _record_prefetch_use(self, repo_url: str) -> None:
+        """Count whether a prefetch had already warmed this generation's commit."""
+        marker = mirror_cache.take_prefetched(repo_url)
+        if marker is None:
+            metrics.increment("prefetch_lookups_total", outcome="miss")
+            return
+        # A push after the prefetch means the analysis had to be redone
+        fresh = marker.get("commit") == mirror_cache.head(repo_url)
+        outcome = "hit" if fresh else "stale"
+        metrics.increment("prefetch_lookups_total", outcome=outcome)
+        metrics.increment(
+            "prefetch_used_total", outcome=outcome, source=marker.get("source")
+        )
+
+    def _clone(
+        self,
+        repo_url: str,
+        target: str,
+        progress: Optional["ProgressRecorder"] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> None:
+        """Check out a repository through the local mirror cache.
+
+        Only the mirror update talks to the remote; it reports bytes received
+        while it runs and is killed as soon as the job is cancelled.
+        """
+        try:
+            mirror_cache.sync(
+                repo_url, lambda cmd: self._run_git(cmd, progress, cancel_token)
+            )
+            mirror_cache.checkout(repo_url, target)
+        except GenerationCancelled:
+            raise
+        except GitScriptorError as e:
+            raise JobFailure("clone_failed", str(e))
+
+    def _run_git(
+        self,
+        cmd: List[str],
+        progress: Optional["ProgressRecorder"],
+        cancel_token: Optional[CancellationToken],
+    ) -> None:
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        state = {"bytes_received": 0, "errors": []}
+        reader = threading.Thread(
+            target=_read_clone_progress, args=(process.stderr, state), daemon=True
+        )
+        reader.start()
+
+        deadline = time.time() + GENERATION_CLONE_TIMEOUT
+        while True:
+            try:
+                returncode = process.wait(
+                    timeout=min(PROGRESS_MIN_INTERVAL, CANCEL_CHECK_INTERVAL)
+                )
+                break
+            except subprocess.TimeoutExpired:
+                if cancel_token is not None and cancel_token.cancelled:
+                    process.kill()
+                    process.wait()
+                    raise GenerationCancelled("Repository clone cancelled")
+                if time.time() > deadline:
+                    process.kill()
+                    process.wait()
+                    raise JobFailure("clone_timeout", "Repository clone timeout")
+                if progress:
+                    progress.report("cloning", bytes_received=state["bytes_received"])
+
+        reader.join(timeout=5)
+        if progress:
+            progress.report(
+                "cloning", bytes_received=state["bytes_received"], force=True
+            )
+        if returncode != 0:
+            stderr = "\n".join(state["errors"])
+            raise JobFailure("clone_failed", f"Failed to clone repository: {stderr}")
+
+
+def _read_clone_progress(stream, state: Dict[str, Any]) -> None:
+    """Parse git's progress output; other lines are kept as error text."""
+    buffer = b""
+    while True:
+        chunk = stream.read1(4096) if hasattr(stream, "read1") else stream.read(4096)
+        if not chunk:
+            break
+        buffer += chunk
+        *lines, buffer = re.split(rb"[\r\n]", buffer)
+        for line in lines:
+            _parse_clone_line(line.decode("utf-8", "replace").strip(), state)
+    _parse_clone_line(buffer.decode("utf-8", "replace").strip(), state)
+
+
+def _parse_clone_line(line: str, state: Dict[str, Any]) -> None:
+    if not line:
+        return
+    match = CLONE_BYTES_PATTERN.search(line)
+    if match:
+        value, unit = match.groups()
+        state["bytes_received"] = int(float(value) * BYTE_UNITS[unit])
+    elif not line.startswith(("Cloning into", "remote:", "Receiving", "Resolving")):
+        state["errors"].append(line)
+
+
+class ProgressRecorder:
+    """Records phase transitions and progress details on a job row.
+
+    Every phase change is appended to ``events`` and closes the previous
+    phase's entry in ``phase_timings_ms``. Updates within a phase only
+    refresh ``progress``; repeated counter updates are throttled to one
+    write per PROGRESS_MIN_INTERVAL seconds.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        job: GenerationHistory,
+        min_interval: float = PROGRESS_MIN_INTERVAL,
+    ):
+        self.db = db
+        self.job = job
+        self.min_interval = min_interval
+        metadata = job.generation_metadata or {}
+        queued_at = metadata.get("queued_at")
+        self.origin = (
+            datetime.fromisoformat(queued_at) if queued_at else datetime.utcnow()
+        )
+        events = metadata.get("events") or []
+        self.phase = metadata.get("stage")
+        self.phase_started_ms = events[-1]["elapsed_ms"] if events else 0
+        self.timings: Dict[str, int] = dict(metadata.get("phase_timings_ms") or {})
+        self.last_write = 0.0
+        self.last_keys: set = set()
+
+    def elapsed_ms(self) -> int:
+        return int((datetime.utcnow() - self.origin).total_seconds() * 1000)
+
+    def __call__(self, phase: str, **fields) -> None:
+        """Enter a phase, storing extra top-level metadata fields with it."""
+        self._write(phase, {}, fields)
+
+    def report(self, phase: str, force: bool = False, **details) -> None:
+        """Progress callback handed to the generation pipeline."""
+        # Only repeated counter updates are throttled; new details always land
+        if (
+            phase == self.phase
+            and not force
+            and set(details) == self.last_keys
+            and time.time() - self.last_write < self.min_interval
+        ):
+            return
+        self._write(phase, details, {})
+
+    def _write(self, phase: str, details: Dict[str, Any], fields: Dict[str, Any]):
+        elapsed_ms = self.elapsed_ms()
+        metadata = {**(self.job.generation_metadata or {}), **fields}
+
+        if phase != self.phase:
+            if self.phase:
+                self.timings[self.phase] = self.timings.get(self.phase, 0) + (
+                    elapsed_ms - self.phase_started_ms
+                )
+            metadata["events"] = list(metadata.get("events") or []) + [
+                {"phase": phase, "elapsed_ms": elapsed_ms, **details}
+            ]
+            metadata["stage"] = phase
+            metadata["phase_timings_ms"] = dict(self.timings)
+            self.phase = phase
+            self.phase_started_ms = elapsed_ms
+
+        metadata["progress"] = {"phase": phase, "elapsed_ms": elapsed_ms, **details}
+        # Reassign so SQLAlchemy notices the JSON column changed
+        self.job.generation_metadata = metadata
+        self.db.commit()
+        self.last_write = time.time()
+        self.last_keys = set(details)
+
+
+# Global instance
+job_runner = GenerationJobRunner()
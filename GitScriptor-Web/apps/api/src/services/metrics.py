@@ -0,0 +1,139 @@
+"""
+In-process metrics registry for counters, gauges and latency windows.
+"""
+
+import time
+import threading
+from collections import deque
+from typing import Optional, Dict, Any, Callable
+
+LATENCY_WINDOW_SIZE = 500
+
+
+def _metric_key(name: str, labels: Dict[str, Any]) -> str:
+    if not labels:
+        return name
+    label_str = ",".join(f"{k}={labels[k]}" for k in sorted(labels))
+    return f"{name}{{{label_str}}}"
+
+
+class LatencyWindow:
+    """Sliding window of recent latency samples in milliseconds.
+
+    With ``max_age_seconds``, samples older than that are dropped as well.
+    """
+
+    def __init__(
+        self, size: int = LATENCY_WINDOW_SIZE, max_age_seconds: Optional[float] = None
+    ):
+        # (observed at, value) pairs
+        self.samples = deque(maxlen=size)
+        self.max_age_seconds = max_age_seconds
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value_ms: float) -> None:
+        with self.lock:
+            self.samples.append((time.time(), value_ms))
+            self.count += 1
+
+    def _expire(self) -> None:
+        if self.max_age_seconds is None:
+            return
+        cutoff = time.time() - self.max_age_seconds
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Return the q-th percentile (0-100) of the window, or None if empty."""
+        with self.lock:
+            self._expire()
+            if not self.samples:
+                return None
+            ordered = sorted(value for _, value in self.samples)
+        index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def __len__(self) -> int:
+        with self.lock:
+            self._expire()
+            return len(self.samples)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "window": len(self),
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe registry exposed through the /metrics endpoint."""
+
+    def __init__(self):
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self.latencies: Dict[str, LatencyWindow] = {}
+        self.collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self.lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        key = _metric_key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def counter(self, name: str, **labels) -> float:
+        """Current value of a counter."""
+        with self.lock:
+            return self.counters.get(_metric_key(name, labels), 0)
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        key = _metric_key(name, labels)
+        with self.lock:
+            self.gauges[key] = value
+
+    def latency(self, name: str, **labels) -> LatencyWindow:
+        """Get or create the latency window for a metric."""
+        key = _metric_key(name, labels)
+        with self.lock:
+            window = self.latencies.get(key)
+            if window is None:
+                window = self.latencies[key] = LatencyWindow()
+            return window
+
+    def observe(self, name: str, value_ms: float, **labels) -> None:
+        self.latency(name, **labels).observe(value_ms)
+
+    def register_collector(
+        self, name: str, collector: Callable[[], Dict[str, Any]]
+    ) -> None:
+        """Register a callable whose result is included in every snapshot."""
+        with self.lock:
+            self.collectors[name] = collector
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            latencies = dict(self.latencies)
+            collectors = dict(self.collectors)
+
+        collected = {}
+        for name, collector in collectors.items():
+            try:
+                collected[name] = collector()
+            except Exception as e:
+                collected[name] = {"error": str(e)}
+
+        return {
+            "counters": counters,
+            "gauges": gauges,
+            "latencies": {key: window.summary() for key, window in latencies.items()},
+            **collected,
+        }
+
+
+# Global instance
+metrics = MetricsRegistry()
@@ -0,0 +1,183 @@
+"""
+Cost/latency-aware routing of generation requests to Gemini models.
+"""
+
+import os
+import random
+import logging
+import threading
+from typing import Optional, Dict, List, Any, Tuple
+
+from .metrics import metrics, LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+# Models ordered from slowest/most capable to fastest/cheapest
+MODEL_PRO = os.getenv("GEMINI_MODEL_PRO", "gemini-1.5-pro")
+MODEL_FLASH = os.getenv("GEMINI_MODEL_FLASH", "gemini-1.5-flash")
+MODEL_FAST = os.getenv("GEMINI_MODEL_FAST", "gemini-1.5-flash-8b")
+FALLBACK_CHAIN = [MODEL_PRO, MODEL_FLASH, MODEL_FAST]
+
+TIER_MODELS = {
+    "default": MODEL_FLASH,
+    "advanced": MODEL_PRO,
+    "premium": MODEL_PRO,
+}
+
+STYLE_OUTPUT_TOKENS = {
+    "minimal": 512,
+    "classic": 2048,
+    "modern": 2048,
+    "comprehensive": 4096,
+}
+
+# Latency objective per request; models whose recent p90 exceeds it are skipped
+MODEL_SLO_MS = int(os.getenv("MODEL_SLO_MS", "20000"))
+MODEL_SLO_PERCENTILE = float(os.getenv("MODEL_SLO_PERCENTILE", "90"))
+MODEL_SLO_MIN_SAMPLES = int(os.getenv("MODEL_SLO_MIN_SAMPLES", "20"))
+# Only calls from the last this many seconds count towards the SLO
+MODEL_SLO_WINDOW_SECONDS = float(os.getenv("MODEL_SLO_WINDOW_SECONDS", "600"))
+# Share of traffic still sent to a slow model so its latency window recovers
+MODEL_SLO_PROBE_RATE = float(os.getenv("MODEL_SLO_PROBE_RATE", "0.05"))
+
+# Repositories at or below these sizes are considered tiny
+TINY_REPO_FILES = int(os.getenv("TINY_REPO_FILES", "25"))
+TINY_REPO_LINES = int(os.getenv("TINY_REPO_LINES", "1500"))
+
+
+class ModelRoute:
+    """The model and output budget chosen for one request."""
+
+    def __init__(self, model: str, max_output_tokens: int, reason: str):
+        self.model = model
+        self.max_output_tokens = max_output_tokens
+        self.reason = reason
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "max_output_tokens": self.max_output_tokens,
+            "reason": self.reason,
+        }
+
+
+class ModelRouter:
+    """Maps tier, style and repository size to a model and output budget."""
+
+    def __init__(
+        self,
+        slo_ms: int = MODEL_SLO_MS,
+        window_seconds: float = MODEL_SLO_WINDOW_SECONDS,
+    ):
+        self.slo_ms = slo_ms
+        self.window_seconds = window_seconds
+        # Recent latencies per (model, output budget); long outputs take
+        # longer and must not make a model look slow for short ones
+        self._windows: Dict[Tuple[str, int], LatencyWindow] = {}
+        self._lock = threading.Lock()
+
+    def route(
+        self,
+        ai_model: Optional[str],
+        style: Optional[str],
+        analysis: Optional[Dict[str, Any]] = None,
+    ) -> ModelRoute:
+        tier = ai_model if ai_model in TIER_MODELS else "default"
+        style = style or "classic"
+        model = TIER_MODELS[tier]
+        max_output_tokens = STYLE_OUTPUT_TOKENS.get(style, 2048)
+        reasons = [f"tier={tier}", f"style={style}"]
+
+        if tier == "premium" and style == "comprehensive":
+            max_output_tokens = 8192
+
+        if analysis and self._is_tiny(analysis):
+            reasons.append("tiny_repo")
+            max_output_tokens = min(max_output_tokens, 1024)
+            if style == "minimal" and tier == "default":
+                model = MODEL_FAST
+
+        model = self._apply_slo(model, max_output_tokens, reasons)
+        route = ModelRoute(model, max_output_tokens, ",".join(reasons))
+        metrics.increment("model_routes_total", model=model, tier=tier)
+        return route
+
+    def record(
+        self,
+        model: str,
+        latency_ms: float,
+        success: bool = True,
+        max_output_tokens: Optional[int] = None,
+    ) -> None:
+        """
+        Record the outcome of a model call for future routing decisions.
+
+        Failed calls are observed too, timeouts at the timeout, so the
+        percentiles include the tail the SLO is meant to catch.
+        """
+        metrics.increment(
+            "llm_requests_total",
+            model=model,
+            outcome="success" if success else "error",
+        )
+        metrics.observe("llm_latency_ms", latency_ms, model=model)
+        if max_output_tokens is not None:
+            self._window(model, max_output_tokens).observe(latency_ms)
+
+    def latency_percentile(
+        self, model: str, q: float, max_output_tokens: int
+    ) -> Optional[float]:
+        """Recent latency percentile of calls with this output budget, if known."""
+        window = self._window(model, max_output_tokens)
+        if len(window) < MODEL_SLO_MIN_SAMPLES:
+            return None
+        return window.percentile(q)
+
+    def _window(self, model: str, max_output_tokens: int) -> LatencyWindow:
+        with self._lock:
+            window = self._windows.get((model, max_output_tokens))
+            if window is None:
+                window = self._windows[(model, max_output_tokens)] = LatencyWindow(
+                    max_age_seconds=self.window_seconds
+                )
+            return window
+
+    def _is_tiny(self, analysis: Dict[str, Any]) -> bool:
+        file_count = analysis.get("file_count") or 0
+        lines_of_code = analysis.get("lines_of_code") or 0
+        return 0 < file_count <= TINY_REPO_FILES and lines_of_code <= TINY_REPO_LINES
+
+    def _apply_slo(self, model: str, max_output_tokens: int, reasons: List[str]) -> str:
+        """Step down the fallback chain while the model is missing its SLO."""
+        if model not in FALLBACK_CHAIN:
+            return model
+
+        observed = self.latency_percentile(
+            model, MODEL_SLO_PERCENTILE, max_output_tokens
+        )
+        if observed is not None and observed > self.slo_ms:
+            if random.random() < MODEL_SLO_PROBE_RATE:
+                reasons.append("slo_probe")
+                return model
+
+        for candidate in FALLBACK_CHAIN[FALLBACK_CHAIN.index(model) :]:
+            observed = self.latency_percentile(
+                candidate, MODEL_SLO_PERCENTILE, max_output_tokens
+            )
+            if observed is None or observed <= self.slo_ms:
+                if candidate != model:
+                    reasons.append(f"slo_fallback_from={model}")
+                    metrics.increment("model_slo_fallbacks_total", model=model)
+                    logger.info(
+                        f"Routing {model} -> {candidate}: p{MODEL_SLO_PERCENTILE:g} "
+                        f"latency above {self.slo_ms}ms"
+                    )
+                return candidate
+
+        # Every model is slow; the fastest is still the best option
+        reasons.append("slo_exhausted")
+        return FALLBACK_CHAIN[-1]
+
+
+# Global instance
+model_router = ModelRouter()
@@ -0,0 +1,191 @@
+"""
+Background cache warm-up ahead of likely generations.
+
+Prefetch entries are queued in generation_jobs as low-priority "background"
+work that fills the mirror and analysis caches, so the first generation of
+a repository goes straight to the model call. They are queued:
+
+- after a repository sync, for the user's most recently pushed repositories;
+- speculatively, when a repository is viewed or picked from search.
+
+Speculative prefetches are deduplicated against queued prefetches and
+recently fetched mirrors, limited per user by a token bucket and capped
+across all users, so browsing can't turn into a clone storm. Queuing a
+generation drops queued prefetches of the same repository.
+"""
+
+import os
+import time
+import logging
+from typing import Optional, Dict, List, Any
+
+from sqlalchemy import func  # type: ignore
+from sqlalchemy.orm import Session  # type: ignore
+
+from ..db.models import Repository, GenerationHistory, GenerationJob
+from .gitscriptor_core import mirror_cache
+from .metrics import metrics
+from .queue import job_queue
+from .rate_limit import RateLimitRule, parse_limit, rate_limiter
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+# Repositories warmed per user; also caps the user's queued prefetches
+PREFETCH_MAX_REPOS = int(os.getenv("PREFETCH_MAX_REPOS", "5"))
+# Prefetches queued or running across all users
+PREFETCH_MAX_QUEUED = int(os.getenv("PREFETCH_MAX_QUEUED", "100"))
+# A mirror fetched this recently is not prefetched again
+PREFETCH_RECENT_SECONDS = int(os.getenv("PREFETCH_RECENT_SECONDS", "600"))
+
+# Speculative prefetches per user, "<requests>/<seconds>"
+PREFETCH_RULE = RateLimitRule(
+    "prefetch", "", (), *parse_limit(os.getenv("RATE_LIMIT_PREFETCH", "20/300"))
+)
+
+
+class RepositoryPrefetcher:
+    """Queues cache warm-ups for repositories a user is likely to generate."""
+
+    def __init__(
+        self,
+        max_repos: int = PREFETCH_MAX_REPOS,
+        max_queued: int = PREFETCH_MAX_QUEUED,
+        recent_seconds: int = PREFETCH_RECENT_SECONDS,
+    ):
+        self.max_repos = max_repos
+        self.max_queued = max_queued
+        self.recent_seconds = recent_seconds
+
+    def candidates(self, db: Session, user_id: int) -> List[Repository]:
+        """Most recently pushed repositories a worker can clone."""
+        return (
+            db.query(Repository)
+            .filter(
+                Repository.owner_id == user_id,
+                # Workers clone anonymously
+                Repository.is_private.is_(False),
+                Repository.is_archived.is_(False),
+                Repository.is_disabled.is_(False),
+                Repository.github_pushed_at.isnot(None),
+            )
+            .order_by(Repository.github_pushed_at.desc())
+            .limit(self.max_repos)
+            .all()
+        )
+
+    def enqueue_for_user(self, db: Session, user_id: int) -> int:
+        """Queue prefetches for the user's top repositories; returns how many."""
+        if not PREFETCH_ENABLED or self.max_repos <= 0:
+            return 0
+
+        pending = (
+            db.query(GenerationJob.repo_url)
+            .filter(GenerationJob.kind == "prefetch", GenerationJob.user_id == user_id)
+            .all()
+        )
+        pending_urls = {repo_url for (repo_url,) in pending}
+        capacity = min(
+            self.max_repos - len(pending_urls), self.max_queued - self._queued(db)
+        )
+
+        enqueued = 0
+        for repository in self.candidates(db, user_id):
+            if enqueued >= capacity:
+                break
+            if repository.url in pending_urls:
+                continue
+            job_queue.enqueue_prefetch(db, user_id, repository.url, source="sync")
+            enqueued += 1
+
+        if enqueued:
+            db.commit()
+            logger.info(f"Queued {enqueued} repository prefetches for user {user_id}")
+            metrics.increment("prefetch_jobs_enqueued_total", enqueued, source="sync")
+        return enqueued
+
+    def request(self, db: Session, user_id: int, repo_url: str, source: str) -> str:
+        """
+        Speculatively prefetch one repository.
+
+        Returns the outcome: ``queued``, or why nothing was queued
+        (``disabled``, ``duplicate``, ``recent``, ``rate_limited``, ``busy``).
+        """
+        outcome = self._request(db, user_id, repo_url, source)
+        metrics.increment("prefetch_requests_total", source=source, outcome=outcome)
+        return outcome
+
+    def _request(self, db: Session, user_id: int, repo_url: str, source: str) -> str:
+        if not PREFETCH_ENABLED:
+            return "disabled"
+
+        prefetching = (
+            db.query(GenerationJob.id)
+            .filter(GenerationJob.repo_url == repo_url)
+            .first()
+        )
+        generating = (
+            db.query(GenerationJob.id)
+            .join(GenerationJob.history)
+            .filter(GenerationHistory.repo_url == repo_url)
+            .first()
+        )
+        if prefetching is not None or generating is not None:
+            return "duplicate"
+        synced_at = mirror_cache.synced_at(repo_url)
+        if synced_at is not None and time.time() - synced_at < self.recent_seconds:
+            return "recent"
+        if self._queued(db) >= self.max_queued:
+            return "busy"
+        # Charged last, so only prefetches that would run use up the budget
+        if not rate_limiter.check(PREFETCH_RULE, f"user:{user_id}")["allowed"]:
+            return "rate_limited"
+
+        job_queue.enqueue_prefetch(db, user_id, repo_url, source=source)
+        db.commit()
+        metrics.increment("prefetch_jobs_enqueued_total", source=source)
+        return "queued"
+
+    def cancel(self, db: Session, user_id: int, repo_url: str) -> int:
+        """Cancel the user's queued or running prefetch of a repository."""
+        cancelled = job_queue.cancel_prefetches(db, repo_url, user_id=user_id)
+        db.commit()
+        if cancelled:
+            metrics.increment("prefetch_jobs_cancelled_total", cancelled)
+        return cancelled
+
+    def _queued(self, db: Session) -> int:
+        return (
+            db.query(func.count(GenerationJob.id))
+            .filter(GenerationJob.kind == "prefetch")
+            .scalar()
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Prefetch effectiveness as seen by this process.
+
+        ``hit_rate`` is the share of completed prefetches a generation later
+        used at the same commit; ``coverage`` is the share of generations
+        that found their repository prefetched.
+        """
+        completed = metrics.counter("prefetch_jobs_total", status="completed")
+        lookups = {
+            outcome: metrics.counter("prefetch_lookups_total", outcome=outcome)
+            for outcome in ("hit", "stale", "miss")
+        }
+        return {
+            "completed": completed,
+            **lookups,
+            "hit_rate": _ratio(lookups["hit"], completed),
+            "coverage": _ratio(lookups["hit"], sum(lookups.values())),
+        }
+
+
+def _ratio(part: float, whole: float) -> Optional[float]:
+    return round(part / whole, 3) if whole else None
+
+
+# Global instance
+repository_prefetcher = RepositoryPrefetcher()
+metrics.register_collector("prefetch", repository_prefetcher.stats)
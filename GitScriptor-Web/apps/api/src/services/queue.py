@@ -0,0 +1,296 @@
+"""
+Postgres-backed generation job queue.
+
+Workers claim queued rows with SELECT ... FOR UPDATE SKIP LOCKED, so any
+number of worker processes on any number of nodes can share the queue
+without handing the same job out twice. Which job is claimed next is
+decided by the fair scheduler in scheduler.py. Running jobs carry a heartbeat;
+jobs whose worker stops heartbeating for longer than the visibility
+timeout are put back on the queue.
+"""
+
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any
+
+from sqlalchemy import func  # type: ignore
+from sqlalchemy.orm import Session  # type: ignore
+
+from ..db.database import SessionLocal
+from ..db.models import GenerationHistory, GenerationJob
+from .metrics import metrics
+from .scheduler import job_scheduler
+
+logger = logging.getLogger(__name__)
+
+WORKER_HEARTBEAT_INTERVAL = int(os.getenv("WORKER_HEARTBEAT_INTERVAL", "10"))
+WORKER_VISIBILITY_TIMEOUT = int(os.getenv("WORKER_VISIBILITY_TIMEOUT", "120"))
+WORKER_MAX_ATTEMPTS = int(os.getenv("WORKER_MAX_ATTEMPTS", "3"))
+
+
+class JobQueue:
+    """Enqueue, claim, heartbeat and recover generation jobs."""
+
+    def __init__(
+        self,
+        visibility_timeout: int = WORKER_VISIBILITY_TIMEOUT,
+        max_attempts: int = WORKER_MAX_ATTEMPTS,
+    ):
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+
+    def enqueue(
+        self, db: Session, history: GenerationHistory, tier: str
+    ) -> GenerationJob:
+        """Add a pending history row to the queue; the caller commits."""
+        entry = GenerationJob(
+            history_id=history.id,
+            user_id=history.user_id,
+            tier=tier,
+            state="queued",
+            attempts=0,
+            enqueued_at=datetime.utcnow(),
+        )
+        db.add(entry)
+        return entry
+
+    def enqueue_prefetch(
+        self, db: Session, user_id: Optional[int], repo_url: str, source: str
+    ) -> GenerationJob:
+        """Queue a cache warm-up for a repository; the caller commits."""
+        entry = GenerationJob(
+            kind="prefetch",
+            repo_url=repo_url,
+            source=source,
+            user_id=user_id,
+            tier="background",
+            state="queued",
+            attempts=0,
+            enqueued_at=datetime.utcnow(),
+        )
+        db.add(entry)
+        return entry
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Claim the next job chosen by the scheduler, or None if the queue is empty."""
+        db = SessionLocal()
+        try:
+            entry = None
+            for queue_id in job_scheduler.rank(db):
+                entry = self._lock_queued(db, GenerationJob.id == queue_id)
+                if entry is not None:
+                    break
+            if entry is None:
+                # Every preferred job is being claimed by another worker
+                entry = self._lock_queued(db)
+            if entry is None:
+                db.rollback()
+                return None
+
+            # Guard on state as well, for databases that ignore SKIP LOCKED
+            now = datetime.utcnow()
+            updated = (
+                db.query(GenerationJob)
+                .filter(GenerationJob.id == entry.id, GenerationJob.state == "queued")
+                .update(
+                    {
+                        "state": "running",
+                        "worker_id": worker_id,
+                        "attempts": GenerationJob.attempts + 1,
+                        "claimed_at": now,
+                        "heartbeat_at": now,
+                    },
+                    synchronize_session=False,
+                )
+            )
+            if not updated:
+                db.rollback()
+                return None
+
+            claimed = {
+                "id": entry.id,
+                "kind": entry.kind,
+                "job_id": entry.history.job_id if entry.history else None,
+                "repo_url": entry.repo_url,
+                "source": entry.source,
+                "attempts": entry.attempts + 1,
+            }
+            wait_ms = (now - entry.enqueued_at).total_seconds() * 1000
+            user_id, tier = entry.user_id, entry.tier
+            db.commit()
+
+            metrics.observe("generation_queue_claim_ms", wait_ms)
+            job_scheduler.record_wait(user_id, tier, wait_ms)
+            return claimed
+        finally:
+            db.close()
+
+    def _lock_queued(self, db: Session, *criteria) -> Optional[GenerationJob]:
+        """Lock the oldest queued job matching the criteria, skipping locked rows."""
+        return (
+            db.query(GenerationJob)
+            .filter(GenerationJob.state == "queued", *criteria)
+            .order_by(GenerationJob.id)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+
+    def heartbeat(self, queue_ids, worker_id: str) -> None:
+        """Refresh the heartbeat of jobs held by a worker."""
+        if not queue_ids:
+            return
+        db = SessionLocal()
+        try:
+            db.query(GenerationJob).filter(
+                GenerationJob.id.in_(list(queue_ids)),
+                GenerationJob.worker_id == worker_id,
+            ).update({"heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def complete(self, queue_id: int, worker_id: str) -> None:
+        """Remove a finished job from the queue if the worker still holds it."""
+        db = SessionLocal()
+        try:
+            db.query(GenerationJob).filter(
+                GenerationJob.id == queue_id,
+                GenerationJob.worker_id == worker_id,
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def cancel(self, db: Session, history_id: int) -> None:
+        """Drop a cancelled job that no worker has claimed yet; the caller commits."""
+        db.query(GenerationJob).filter(
+            GenerationJob.history_id == history_id,
+            GenerationJob.state == "queued",
+        ).delete(synchronize_session=False)
+
+    def cancel_prefetches(
+        self, db: Session, repo_url: str, user_id: Optional[int] = None
+    ) -> int:
+        """Drop prefetches of a repository; the caller commits.
+
+        Without ``user_id`` only queued prefetches are dropped, because a
+        generation of the same repository is about to do the work itself.
+        With it the user's running prefetch is dropped too, and its worker
+        stops at the next cancellation check.
+        """
+        query = db.query(GenerationJob).filter(
+            GenerationJob.kind == "prefetch", GenerationJob.repo_url == repo_url
+        )
+        if user_id is None:
+            query = query.filter(GenerationJob.state == "queued")
+        else:
+            query = query.filter(GenerationJob.user_id == user_id)
+        return query.delete(synchronize_session=False)
+
+    def recover_stale(self) -> int:
+        """Requeue running jobs whose worker stopped heartbeating."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.visibility_timeout)
+        db = SessionLocal()
+        recovered = 0
+        try:
+            stale = (
+                db.query(GenerationJob)
+                .filter(
+                    GenerationJob.state == "running",
+                    GenerationJob.heartbeat_at < cutoff,
+                )
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            for entry in stale:
+                history = entry.history
+                if history is None:
+                    # Prefetches have no history; retry or drop them quietly
+                    if entry.attempts >= self.max_attempts:
+                        db.delete(entry)
+                    else:
+                        entry.state = "queued"
+                        entry.worker_id = None
+                    recovered += 1
+                    continue
+                metadata = history.generation_metadata or {}
+                if history.status == "cancelled":
+                    # Cancelled while its worker was down; nothing to retry
+                    db.delete(entry)
+                    continue
+                if entry.attempts >= self.max_attempts:
+                    logger.error(
+                        f"Generation job {history.job_id} lost its worker "
+                        f"{entry.attempts} times, giving up"
+                    )
+                    history.status = "failed"
+                    history.error_message = "Worker stopped responding"
+                    history.generation_metadata = {
+                        **metadata,
+                        "stage": "failed",
+                        "error_code": "worker_lost",
+                        "completed_at": datetime.utcnow().isoformat(),
+                    }
+                    db.delete(entry)
+                else:
+                    logger.warning(
+                        f"Requeueing generation job {history.job_id} from "
+                        f"worker {entry.worker_id}"
+                    )
+                    entry.state = "queued"
+                    entry.worker_id = None
+                    history.status = "pending"
+                    history.generation_metadata = {**metadata, "stage": "queued"}
+                recovered += 1
+            db.commit()
+        finally:
+            db.close()
+
+        if recovered:
+            metrics.increment("generation_queue_recovered_total", recovered)
+        return recovered
+
+    def depth(self) -> Dict[str, int]:
+        """Number of queued and running jobs."""
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(GenerationJob.state, func.count(GenerationJob.id))
+                .group_by(GenerationJob.state)
+                .all()
+            )
+        finally:
+            db.close()
+        counts = {"queued": 0, "running": 0}
+        counts.update({state: count for state, count in rows})
+        return counts
+
+    def oldest_queued_seconds(self) -> float:
+        """Age of the oldest job still waiting for a worker."""
+        db = SessionLocal()
+        try:
+            oldest = (
+                db.query(func.min(GenerationJob.enqueued_at))
+                .filter(GenerationJob.state == "queued")
+                .scalar()
+            )
+        finally:
+            db.close()
+        if oldest is None:
+            return 0.0
+        return max(0.0, (datetime.utcnow() - oldest).total_seconds())
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and claim latency, used for autoscaling workers."""
+        claim_ms = metrics.latency("generation_queue_claim_ms")
+        return {
+            **self.depth(),
+            "oldest_queued_seconds": self.oldest_queued_seconds(),
+            "claim_latency_ms": claim_ms.summary(),
+        }
+
+
+# Global instance
+job_queue = JobQueue()
+metrics.register_collector("generation_queue", job_queue.stats)
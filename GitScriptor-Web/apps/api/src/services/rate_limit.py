@@ -0,0 +1,205 @@
+"""
+Token-bucket rate limiting for expensive endpoints.
+
+Each rule allows a burst of ``capacity`` requests and refills at
+``capacity / period`` tokens per second. Buckets are kept per user (or per
+client IP for anonymous callers) in a pluggable store:
+
+- ``memory``: buckets live in the API process; fine for a single node.
+- ``database``: buckets live in the rate_limit_buckets table and are shared
+  by every API process.
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, List, Tuple, Any
+
+from sqlalchemy.exc import IntegrityError  # type: ignore
+
+from ..db.database import SessionLocal
+from ..db.models import RateLimitBucket
+
+logger = logging.getLogger(__name__)
+
+# memory or database
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory")
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Buckets kept by the memory store before the least recently used are dropped
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+# Idle database buckets are deleted after this many seconds
+RATE_LIMIT_BUCKET_TTL = int(os.getenv("RATE_LIMIT_BUCKET_TTL", "3600"))
+
+
+class RateLimitRule:
+    """A limit on requests whose path starts with ``path_prefix``."""
+
+    def __init__(
+        self,
+        name: str,
+        path_prefix: str,
+        methods: Tuple[str, ...],
+        capacity: int,
+        period: float,
+    ):
+        self.name = name
+        self.path_prefix = path_prefix
+        self.methods = methods
+        self.capacity = capacity
+        self.period = period
+
+    @property
+    def refill_rate(self) -> float:
+        return self.capacity / self.period
+
+    def matches(self, method: str, path: str) -> bool:
+        return path.startswith(self.path_prefix) and (
+            not self.methods or method in self.methods
+        )
+
+
+def parse_limit(value: str) -> Tuple[int, float]:
+    """Parse ``"<requests>/<seconds>"``, e.g. ``"30/60"``."""
+    requests, _, period = value.partition("/")
+    return int(requests), float(period or 60)
+
+
+def _rule(name: str, path_prefix: str, methods: Tuple[str, ...], default: str):
+    capacity, period = parse_limit(os.getenv(f"RATE_LIMIT_{name.upper()}", default))
+    return RateLimitRule(name, path_prefix, methods, capacity, period)
+
+
+DEFAULT_RULES = [
+    # Starting a generation clones a repository and calls the model
+    _rule("generate", "/generate", ("POST",), "10/60"),
+    # A sync pages through the user's whole GitHub account
+    _rule("sync", "/repositories/sync", (), "5/300"),
+    # Autocomplete fires per keystroke and fans out to GitHub
+    _rule("search", "/search/", (), "30/30"),
+]
+
+
+def refill(tokens: float, updated_at: float, now: float, rule: RateLimitRule) -> float:
+    elapsed = max(0.0, now - updated_at)
+    return min(float(rule.capacity), tokens + elapsed * rule.refill_rate)
+
+
+def result_for(rule: RateLimitRule, tokens: float, allowed: bool) -> Dict[str, Any]:
+    """Outcome of a request; ``reset`` is the seconds until the bucket is full."""
+    return {
+        "allowed": allowed,
+        "limit": rule.capacity,
+        "remaining": max(0, int(tokens)),
+        "reset": math.ceil((rule.capacity - tokens) / rule.refill_rate),
+        "retry_after": (
+            0 if allowed else max(1, math.ceil((1 - tokens) / rule.refill_rate))
+        ),
+    }
+
+
+class MemoryBucketStore:
+    """Token buckets held in this process."""
+
+    blocking = False
+
+    def __init__(self, max_buckets: int = RATE_LIMIT_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self.buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key: str, rule: RateLimitRule) -> Dict[str, Any]:
+        now = time.time()
+        with self.lock:
+            tokens, updated_at = self.buckets.pop(key, (rule.capacity, now))
+            tokens = refill(tokens, updated_at, now, rule)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now)
+            while len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        return result_for(rule, tokens, allowed)
+
+
+class DatabaseBucketStore:
+    """Token buckets in the rate_limit_buckets table, shared by all processes."""
+
+    blocking = True
+
+    def __init__(self, bucket_ttl: int = RATE_LIMIT_BUCKET_TTL):
+        self.bucket_ttl = bucket_ttl
+        self.pruned_at = 0.0
+
+    def take(self, key: str, rule: RateLimitRule) -> Dict[str, Any]:
+        now = time.time()
+        db = SessionLocal()
+        try:
+            bucket = self._lock_bucket(db, key, rule, now)
+            tokens = refill(bucket.tokens, bucket.updated_at, now, rule)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            bucket.tokens = tokens
+            bucket.updated_at = now
+            db.commit()
+        finally:
+            db.close()
+
+        if now - self.pruned_at > self.bucket_ttl:
+            self.pruned_at = now
+            self.prune(now - self.bucket_ttl)
+        return result_for(rule, tokens, allowed)
+
+    def _lock_bucket(self, db, key: str, rule: RateLimitRule, now: float):
+        """Lock the bucket row, creating it full on first use."""
+        query = db.query(RateLimitBucket).filter(RateLimitBucket.key == key)
+        bucket = query.with_for_update().first()
+        if bucket is not None:
+            return bucket
+        try:
+            db.add(RateLimitBucket(key=key, tokens=rule.capacity, updated_at=now))
+            db.flush()
+        except IntegrityError:
+            # Another process created it first
+            db.rollback()
+        return query.with_for_update().one()
+
+    def prune(self, cutoff: float) -> None:
+        """Delete buckets idle since before ``cutoff``; they would be full anyway."""
+        db = SessionLocal()
+        try:
+            db.query(RateLimitBucket).filter(
+                RateLimitBucket.updated_at < cutoff
+            ).delete(synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            logger.warning(f"Failed to prune rate limit buckets: {e}")
+        finally:
+            db.close()
+
+
+STORES = {"memory": MemoryBucketStore, "database": DatabaseBucketStore}
+
+
+class RateLimiter:
+    """Matches requests to rules and charges the caller's bucket."""
+
+    def __init__(self, store=None, rules: Optional[List[RateLimitRule]] = None):
+        self.store = store or STORES[RATE_LIMIT_STORE]()
+        self.rules = DEFAULT_RULES if rules is None else rules
+
+    def rule_for(self, method: str, path: str) -> Optional[RateLimitRule]:
+        for rule in self.rules:
+            if rule.matches(method, path):
+                return rule
+        return None
+
+    def check(self, rule: RateLimitRule, client_key: str) -> Dict[str, Any]:
+        return self.store.take(f"{rule.name}:{client_key}", rule)
+
+
+# Global instance
+rate_limiter = RateLimiter()
@@ -0,0 +1,261 @@
+"""
+Scheduled README refresh for repositories that changed since their last
+generation.
+
+A repository is refreshed when GitHub reports a push newer than every
+completed, pending or running generation for it and at least one generation
+has completed. Failed attempts do not hold a refresh back. Refreshes
+are only queued inside the off-peak window, as low-priority "background"
+jobs, and only while the generation queue is short, so they soak up idle
+worker capacity instead of competing with interactive requests. Results are
+saved as README drafts for the owner to review.
+
+Run a single instance next to the workers:
+    python -m src.services.refresh            # loop every REFRESH_INTERVAL
+    python -m src.services.refresh --once     # one pass, e.g. from cron
+"""
+
+import os
+import time
+import logging
+import argparse
+from datetime import datetime, time as day_time
+from typing import Optional, Dict, List, Any, Tuple
+
+from sqlalchemy import and_, case, func  # type: ignore
+from sqlalchemy.orm import Session  # type: ignore
+
+from ..db.database import SessionLocal
+from ..db.models import Repository, GenerationHistory
+from .admission import admission, AdmissionRejected
+from .jobs import job_runner
+from .metrics import metrics
+from .queue import job_queue
+
+logger = logging.getLogger(__name__)
+
+# Off-peak window in UTC, HH:MM-HH:MM; may wrap past midnight
+REFRESH_WINDOW = os.getenv("REFRESH_WINDOW", "01:00-06:00")
+REFRESH_INTERVAL = int(os.getenv("REFRESH_INTERVAL", "600"))
+# Refreshes are only queued while fewer jobs than this are waiting
+REFRESH_MAX_QUEUE_DEPTH = int(os.getenv("REFRESH_MAX_QUEUE_DEPTH", "20"))
+REFRESH_BATCH_SIZE = int(os.getenv("REFRESH_BATCH_SIZE", "50"))
+REFRESH_MAX_PER_USER = int(os.getenv("REFRESH_MAX_PER_USER", "10"))
+REFRESH_DRAFT_TITLE = os.getenv("REFRESH_DRAFT_TITLE", "Automatic refresh")
+
+
+def parse_window(value: str) -> Tuple[day_time, day_time]:
+    start, _, end = value.partition("-")
+    return day_time.fromisoformat(start.strip()), day_time.fromisoformat(end.strip())
+
+
+def in_window(now: datetime, window: Tuple[day_time, day_time]) -> bool:
+    start, end = window
+    current = now.time()
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end
+
+
+class RefreshScheduler:
+    """Queues background regenerations for repositories with new pushes."""
+
+    def __init__(
+        self,
+        window: str = REFRESH_WINDOW,
+        max_queue_depth: int = REFRESH_MAX_QUEUE_DEPTH,
+        batch_size: int = REFRESH_BATCH_SIZE,
+        max_per_user: int = REFRESH_MAX_PER_USER,
+    ):
+        self.window = parse_window(window)
+        self.max_queue_depth = max_queue_depth
+        self.batch_size = batch_size
+        self.max_per_user = max_per_user
+
+    def find_stale(
+        self, db: Session, limit: int, repository_id: Optional[int] = None
+    ) -> List[Repository]:
+        """Repositories pushed to after their latest generation attempt, oldest push first.
+
+        Failed attempts are ignored so a transient error does not suppress the
+        refresh; pending and running ones count so a repository is not queued twice.
+        """
+        attempts = (
+            db.query(
+                GenerationHistory.repository_id.label("repository_id"),
+                GenerationHistory.user_id.label("user_id"),
+                func.max(GenerationHistory.generated_at).label("last_attempt_at"),
+                func.max(
+                    case(
+                        (
+                            GenerationHistory.status == "completed",
+                            GenerationHistory.generated_at,
+                        )
+                    )
+                ).label("last_completed_at"),
+            )
+            .filter(
+                GenerationHistory.repository_id.isnot(None),
+                GenerationHistory.status.notin_(("cancelled", "failed")),
+            )
+            .group_by(GenerationHistory.repository_id, GenerationHistory.user_id)
+            .subquery()
+        )
+        query = db.query(Repository)
+        if repository_id is not None:
+            query = query.filter(Repository.id == repository_id)
+        return (
+            query.join(
+                attempts,
+                and_(
+                    attempts.c.repository_id == Repository.id,
+                    attempts.c.user_id == Repository.owner_id,
+                ),
+            )
+            .filter(
+                attempts.c.last_completed_at.isnot(None),
+                Repository.github_pushed_at > attempts.c.last_attempt_at,
+                # Workers clone anonymously
+                Repository.is_private.is_(False),
+                Repository.is_archived.is_(False),
+                Repository.is_disabled.is_(False),
+            )
+            .order_by(Repository.github_pushed_at)
+            .limit(limit)
+            .all()
+        )
+
+    def run_once(self, now: Optional[datetime] = None, force: bool = False) -> Dict:
+        """Queue refreshes for stale repositories; returns a summary."""
+        now = now or datetime.utcnow()
+        summary: Dict[str, Any] = {"enqueued": 0, "skipped": {}}
+        if not force and not in_window(now, self.window):
+            summary["skipped"]["outside_window"] = 1
+            return summary
+
+        capacity = min(
+            self.batch_size, self.max_queue_depth - job_queue.depth()["queued"]
+        )
+        if capacity <= 0:
+            summary["skipped"]["queue_busy"] = 1
+            return summary
+
+        db = SessionLocal()
+        try:
+            per_user: Dict[int, int] = {}
+            rejected_users = set()
+            # Over-fetch so per-user caps don't starve the batch
+            for repository in self.find_stale(db, capacity * 4):
+                if summary["enqueued"] >= capacity:
+                    break
+                user_id = repository.owner_id
+                if (
+                    user_id in rejected_users
+                    or per_user.get(user_id, 0) >= self.max_per_user
+                ):
+                    self._skip(summary, "user_limit")
+                    continue
+                try:
+                    admission.admit(db, user_id)
+                except AdmissionRejected:
+                    rejected_users.add(user_id)
+                    self._skip(summary, "user_limit")
+                    continue
+
+                self._enqueue(db, repository)
+                per_user[user_id] = per_user.get(user_id, 0) + 1
+                summary["enqueued"] += 1
+        finally:
+            db.close()
+
+        if summary["enqueued"]:
+            logger.info(f"Queued {summary['enqueued']} README refreshes")
+            metrics.increment("refresh_jobs_enqueued_total", summary["enqueued"])
+        return summary
+
+    def refresh_repository(self, db: Session, repository_id: int) -> str:
+        """
+        Queue a refresh of one repository now, e.g. after a push webhook.
+
+        Ignores the off-peak window but not the queue depth or the owner's
+        limits. Returns ``queued`` or why nothing was queued.
+        """
+        if job_queue.depth()["queued"] >= self.max_queue_depth:
+            return "queue_busy"
+        stale = self.find_stale(db, 1, repository_id=repository_id)
+        if not stale:
+            return "not_stale"
+        repository = stale[0]
+        try:
+            admission.admit(db, repository.owner_id)
+        except AdmissionRejected:
+            return "user_limit"
+        self._enqueue(db, repository)
+        metrics.increment("refresh_jobs_enqueued_total")
+        return "queued"
+
+    def _enqueue(self, db: Session, repository: Repository) -> None:
+        """Queue a refresh using the style of the last completed generation."""
+        previous = (
+            db.query(GenerationHistory)
+            .filter(
+                GenerationHistory.repository_id == repository.id,
+                GenerationHistory.user_id == repository.owner_id,
+                GenerationHistory.status == "completed",
+            )
+            .order_by(GenerationHistory.generated_at.desc())
+            .first()
+        )
+        previous_metadata = previous.generation_metadata or {}
+        job_runner.create_job(
+            db,
+            user_id=repository.owner_id,
+            repo_url=repository.url,
+            style=previous.style,
+            ai_model=previous_metadata.get("ai_model"),
+            template_id=previous_metadata.get("template_id"),
+            metadata={
+                "trigger": "refresh",
+                "save_as_draft": True,
+                "draft_title": REFRESH_DRAFT_TITLE,
+                "pushed_at": repository.github_pushed_at.isoformat(),
+            },
+            tier="background",
+        )
+
+    def _skip(self, summary: Dict[str, Any], reason: str) -> None:
+        summary["skipped"][reason] = summary["skipped"].get(reason, 0) + 1
+
+    def run(self, interval: int = REFRESH_INTERVAL) -> None:
+        """Run a pass every ``interval`` seconds until interrupted."""
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"README refresh pass failed: {e}")
+            time.sleep(interval)
+
+
+# Global instance
+refresh_scheduler = RefreshScheduler()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Scheduled README refresh")
+    parser.add_argument("--once", action="store_true", help="Run a single pass")
+    parser.add_argument(
+        "--force", action="store_true", help="Ignore the off-peak window"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.once or args.force:
+        summary = refresh_scheduler.run_once(force=args.force)
+        logger.info(f"README refresh pass: {summary}")
+    else:
+        refresh_scheduler.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Bulk writes of synced GitHub repositories.
+
+A sync loads the user's stored repositories once and compares every fetched
+repository with them in memory. Each page is then written with a single
+INSERT ... ON CONFLICT (github_id) DO UPDATE holding only the new and the
+changed repositories, so an unchanged account costs one SELECT and no
+writes.
+
+Syncs are incremental: repositories are listed most recently updated first
+and listing stops at the first one not updated since the user's previous
+sync. Every SYNC_FULL_INTERVAL a full sync lists everything instead and
+removes repositories that are gone from GitHub.
+"""
+
+import os
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, List, Any, Set, Tuple
+
+from sqlalchemy import func  # type: ignore
+from sqlalchemy.dialects import postgresql, sqlite  # type: ignore
+from sqlalchemy.orm import Session  # type: ignore
+
+from ..db.models import User, Repository, ReadmeDraft, GenerationHistory
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Seconds between full syncs that also detect deleted repositories
+SYNC_FULL_INTERVAL = int(os.getenv("SYNC_FULL_INTERVAL", "86400"))
+# Incremental syncs re-read this many seconds before the previous sync
+SYNC_WATERMARK_OVERLAP = int(os.getenv("SYNC_WATERMARK_OVERLAP", "300"))
+
+# Columns a sync writes besides github_id and owner_id
+SYNCED_COLUMNS = (
+    "name",
+    "full_name",
+    "description",
+    "url",
+    "clone_url",
+    "ssh_url",
+    "homepage",
+    "language",
+    "languages",
+    "topics",
+    "stars_count",
+    "forks_count",
+    "watchers_count",
+    "open_issues_count",
+    "size",
+    "default_branch",
+    "is_private",
+    "is_fork",
+    "is_archived",
+    "is_disabled",
+    "has_issues",
+    "has_projects",
+    "has_wiki",
+    "has_downloads",
+    "license_name",
+    "license_key",
+    "github_created_at",
+    "github_updated_at",
+    "github_pushed_at",
+)
+
+# Dialects with INSERT ... ON CONFLICT
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+class RepositorySyncWriter:
+    """Diffs fetched repositories against stored ones and upserts the changes."""
+
+    def watermark(self, user: User, now: datetime) -> Optional[datetime]:
+        """
+        Oldest GitHub update an incremental sync has to read.
+
+        None means a full sync is due: the user never synced, or the last
+        full sync is older than SYNC_FULL_INTERVAL.
+        """
+        if (
+            user.repositories_synced_at is None
+            or user.repositories_reconciled_at is None
+        ):
+            return None
+        if now - user.repositories_reconciled_at >= timedelta(
+            seconds=SYNC_FULL_INTERVAL
+        ):
+            return None
+        return user.repositories_synced_at - timedelta(seconds=SYNC_WATERMARK_OVERLAP)
+
+    def updated_since(
+        self, github_repos: List[Dict[str, Any]], since: Optional[datetime]
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Leading repositories of a page updated since the watermark.
+
+        Pages are sorted by update time, newest first; the flag tells
+        whether the page passed the watermark, i.e. listing can stop.
+        """
+        if since is None:
+            return github_repos, False
+        for index, github_repo in enumerate(github_repos):
+            updated_at = _github_datetime(github_repo["updated_at"])
+            if updated_at is not None and updated_at < since:
+                return github_repos[:index], True
+        return github_repos, False
+
+    def load_existing(
+        self, db: Session, user_id: int, github_ids: Optional[List[int]] = None
+    ) -> Dict[int, Dict[str, Any]]:
+        """The user's stored repositories keyed by GitHub id, in one query."""
+        columns = [Repository.github_id] + [
+            getattr(Repository, column) for column in SYNCED_COLUMNS
+        ]
+        query = db.query(*columns).filter(Repository.owner_id == user_id)
+        if github_ids is not None:
+            query = query.filter(Repository.github_id.in_(github_ids))
+        return {row.github_id: dict(row._mapping) for row in query.all()}
+
+    def repository_data(
+        self,
+        github_repo: Dict[str, Any],
+        user_id: int,
+        languages: Dict[str, int],
+    ) -> Dict[str, Any]:
+        """Row values for a REST-shaped GitHub repository."""
+        license_info = github_repo.get("license")
+        return {
+            "github_id": github_repo["id"],
+            "owner_id": user_id,
+            "name": github_repo["name"],
+            "full_name": github_repo["full_name"],
+            "description": github_repo.get("description"),
+            "url": github_repo["html_url"],
+            "clone_url": github_repo["clone_url"],
+            "ssh_url": github_repo["ssh_url"],
+            "homepage": github_repo.get("homepage"),
+            "language": github_repo.get("language"),
+            "languages": languages,
+            "topics": github_repo.get("topics", []),
+            "stars_count": github_repo["stargazers_count"],
+            "forks_count": github_repo["forks_count"],
+            "watchers_count": github_repo["watchers_count"],
+            "open_issues_count": github_repo["open_issues_count"],
+            "size": github_repo["size"],
+            "default_branch": github_repo["default_branch"],
+            "is_private": github_repo["private"],
+            "is_fork": github_repo["fork"],
+            "is_archived": github_repo["archived"],
+            "is_disabled": github_repo["disabled"],
+            "has_issues": github_repo["has_issues"],
+            "has_projects": github_repo["has_projects"],
+            "has_wiki": github_repo["has_wiki"],
+            "has_downloads": github_repo["has_downloads"],
+            "license_name": license_info["name"] if license_info else None,
+            "license_key": license_info["key"] if license_info else None,
+            "github_created_at": _github_datetime(github_repo["created_at"]),
+            "github_updated_at": _github_datetime(github_repo["updated_at"]),
+            "github_pushed_at": _github_datetime(github_repo["pushed_at"]),
+        }
+
+    def upsert(
+        self,
+        db: Session,
+        user_id: int,
+        github_repos: List[Dict[str, Any]],
+        repo_languages: List[Optional[Dict[str, int]]],
+        existing: Dict[int, Dict[str, Any]],
+    ) -> int:
+        """
+        Write new and changed repositories in one statement.
+
+        ``existing`` comes from load_existing and is kept up to date, so it
+        can be reused for every page of a sync. Returns how many
+        repositories were new.
+        """
+        new_rows, changed_rows = [], []
+        for github_repo, languages in zip(github_repos, repo_languages):
+            stored = existing.get(github_repo["id"])
+            if languages is None:
+                # Not fetched this time; keep what we have
+                languages = stored["languages"] if stored else {}
+            data = self.repository_data(github_repo, user_id, languages)
+            if stored is None:
+                new_rows.append(data)
+            elif any(stored[column] != data[column] for column in SYNCED_COLUMNS):
+                changed_rows.append(data)
+
+        if new_rows:
+            # github_id is unique across users; leave other users' rows alone
+            taken = {
+                github_id
+                for (github_id,) in db.query(Repository.github_id).filter(
+                    Repository.github_id.in_([row["github_id"] for row in new_rows])
+                )
+            }
+            if taken:
+                logger.info(
+                    f"Skipping {len(taken)} repositories already synced by other users"
+                )
+                new_rows = [row for row in new_rows if row["github_id"] not in taken]
+
+        rows = new_rows + changed_rows
+        if rows:
+            self._write(db, rows)
+            for row in rows:
+                existing[row["github_id"]] = row
+        metrics.increment("repository_sync_rows_total", len(new_rows), outcome="new")
+        metrics.increment(
+            "repository_sync_rows_total", len(changed_rows), outcome="changed"
+        )
+        metrics.increment(
+            "repository_sync_rows_total",
+            len(github_repos) - len(rows),
+            outcome="unchanged",
+        )
+        return len(new_rows)
+
+    def remove_missing(
+        self,
+        db: Session,
+        user_id: int,
+        seen: Set[int],
+        existing: Dict[int, Dict[str, Any]],
+    ) -> int:
+        """Delete the user's repositories a full listing didn't return."""
+        missing = [github_id for github_id in existing if github_id not in seen]
+        removed = self.remove(db, user_id, missing)
+        for github_id in removed:
+            existing.pop(github_id, None)
+        return len(removed)
+
+    def remove(self, db: Session, user_id: int, github_ids: List[int]) -> List[int]:
+        """
+        Delete repositories that are gone from GitHub.
+
+        Generation history keeps its entries without the repository link.
+        Repositories with README drafts are kept so the drafts aren't lost.
+        Returns the GitHub ids of the removed repositories.
+        """
+        if not github_ids:
+            return []
+        rows = (
+            db.query(Repository.id, Repository.github_id)
+            .filter(
+                Repository.owner_id == user_id, Repository.github_id.in_(github_ids)
+            )
+            .all()
+        )
+        drafted = {
+            repository_id
+            for (repository_id,) in db.query(ReadmeDraft.repository_id)
+            .filter(ReadmeDraft.repository_id.in_([row.id for row in rows]))
+            .distinct()
+        }
+        removable = [row for row in rows if row.id not in drafted]
+        if drafted:
+            logger.info(
+                f"Keeping {len(drafted)} repositories missing from GitHub "
+                f"that have README drafts"
+            )
+        if not removable:
+            return []
+
+        ids = [row.id for row in removable]
+        db.query(GenerationHistory).filter(
+            GenerationHistory.repository_id.in_(ids)
+        ).update({GenerationHistory.repository_id: None}, synchronize_session=False)
+        db.query(Repository).filter(Repository.id.in_(ids)).delete(
+            synchronize_session=False
+        )
+        metrics.increment("repository_sync_rows_total", len(ids), outcome="removed")
+        return [row.github_id for row in removable]
+
+    def _write(self, db: Session, rows: List[Dict[str, Any]]) -> None:
+        insert = _INSERTS[db.get_bind().dialect.name]
+        stmt = insert(Repository).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Repository.github_id],
+            set_={
+                **{column: stmt.excluded[column] for column in SYNCED_COLUMNS},
+                "last_synced_at": func.now(),
+                # Column onupdate doesn't apply to ON CONFLICT updates
+                "updated_at": func.now(),
+            },
+            # Another user's row with the same github_id is never taken over
+            where=Repository.owner_id == stmt.excluded.owner_id,
+        )
+        db.execute(stmt)
+
+
+def _github_datetime(value: Optional[str]) -> Optional[datetime]:
+    """GitHub ISO timestamps as the naive UTC datetimes the columns hold."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+# Global instance
+repository_sync = RepositorySyncWriter()
@@ -0,0 +1,142 @@
+"""
+Weighted fair scheduling of queued generation jobs.
+
+Each tenant (a user, or all anonymous traffic together) is scored by how
+many of its jobs are already running relative to its tier weight, minus a
+bonus that grows with how long the tenant has been waiting for a worker. Workers always
+claim the head job of the lowest-scoring tenant, so a user with hundreds of
+queued jobs only gets their fair share of workers and nothing waits forever.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Dict, List, Any
+
+from sqlalchemy import func  # type: ignore
+from sqlalchemy.orm import Session  # type: ignore
+
+from ..db.models import GenerationJob
+from .metrics import metrics, LatencyWindow
+
+TIER_WEIGHTS = {
+    # Scheduled refreshes only take workers nobody else is asking for
+    "background": float(os.getenv("SCHEDULER_WEIGHT_BACKGROUND", "0.25")),
+    "anonymous": float(os.getenv("SCHEDULER_WEIGHT_ANONYMOUS", "1")),
+    "authenticated": float(os.getenv("SCHEDULER_WEIGHT_AUTHENTICATED", "2")),
+    "premium": float(os.getenv("SCHEDULER_WEIGHT_PREMIUM", "4")),
+}
+
+# Waiting this long is worth as much as one fewer running job
+SCHEDULER_AGING_SECONDS = float(os.getenv("SCHEDULER_AGING_SECONDS", "60"))
+SCHEDULER_TRACKED_TENANTS = int(os.getenv("SCHEDULER_TRACKED_TENANTS", "500"))
+
+# Templates marked is_premium in routers/templates.py
+PREMIUM_TEMPLATES = {"comprehensive"}
+
+
+def tenant_key(user_id: Optional[int]) -> str:
+    return f"user:{user_id}" if user_id is not None else "anonymous"
+
+
+class FairScheduler:
+    """Chooses which queued job a worker claims next."""
+
+    def __init__(
+        self,
+        weights: Dict[str, float] = TIER_WEIGHTS,
+        aging_seconds: float = SCHEDULER_AGING_SECONDS,
+        tracked_tenants: int = SCHEDULER_TRACKED_TENANTS,
+    ):
+        self.weights = weights
+        self.aging_seconds = aging_seconds
+        self.tracked_tenants = tracked_tenants
+        self.tenant_waits: "OrderedDict[str, LatencyWindow]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def tier_for(
+        self,
+        user_id: Optional[int],
+        style: Optional[str] = None,
+        ai_model: Optional[str] = None,
+    ) -> str:
+        """Scheduling tier for a new job."""
+        if user_id is None:
+            return "anonymous"
+        if ai_model == "premium" or style in PREMIUM_TEMPLATES:
+            return "premium"
+        return "authenticated"
+
+    def rank(self, db: Session) -> List[int]:
+        """Queue ids of each tenant's head job, best candidate first."""
+        heads = (
+            db.query(
+                GenerationJob.user_id,
+                GenerationJob.tier,
+                func.min(GenerationJob.id),
+                func.min(GenerationJob.enqueued_at),
+            )
+            .filter(GenerationJob.state == "queued")
+            .group_by(GenerationJob.user_id, GenerationJob.tier)
+            .all()
+        )
+        if not heads:
+            return []
+
+        running = {
+            user_id: (count, last_claimed)
+            for user_id, count, last_claimed in db.query(
+                GenerationJob.user_id,
+                func.count(GenerationJob.id),
+                func.max(GenerationJob.claimed_at),
+            )
+            .filter(GenerationJob.state == "running")
+            .group_by(GenerationJob.user_id)
+            .all()
+        }
+
+        now = datetime.utcnow()
+        scored = []
+        for user_id, tier, head_id, oldest in heads:
+            running_count, last_claimed = running.get(user_id, (0, None))
+            # A tenant that is being served only ages from its latest claim
+            waiting_since = max(oldest, last_claimed) if last_claimed else oldest
+            score = self.score(
+                running_count, tier, (now - waiting_since).total_seconds()
+            )
+            scored.append((score, head_id))
+        return [head_id for _, head_id in sorted(scored)]
+
+    def score(self, running: int, tier: str, waited_seconds: float) -> float:
+        """Lower scores are scheduled first."""
+        weight = self.weights.get(tier, 1.0)
+        return (running + 1) / weight - waited_seconds / self.aging_seconds
+
+    def record_wait(self, user_id: Optional[int], tier: str, wait_ms: float) -> None:
+        """Record how long a claimed job waited in the queue."""
+        metrics.observe("generation_queue_wait_ms", wait_ms, tier=tier)
+
+        tenant = tenant_key(user_id)
+        with self.lock:
+            window = self.tenant_waits.pop(tenant, None) or LatencyWindow(100)
+            self.tenant_waits[tenant] = window
+            while len(self.tenant_waits) > self.tracked_tenants:
+                self.tenant_waits.popitem(last=False)
+        window.observe(wait_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            tenant_waits = dict(self.tenant_waits)
+        return {
+            "weights": self.weights,
+            "aging_seconds": self.aging_seconds,
+            "tenant_wait_ms": {
+                tenant: window.summary() for tenant, window in tenant_waits.items()
+            },
+        }
+
+
+# Global instance
+job_scheduler = FairScheduler()
+metrics.register_collector("generation_scheduler", job_scheduler.stats)
@@ -0,0 +1,388 @@
+"""
+GitHub webhook processing.
+
+Deliveries are verified against GITHUB_WEBHOOK_SECRET and recorded by
+delivery id, so redeliveries are acknowledged without being processed twice.
+Handled events:
+
+- push: updates the stored repository and, for the default branch, marks
+  cached mirrors stale so the next generation fetches and analyzes the
+  pushed commit; the repository can then be prefetched or refreshed right
+  away;
+- repository: applies edits, renames, visibility changes and archiving to
+  the stored repository, adds repositories created by known users and
+  removes deleted ones;
+- installation, installation_repositories: acknowledged and logged. Access
+  comes from the users' OAuth tokens, so they don't change what is synced.
+
+Verified deliveries are saved to WEBHOOK_RECORD_DIR when it is set, and can
+be replayed locally:
+    python -m src.services.webhooks deliveries/*.json
+    python -m src.services.webhooks --url http://localhost:8000/webhooks/github deliveries/*.json
+"""
+
+import os
+import hmac
+import json
+import uuid
+import hashlib
+import logging
+import argparse
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional, Dict, List, Any
+
+import httpx
+from sqlalchemy.exc import IntegrityError  # type: ignore
+from sqlalchemy.orm import Session  # type: ignore
+
+from ..db.database import SessionLocal
+from ..db.models import User, Repository, WebhookDelivery
+from .gitscriptor_core import mirror_cache
+from .metrics import metrics
+from .prefetch import repository_prefetcher
+from .refresh import refresh_scheduler
+from .repository_sync import repository_sync
+
+logger = logging.getLogger(__name__)
+
+# Deliveries are rejected until a secret is configured
+GITHUB_WEBHOOK_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET")
+# Warm the caches after a push to the default branch
+WEBHOOK_PREFETCH = os.getenv("WEBHOOK_PREFETCH", "true").lower() == "true"
+# Queue a README refresh right after a push instead of in the off-peak pass
+WEBHOOK_REFRESH = os.getenv("WEBHOOK_REFRESH", "false").lower() == "true"
+WEBHOOK_DELIVERY_RETENTION_DAYS = int(os.getenv("WEBHOOK_DELIVERY_RETENTION_DAYS", "7"))
+# A delivery still processing after this many seconds is taken over by a redelivery
+WEBHOOK_PROCESSING_TIMEOUT = int(os.getenv("WEBHOOK_PROCESSING_TIMEOUT", "300"))
+# Unset disables recording
+WEBHOOK_RECORD_DIR = os.getenv("WEBHOOK_RECORD_DIR")
+
+# Row values a webhook repository may leave out, filled from the stored row
+_STORED_FALLBACKS = {
+    "topics": "topics",
+    "disabled": "is_disabled",
+    "archived": "is_archived",
+    "has_issues": "has_issues",
+    "has_projects": "has_projects",
+    "has_wiki": "has_wiki",
+    "has_downloads": "has_downloads",
+}
+
+
+class WebhookSignatureError(Exception):
+    """A delivery's X-Hub-Signature-256 is missing or doesn't match."""
+
+
+class GitHubWebhookProcessor:
+    """Verifies, deduplicates and applies GitHub webhook deliveries."""
+
+    def __init__(
+        self,
+        secret: Optional[str] = GITHUB_WEBHOOK_SECRET,
+        record_dir: Optional[str] = WEBHOOK_RECORD_DIR,
+    ):
+        self.secret = secret
+        self.record_dir = Path(record_dir) if record_dir else None
+
+    def sign(self, body: bytes) -> str:
+        """X-Hub-Signature-256 value for a body."""
+        digest = hmac.new(self.secret.encode("utf-8"), body, hashlib.sha256)
+        return f"sha256={digest.hexdigest()}"
+
+    def verify(self, body: bytes, signature: Optional[str]) -> None:
+        """Raise WebhookSignatureError unless the body was signed with our secret."""
+        if not self.secret or not signature:
+            raise WebhookSignatureError("Missing webhook signature")
+        if not hmac.compare_digest(self.sign(body), signature):
+            raise WebhookSignatureError("Invalid webhook signature")
+
+    def receive(
+        self, db: Session, event: str, delivery_id: str, payload: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Process a delivery once; redeliveries are reported as duplicates."""
+        if not self._claim(db, delivery_id, event, payload.get("action")):
+            metrics.increment(
+                "webhook_deliveries_total", event=event, outcome="duplicate"
+            )
+            return {"status": "duplicate", "event": event}
+
+        try:
+            result = self.process(db, event, payload)
+        except Exception:
+            db.rollback()
+            # Let GitHub's redelivery try again
+            db.query(WebhookDelivery).filter(
+                WebhookDelivery.delivery_id == delivery_id
+            ).delete()
+            db.commit()
+            metrics.increment("webhook_deliveries_total", event=event, outcome="failed")
+            raise
+
+        db.query(WebhookDelivery).filter(
+            WebhookDelivery.delivery_id == delivery_id
+        ).update({WebhookDelivery.status: "processed"})
+        db.commit()
+        metrics.increment(
+            "webhook_deliveries_total", event=event, outcome=result["status"]
+        )
+        return result
+
+    def process(
+        self, db: Session, event: str, payload: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Apply an event; safe to run again for the same payload."""
+        handler = {
+            "ping": self._ping,
+            "push": self._push,
+            "repository": self._repository,
+            "installation": self._installation,
+            "installation_repositories": self._installation,
+        }.get(event)
+        if handler is None:
+            return {"status": "ignored", "event": event}
+        return {"event": event, **handler(db, payload)}
+
+    def _ping(self, db: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {"status": "processed"}
+
+    def _push(self, db: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+        github_repo = payload["repository"]
+        repository = self._stored(db, github_repo["id"])
+        result: Dict[str, Any] = {"status": "processed", "repository": "untracked"}
+        if repository is not None:
+            self._apply(db, repository, github_repo)
+            result["repository"] = "updated"
+
+        default_branch = github_repo.get("default_branch") or github_repo.get(
+            "master_branch"
+        )
+        if (
+            payload.get("deleted")
+            or payload.get("ref") != f"refs/heads/{default_branch}"
+        ):
+            # Mirrors and analyses follow the default branch only
+            return result
+
+        commit = payload.get("after")
+        invalidated = self._invalidate(github_repo, repository, commit)
+        result["cache"] = "invalidated" if invalidated else "current"
+        if repository is None or github_repo.get("private"):
+            # Workers clone anonymously
+            return result
+
+        if WEBHOOK_REFRESH:
+            result["refresh"] = refresh_scheduler.refresh_repository(db, repository.id)
+        if WEBHOOK_PREFETCH and invalidated and result.get("refresh") != "queued":
+            # Advance the mirror to the pushed commit before anyone asks for it
+            result["prefetch"] = repository_prefetcher.request(
+                db, repository.owner_id, repository.url, source="webhook"
+            )
+        return result
+
+    def _repository(self, db: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+        action = payload.get("action")
+        github_repo = payload["repository"]
+        repository = self._stored(db, github_repo["id"])
+
+        if action == "deleted":
+            if repository is None:
+                return {"status": "processed", "repository": "untracked"}
+            removed = repository_sync.remove(
+                db, repository.owner_id, [github_repo["id"]]
+            )
+            return {
+                "status": "processed",
+                "repository": "removed" if removed else "kept",
+            }
+
+        if repository is not None:
+            self._apply(db, repository, github_repo)
+            return {"status": "processed", "repository": "updated"}
+
+        owner = (
+            db.query(User).filter(User.github_id == github_repo["owner"]["id"]).first()
+        )
+        if action != "created" or owner is None:
+            return {"status": "processed", "repository": "untracked"}
+        existing = repository_sync.load_existing(db, owner.id, [github_repo["id"]])
+        repository_sync.upsert(
+            db, owner.id, [_rest_repository(github_repo)], [None], existing
+        )
+        return {"status": "processed", "repository": "created"}
+
+    def _installation(self, db: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+        account = (payload.get("installation") or {}).get("account") or {}
+        logger.info(
+            f"GitHub installation {payload.get('action')} for {account.get('login')}"
+        )
+        return {"status": "ignored"}
+
+    def _stored(self, db: Session, github_id: int) -> Optional[Repository]:
+        return db.query(Repository).filter(Repository.github_id == github_id).first()
+
+    def _apply(
+        self, db: Session, repository: Repository, github_repo: Dict[str, Any]
+    ) -> None:
+        """Write the event's view of a stored repository, if anything changed."""
+        github_repo = _rest_repository(github_repo)
+        for key, column in _STORED_FALLBACKS.items():
+            github_repo.setdefault(key, getattr(repository, column))
+        existing = repository_sync.load_existing(
+            db, repository.owner_id, [repository.github_id]
+        )
+        # Webhooks don't carry languages; the stored breakdown is kept
+        repository_sync.upsert(db, repository.owner_id, [github_repo], [None], existing)
+
+    def _invalidate(
+        self,
+        github_repo: Dict[str, Any],
+        repository: Optional[Repository],
+        commit: Optional[str],
+    ) -> bool:
+        """Make the next sync of the repository's mirrors fetch the pushed commit.
+
+        Analyses are cached by commit, so the fetched commit is analyzed afresh
+        in every process without invalidating them here.
+        """
+        urls = {github_repo.get("html_url"), github_repo.get("clone_url")}
+        if repository is not None:
+            urls.add(repository.url)
+        invalidated = False
+        for url in filter(None, urls):
+            invalidated = mirror_cache.invalidate(url, commit) or invalidated
+        if invalidated:
+            metrics.increment("webhook_mirrors_invalidated_total")
+        return invalidated
+
+    def _claim(
+        self, db: Session, delivery_id: str, event: str, action: Optional[str]
+    ) -> bool:
+        """Record the delivery; False when it was already received."""
+        now = datetime.utcnow()
+        db.add(
+            WebhookDelivery(
+                delivery_id=delivery_id,
+                event=event,
+                action=action,
+                status="processing",
+                received_at=now,
+            )
+        )
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            # Take over a delivery whose processing never finished
+            taken_over = (
+                db.query(WebhookDelivery)
+                .filter(
+                    WebhookDelivery.delivery_id == delivery_id,
+                    WebhookDelivery.status == "processing",
+                    WebhookDelivery.received_at
+                    < now - timedelta(seconds=WEBHOOK_PROCESSING_TIMEOUT),
+                )
+                .update({WebhookDelivery.received_at: now})
+            )
+            db.commit()
+            return bool(taken_over)
+
+        db.query(WebhookDelivery).filter(
+            WebhookDelivery.received_at
+            < now - timedelta(days=WEBHOOK_DELIVERY_RETENTION_DAYS)
+        ).delete()
+        db.commit()
+        return True
+
+    def record(self, event: str, delivery_id: str, payload: Dict[str, Any]) -> None:
+        """Save a verified delivery for local replay, when recording is enabled."""
+        if self.record_dir is None:
+            return
+        received = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        path = self.record_dir / f"{received}-{event}-{delivery_id}.json"
+        try:
+            self.record_dir.mkdir(parents=True, exist_ok=True)
+            # Payloads can describe private repositories
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"event": event, "delivery_id": delivery_id, "payload": payload}, f
+                )
+        except OSError as e:
+            logger.warning(f"Failed to record webhook delivery {delivery_id}: {e}")
+
+
+def _rest_repository(github_repo: Dict[str, Any]) -> Dict[str, Any]:
+    """A webhook repository in the REST shape, with ISO timestamps."""
+    github_repo = dict(github_repo)
+    # Push events send some timestamps as Unix time
+    for key in ("created_at", "updated_at", "pushed_at"):
+        value = github_repo.get(key)
+        if isinstance(value, (int, float)):
+            github_repo[key] = datetime.fromtimestamp(value, timezone.utc).strftime(
+                "%Y-%m-%dT%H:%M:%SZ"
+            )
+        else:
+            github_repo.setdefault(key, None)
+    return github_repo
+
+
+# Global instance
+webhook_processor = GitHubWebhookProcessor()
+
+
+def replay(paths: List[str], url: Optional[str] = None, new_ids: bool = False) -> None:
+    """Process recorded deliveries here, or POST them signed to ``url``."""
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            delivery = json.load(f)
+        event = delivery["event"]
+        delivery_id = str(uuid.uuid4()) if new_ids else delivery["delivery_id"]
+
+        if url:
+            body = json.dumps(delivery["payload"]).encode("utf-8")
+            response = httpx.post(
+                url,
+                content=body,
+                headers={
+                    "Content-Type": "application/json",
+                    "X-GitHub-Event": event,
+                    "X-GitHub-Delivery": delivery_id,
+                    "X-Hub-Signature-256": webhook_processor.sign(body),
+                },
+            )
+            logger.info(f"{path}: HTTP {response.status_code} {response.text}")
+            continue
+
+        db = SessionLocal()
+        try:
+            result = webhook_processor.receive(
+                db, event, delivery_id, delivery["payload"]
+            )
+        finally:
+            db.close()
+        logger.info(f"{path}: {result}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Replay recorded GitHub webhook deliveries"
+    )
+    parser.add_argument("files", nargs="+", help="Recorded delivery JSON files")
+    parser.add_argument("--url", help="POST signed deliveries to a running API instead")
+    parser.add_argument(
+        "--new-ids",
+        action="store_true",
+        help="Use fresh delivery ids so deliveries aren't skipped as duplicates",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.url and not webhook_processor.secret:
+        parser.error("GITHUB_WEBHOOK_SECRET is needed to sign deliveries")
+    replay(args.files, url=args.url, new_ids=args.new_ids)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Generation worker.
+
+Claims jobs from the generation_jobs queue and runs them. Start as many
+worker processes as needed, on any node that can reach the database:
+
+    python -m src.worker --concurrency 4
+
+The API process also runs GENERATION_WORKERS embedded worker threads; set
+it to 0 when generation is handled by dedicated worker processes.
+"""
+
+import os
+import uuid
+import signal
+import socket
+import logging
+import argparse
+import threading
+from typing import Optional, List, Set
+
+from .services.jobs import job_runner
+from .services.queue import job_queue, WORKER_HEARTBEAT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", "4"))
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "4"))
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "1"))
+
+
+class Worker:
+    """Runs queued generation jobs on a fixed number of threads."""
+
+    def __init__(
+        self,
+        concurrency: int = WORKER_CONCURRENCY,
+        worker_id: Optional[str] = None,
+        poll_interval: float = WORKER_POLL_INTERVAL,
+    ):
+        self.concurrency = concurrency
+        self.worker_id = (
+            worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        )
+        self.poll_interval = poll_interval
+        self.active: Set[int] = set()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        """Start the consumer threads and the heartbeat thread."""
+        for index in range(self.concurrency):
+            self._spawn(self._consume, f"generation-worker-{index}")
+        self._spawn(self._maintain, "generation-worker-heartbeat")
+        logger.info(f"Worker {self.worker_id} started with {self.concurrency} threads")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop claiming jobs and wait for running jobs to finish."""
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        logger.info(f"Worker {self.worker_id} stopped")
+
+    def run(self) -> None:
+        """Run until SIGINT or SIGTERM."""
+        signal.signal(signal.SIGTERM, lambda *_: self.stop_event.set())
+        signal.signal(signal.SIGINT, lambda *_: self.stop_event.set())
+        self.start()
+        while not self.stop_event.wait(1):
+            pass
+        self.stop()
+
+    def _spawn(self, target, name: str) -> None:
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def _consume(self) -> None:
+        while not self.stop_event.is_set():
+            try:
+                claimed = job_queue.claim(self.worker_id)
+            except Exception as e:
+                logger.error(f"Failed to claim generation job: {e}")
+                claimed = None
+
+            if claimed is None:
+                self.stop_event.wait(self.poll_interval)
+                continue
+
+            with self.lock:
+                self.active.add(claimed["id"])
+            try:
+                if claimed["kind"] == "prefetch":
+                    job_runner.prefetch(
+                        claimed["repo_url"], claimed["id"], claimed["source"]
+                    )
+                else:
+                    job_runner.run_job(claimed["job_id"])
+                job_queue.complete(claimed["id"], self.worker_id)
+            except Exception as e:
+                # Leave the queue entry; it is requeued once its heartbeat lapses
+                name = claimed["job_id"] or claimed["repo_url"]
+                logger.error(f"Generation job {name} crashed: {e}")
+            finally:
+                with self.lock:
+                    self.active.discard(claimed["id"])
+
+    def _maintain(self) -> None:
+        while not self.stop_event.wait(WORKER_HEARTBEAT_INTERVAL):
+            with self.lock:
+                active = set(self.active)
+            try:
+                job_queue.heartbeat(active, self.worker_id)
+                job_queue.recover_stale()
+            except Exception as e:
+                logger.error(f"Worker {self.worker_id} heartbeat failed: {e}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="GitScriptor generation worker")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    Worker(concurrency=args.concurrency).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import os
+import tempfile
+
+# Configure before the application modules read their settings
+os.environ["DATABASE_URL"] = (
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='gitscriptor-tests-'), 'test.db')}"
+)
+os.environ.setdefault("ENVIRONMENT", "development")
+
+import pytest  # noqa: E402
+
+from src.db.database import Base, SessionLocal, engine  # noqa: E402
+from src.db.models import User  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """A session on an empty database."""
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def user(db):
+    """The octocat account the webhook fixtures belong to."""
+    user = User(github_id=583231, username="octocat")
+    db.add(user)
+    db.commit()
+    return user
@@ -0,0 +1,227 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from src.db.models import Repository, WebhookDelivery
+from src.services import webhooks
+from src.services.gitscriptor_core import MIRROR_FETCH_STAMP, mirror_cache
+from src.services.repository_sync import repository_sync
+from src.services.webhooks import GitHubWebhookProcessor, WebhookSignatureError
+
+FIXTURES = Path(__file__).parent / "fixtures" / "webhooks"
+HELLO_WORLD = 1296269
+SPOON_KNIFE = 1300192
+
+
+def load(name):
+    with open(FIXTURES / f"{name}.json", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def deliver(processor, db, name):
+    delivery = load(name)
+    return processor.receive(
+        db, delivery["event"], delivery["delivery_id"], delivery["payload"]
+    )
+
+
+def stored(db, github_id):
+    db.expire_all()
+    return db.query(Repository).filter(Repository.github_id == github_id).first()
+
+
+@pytest.fixture
+def processor():
+    return GitHubWebhookProcessor(secret="test-secret")
+
+
+@pytest.fixture
+def prefetches(monkeypatch):
+    requested = []
+
+    def request(db, user_id, repo_url, source):
+        requested.append((user_id, repo_url, source))
+        return "queued"
+
+    monkeypatch.setattr(webhooks.repository_prefetcher, "request", request)
+    return requested
+
+
+@pytest.fixture
+def mirrors(monkeypatch, tmp_path):
+    monkeypatch.setattr(mirror_cache, "root", tmp_path)
+    return mirror_cache
+
+
+@pytest.fixture
+def hello_world(db, user):
+    """Hello-World as the last sync stored it."""
+    github_repo = load("repository_deleted")["payload"]["repository"]
+    repository_sync.upsert(db, user.id, [github_repo], [{"C": 1024}], {})
+    db.commit()
+    return stored(db, HELLO_WORLD)
+
+
+def test_push_updates_repository_and_invalidates_mirror(
+    db, processor, hello_world, mirrors, prefetches
+):
+    mirror = mirrors.path(hello_world.url)
+    mirror.mkdir(parents=True)
+    (mirror / MIRROR_FETCH_STAMP).touch()
+
+    result = deliver(processor, db, "push")
+
+    assert result == {
+        "event": "push",
+        "status": "processed",
+        "repository": "updated",
+        "cache": "invalidated",
+        "prefetch": "queued",
+    }
+    repository = stored(db, HELLO_WORLD)
+    assert repository.stars_count == 81
+    # Left out of push payloads, so kept from the stored row
+    assert repository.languages == {"C": 1024}
+    assert repository.is_disabled is False
+    assert repository.github_pushed_at.isoformat() == "2024-05-01T22:00:00"
+    assert not (mirror / MIRROR_FETCH_STAMP).exists()
+    assert prefetches == [(hello_world.owner_id, hello_world.url, "webhook")]
+
+
+def test_push_to_other_branch_keeps_mirror(
+    db, processor, hello_world, mirrors, prefetches
+):
+    mirror = mirrors.path(hello_world.url)
+    mirror.mkdir(parents=True)
+    (mirror / MIRROR_FETCH_STAMP).touch()
+    delivery = load("push")
+    delivery["payload"]["ref"] = "refs/heads/feature"
+
+    result = processor.receive(db, "push", delivery["delivery_id"], delivery["payload"])
+
+    assert result["repository"] == "updated"
+    assert "cache" not in result
+    assert (mirror / MIRROR_FETCH_STAMP).exists()
+    assert prefetches == []
+
+
+def test_redelivery_is_duplicate(db, processor, hello_world, mirrors, prefetches):
+    mirror = mirrors.path(hello_world.url)
+    mirror.mkdir(parents=True)
+    (mirror / MIRROR_FETCH_STAMP).touch()
+
+    assert deliver(processor, db, "push")["status"] == "processed"
+    assert deliver(processor, db, "push") == {"status": "duplicate", "event": "push"}
+    assert db.query(WebhookDelivery).count() == 1
+    assert len(prefetches) == 1
+
+
+def test_repository_created_adds_repository(db, processor, user):
+    result = deliver(processor, db, "repository_created")
+
+    assert result["repository"] == "created"
+    repository = stored(db, SPOON_KNIFE)
+    assert repository.owner_id == user.id
+    assert repository.full_name == "octocat/Spoon-Knife"
+    assert repository.default_branch == "main"
+    assert repository.languages == {}
+
+
+def test_repository_created_for_unknown_owner_is_untracked(db, processor):
+    result = deliver(processor, db, "repository_created")
+
+    assert result["repository"] == "untracked"
+    assert stored(db, SPOON_KNIFE) is None
+
+
+def test_repository_edited_updates_repository(db, processor, hello_world):
+    result = deliver(processor, db, "repository_edited")
+
+    assert result["repository"] == "updated"
+    repository = stored(db, HELLO_WORLD)
+    assert repository.description == "Hello, webhooks!"
+    assert repository.homepage == "https://octocat.github.io"
+    assert repository.topics == ["demo", "octocat"]
+    assert repository.languages == {"C": 1024}
+
+
+def test_repository_renamed_keeps_row(db, processor, hello_world):
+    result = deliver(processor, db, "repository_renamed")
+
+    assert result["repository"] == "updated"
+    repository = stored(db, HELLO_WORLD)
+    assert repository.id == hello_world.id
+    assert repository.name == "Hello-Universe"
+    assert repository.full_name == "octocat/Hello-Universe"
+    assert repository.url == "https://github.com/octocat/Hello-Universe"
+    assert db.query(Repository).count() == 1
+
+
+def test_repository_deleted_removes_repository(db, processor, hello_world):
+    result = deliver(processor, db, "repository_deleted")
+
+    assert result["repository"] == "removed"
+    assert stored(db, HELLO_WORLD) is None
+
+
+def test_installation_is_acknowledged(db, processor, hello_world):
+    result = deliver(processor, db, "installation")
+
+    assert result == {"event": "installation", "status": "ignored"}
+    assert stored(db, HELLO_WORLD).name == "Hello-World"
+    delivery = db.query(WebhookDelivery).one()
+    assert (delivery.event, delivery.action, delivery.status) == (
+        "installation",
+        "created",
+        "processed",
+    )
+
+
+def test_verify_accepts_signed_body(processor):
+    body = (FIXTURES / "push.json").read_bytes()
+
+    processor.verify(body, processor.sign(body))
+
+
+@pytest.mark.parametrize(
+    "signature", [None, "", "sha256=" + "0" * 64, "sha1=0123456789abcdef"]
+)
+def test_verify_rejects_bad_or_missing_signature(processor, signature):
+    with pytest.raises(WebhookSignatureError):
+        processor.verify(b'{"zen": "Keep it logically awesome."}', signature)
+
+
+def test_verify_rejects_body_signed_with_other_secret(processor):
+    body = b'{"zen": "Keep it logically awesome."}'
+    signature = GitHubWebhookProcessor(secret="other-secret").sign(body)
+
+    with pytest.raises(WebhookSignatureError):
+        processor.verify(body, signature)
+
+
+def test_verify_rejects_everything_without_secret():
+    body = b"{}"
+    signature = GitHubWebhookProcessor(secret="test-secret").sign(body)
+
+    with pytest.raises(WebhookSignatureError):
+        GitHubWebhookProcessor(secret=None).verify(body, signature)
+
+
+def test_main_replays_recorded_deliveries(db, user):
+    paths = [str(FIXTURES / f"{name}.json") for name in ("repository_created",) * 2]
+
+    webhooks.main(paths)
+
+    assert stored(db, SPOON_KNIFE).name == "Spoon-Knife"
+    assert db.query(WebhookDelivery).count() == 1
+
+
+def test_replay_with_new_ids_processes_again(db, user):
+    path = str(FIXTURES / "repository_created.json")
+
+    webhooks.replay([path])
+    webhooks.replay([path], new_ids=True)
+
+    assert db.query(WebhookDelivery).count() == 2
+    assert db.query(Repository).count() == 1
@@ -170,7 +170,40 @@ def read_key_files(repo_path: Path, analysis: Dict[str, Any]) -> Dict[str, str]:
     return key_content
 
 
-def call_gemini_api(prompt: str, api_key: str) -> str:
+# Bump whenever README_INSTRUCTIONS changes
+PROMPT_VERSION = "2"
+
+# Static instructions shared by every request; sent as the system instruction
+# so the provider can reuse them instead of re-reading them in each prompt
+README_INSTRUCTIONS = """You are a technical documentation expert. Generate a comprehensive, professional README.md file for the software project described by the user.
+
+Please generate a complete README.md that includes:
+
+1. **Project Title & Description**: Clear, engaging project description
+2. **Features**: Key features and capabilities
+3. **Installation**: Step-by-step installation instructions
+4. **Usage**: Basic usage examples and code snippets
+5. **API/Documentation**: If applicable, basic API documentation
+6. **Development Setup**: How to set up for development
+7. **Contributing**: Guidelines for contributors
+8. **License**: Standard license section
+
+Requirements:
+- Use proper Markdown formatting
+- Be professional but engaging
+- Include relevant badges if appropriate
+- Make installation instructions clear and platform-agnostic when possible
+- Include code examples where relevant
+- Keep it concise but comprehensive
+- If this appears to be a web application, include screenshots/demo section
+- If this is a library/package, include import examples
+
+Generate ONLY the README.md content in markdown format. Do not include any explanations before or after the markdown content."""
+
+
+def call_gemini_api(
+    prompt: str, api_key: str, system_instruction: str | None = None
+) -> str:
     """Call Google Gemini API to generate content."""
     url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={api_key}"
 
@@ -180,6 +213,8 @@ def call_gemini_api(prompt: str, api_key: str) -> str:
         "contents": [{"parts": [{"text": prompt}]}],
         "generationConfig": {"temperature": 0.7, "maxOutputTokens": 2048},
     }
+    if system_instruction:
+        data["systemInstruction"] = {"parts": [{"text": system_instruction}]}
 
     try:
         response = requests.post(url, headers=headers, json=data, timeout=30)
@@ -218,10 +253,8 @@ This is an autogenerated README for **{repo_path}** (style: {style}).
         analysis = analyze_repository(repo_path)
         key_content = read_key_files(repo_path, analysis)
 
-        # Build the prompt for Gemini
-        prompt = f"""You are a technical documentation expert. Generate a comprehensive, professional README.md file for this software project.
-
-Project Analysis:
+        # Build the repository-specific part of the prompt
+        prompt = f"""Project Analysis:
 - Project Name: {analysis['name']}
 - Programming Languages: {', '.join(analysis['languages']) if analysis['languages'] else 'Unknown'}
 - Framework Indicators: {', '.join(analysis['framework_indicators']) if analysis['framework_indicators'] else 'None detected'}
@@ -234,33 +267,12 @@ File Structure Preview:
 Key File Contents:
 {chr(10).join(f"=== {name} ==={chr(10)}{content[:500]}{'...(truncated)' if len(content) > 500 else ''}{chr(10)}" for name, content in key_content.items())}
 
-Style: {style}
-
-Please generate a complete README.md that includes:
-
-1. **Project Title & Description**: Clear, engaging project description
-2. **Features**: Key features and capabilities
-3. **Installation**: Step-by-step installation instructions
-4. **Usage**: Basic usage examples and code snippets
-5. **API/Documentation**: If applicable, basic API documentation
-6. **Development Setup**: How to set up for development
-7. **Contributing**: Guidelines for contributors
-8. **License**: Standard license section
-
-Requirements:
-- Use proper Markdown formatting
-- Be professional but engaging
-- Include relevant badges if appropriate
-- Make installation instructions clear and platform-agnostic when possible
-- Include code examples where relevant
-- Keep it concise but comprehensive
-- If this appears to be a web application, include screenshots/demo section
-- If this is a library/package, include import examples
-
-Generate ONLY the README.md content in markdown format. Do not include any explanations before or after the markdown content."""
+Style: {style}"""
 
         # Call Gemini API
-        readme_content = call_gemini_api(prompt, api_key)
+        readme_content = call_gemini_api(
+            prompt, api_key, system_instruction=README_INSTRUCTIONS
+        )
 
         return readme_content.strip()
 